@@ -0,0 +1,964 @@
+"""Benchmarks for the LLM-backed chat routes, run against fake_gemini.py.
+
+    python benchmark.py cache --requests 400 --distinct 40 --latency 0.3
+    python benchmark.py cache --app dress
+    python benchmark.py load --users 50 --duration 20 --error-rate 0.05
+    python benchmark.py stream --token-delay 0.03
+    python benchmark.py sessions --users 100000 --messages 3
+    python benchmark.py preferences --messages 50000
+    python benchmark.py prompts --users 1000 --turns 20
+    python benchmark.py serve --app food --users 64 --duration 15
+    python benchmark.py metrics --requests 20000
+    python benchmark.py history --rows 1000000 --users 10000
+    python benchmark.py delivery --recipients 2000 --locations 50 --sms-rate 200
+    python benchmark.py weather --lookups 400 --locations 20 --latency 0.2
+    python benchmark.py scheduler --jobs 100000 --window 20
+    python benchmark.py boot --rows 1000000 --users 10000
+
+No API key or network is needed: a fake Gemini server (fake_gemini.py) or
+weather API (fake_weather.py) is started in the background and the
+clients are pointed at it.
+"""
+import argparse
+import csv
+import datetime
+import importlib
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from flask import Flask, jsonify
+
+import fake_gemini
+import fake_weather
+import metrics
+from delivery import DeliveryEngine, Recipient
+from gemini_client import GeminiClient, ResponseCache
+from preferences import PREFERENCE_PATTERNS, add_preferences
+from prompt_builder import PERSONA, PromptBuilder, preference_paragraph
+from session_store import MemoryBackend, SessionStore, SQLiteBackend, new_session
+from timer_scheduler import TimerScheduler
+from weather_cache import DEFAULT_WEATHER, WeatherCache
+from suggestion_history import HEADER, SuggestionHistory
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = [
+    "What should I eat tonight?", "Any good vegan breakfast ideas?", "I love thai food, suggest something",
+    "What's a quick lunch?", "Recommend a dessert", "What goes well with rice?",
+    "I'm allergic to peanuts. Any snack ideas?", "Something spicy please", "Best comfort food?",
+    "What's healthy and cheap?",
+]
+
+
+def percentile_ms(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))] * 1000
+
+
+def report(name, samples, upstream_calls):
+    print(f"{name:<28} n={len(samples):<5} p50={percentile_ms(samples, 50):8.2f} ms  "
+          f"p99={percentile_ms(samples, 99):8.2f} ms  Gemini calls={upstream_calls}")
+
+
+def start_fake_gemini(latency):
+    server = fake_gemini.start(latency=latency)
+    os.environ['GEMINI_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v1beta"
+    return server
+
+
+def load_food_app():
+    module = importlib.import_module('app')
+    users = itertools.count()
+
+    def send(client, message):
+        # A new user per request, so the prompt only depends on the message
+        response = client.post('/api/chat', json={'message': message, 'userId': f'bench-{next(users)}'})
+        assert response.status_code == 200, response.status_code
+    return module, send
+
+
+def load_dress_app():
+    os.chdir(os.path.join(ROOT, 'dress_shop_ai'))
+    sys.path.insert(0, os.getcwd())
+    module = importlib.import_module('app')
+
+    def send(client, message):
+        response = client.post('/predict', data={'user_input': f"Hey assistant, {message.lower()}"})
+        assert response.status_code == 200, response.status_code
+    return module, send
+
+
+def run(module, send, messages, cache, server):
+    module.llm.cache = cache
+    client = module.app.test_client()
+    calls_before = server.requests
+    samples = []
+    for message in messages:
+        start = time.perf_counter()
+        send(client, message)
+        samples.append(time.perf_counter() - start)
+    return samples, server.requests - calls_before
+
+
+def bench_cache(args):
+    server = start_fake_gemini(args.latency)
+    module, send = load_food_app() if args.app == 'food' else load_dress_app()
+    rng = random.Random(42)
+    distinct = [f"{rng.choice(QUESTIONS)} (#{i})" for i in range(args.distinct)]
+    messages = [rng.choice(distinct) for _ in range(args.requests)]
+    print(f"{args.app} app: {args.requests} messages, {args.distinct} distinct, "
+          f"fake Gemini latency {args.latency * 1000:.0f} ms")
+
+    report('No cache', *run(module, send, messages, ResponseCache(max_entries=0), server))
+    report('Memory LRU', *run(module, send, messages, ResponseCache(), server))
+    with tempfile.TemporaryDirectory() as disk:
+        run(module, send, distinct, ResponseCache(disk_path=disk), server)
+        # A fresh memory tier over a warm directory, as after a restart
+        report('Disk tier after restart', *run(module, send, messages, ResponseCache(disk_path=disk), server))
+    print(module.llm.stats.snapshot())
+
+
+def chat_users(module, users, duration):
+    """`users` threads chatting with /api/chat until the time is up; returns latencies and failures"""
+    samples, failures = [], []
+    stop_at = time.perf_counter() + duration
+
+    def user(n):
+        client = module.app.test_client()
+        for turn in itertools.count():
+            if time.perf_counter() >= stop_at:
+                return
+            # A fresh user and message each turn, so every call misses the cache
+            start = time.perf_counter()
+            response = client.post('/api/chat', json={'message': f"Lunch idea {turn}?", 'userId': f'load-{n}-{turn}'})
+            samples.append(time.perf_counter() - start)
+            if 'trouble' in response.json['response'] or 'Oops' in response.json['response']:
+                failures.append(response.json['response'])
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, failures
+
+
+def bench_load(args):
+    server = start_fake_gemini(args.latency)
+    module = importlib.import_module('app')
+    print(f"{args.users} concurrent chat users for {args.duration:.0f}s each, fake Gemini latency "
+          f"{args.latency * 1000:.0f} ms, error rate {args.error_rate:.0%}")
+    for mode in ['bare', 'pooled']:
+        module.llm.cache = ResponseCache(max_entries=0)
+        module.llm.stats = type(module.llm.stats)()
+        if mode == 'bare':
+            # What the apps did before: requests.post per call, a new connection each time, no retries
+            module.llm.session = requests
+            module.llm.retries = 0
+            module.llm.semaphore = threading.BoundedSemaphore(args.users)
+        else:
+            module.llm = type(module.llm)(api_key='bench', cache=ResponseCache(max_entries=0),
+                                          max_concurrency=args.max_concurrency)
+        server.error_rate = args.error_rate
+        requests_before, connections_before = server.requests, server.connections
+        samples, failures = chat_users(module, args.users, args.duration)
+        server.error_rate = 0
+        print(f"{mode:<7} {len(samples) / args.duration:7.1f} req/s  "
+              f"p50={percentile_ms(samples, 50):7.1f} ms  p95={percentile_ms(samples, 95):7.1f} ms  "
+              f"p99={percentile_ms(samples, 99):7.1f} ms  failed={len(failures)}  "
+              f"Gemini calls={server.requests - requests_before}  "
+              f"connections={server.connections - connections_before}  "
+              f"events={module.llm.stats.snapshot()['events']}")
+
+
+def bench_stream(args):
+    server = start_fake_gemini(args.latency)
+    server.token_delay = args.token_delay
+    module = importlib.import_module('app')
+    module.llm.cache = ResponseCache(max_entries=0)
+    client = module.app.test_client()
+    print(f"Fake Gemini: {args.latency * 1000:.0f} ms to first word, {args.token_delay * 1000:.0f} ms per word")
+    for route in ['/api/chat', '/api/chat/stream']:
+        first_byte, complete = [], []
+        for n in range(args.requests):
+            start = time.perf_counter()
+            response = client.post(route, json={'message': f"Dinner idea {n}, something warm and filling?",
+                                                'userId': f'stream-{route}-{n}'}, buffered=False)
+            for i, _ in enumerate(response.response):
+                if i == 0:
+                    first_byte.append(time.perf_counter() - start)
+            complete.append(time.perf_counter() - start)
+        print(f"{route:<18} first byte p50={percentile_ms(first_byte, 50):7.1f} ms  "
+              f"complete p50={percentile_ms(complete, 50):7.1f} ms")
+    print('time to first token:', module.llm.stats.snapshot()['latency_ms'].get('first_token'))
+
+
+def bench_sessions(args):
+    if args.store is None:
+        # Each store in its own process, so the peak RSS figures do not mix
+        for store in ['unbounded', 'sqlite']:
+            subprocess.run([sys.executable, __file__, 'sessions', '--store', store,
+                            '--users', str(args.users), '--messages', str(args.messages),
+                            '--cache-users', str(args.cache_users)], check=True)
+        return
+
+    server = start_fake_gemini(0)
+    module = importlib.import_module('app')
+    module.sessions.close()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.store == 'unbounded':
+            # What the module-level user_data dict did: everyone in RAM, full history
+            module.sessions = SessionStore(MemoryBackend(), max_users=args.users + 1, history_limit=None)
+        else:
+            module.sessions = SessionStore(SQLiteBackend(os.path.join(tmp, 'sessions.db')),
+                                           max_users=args.cache_users)
+        client = module.app.test_client()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        samples = []
+        start = time.perf_counter()
+        for turn in range(args.messages):
+            for n in range(args.users):
+                t = time.perf_counter()
+                client.post('/api/chat', json={'message': f"What's for lunch today? ({turn})", 'userId': f'user-{n}'})
+                samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        module.sessions.flush()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        db_size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        print(f"{args.store:<10} {args.users} users x {args.messages} messages: "
+              f"{len(samples) / elapsed:6.0f} req/s  p50={percentile_ms(samples, 50):5.2f} ms  "
+              f"p99={percentile_ms(samples, 99):5.2f} ms  RSS +{(rss_after - rss_before) / 1024:.0f} MB  "
+              f"in memory: {len(module.sessions)} users  on disk: {db_size / 2**20:.0f} MB  "
+              f"Gemini calls: {server.requests}")
+        module.sessions.close()
+
+
+# Chat messages for the preference benchmark; most mention no preference at all
+CHAT_CORPUS = [
+    "hey! what should i eat tonight?", "honestly i'm so tired, something quick please",
+    "i'm vegetarian and trying to eat more protein. any ideas?", "i love thai food, especially green curry",
+    "i'm allergic to peanuts, shellfish. what snacks are safe?", "i don't like mushrooms or olives.",
+    "what goes well with leftover rice?", "my favorite cuisine is japanese. recommend a lunch spot dish",
+    "i follow a keto diet, so nothing with sugar", "lol that sounds amazing, tell me more",
+    "i can't stand cilantro. it tastes like soap", "i am gluten-free and dairy free since last year.",
+    "can you suggest a dessert for a birthday party with 10 people?", "i enjoy mexican food and korean food",
+    "i'm not a fan of spicy stuff, i hate really hot peppers.", "what about breakfast? i have eggs, bread, and cheese",
+    "my allergies include sesame, soy.", "thanks! that was really helpful, i'm going to try it",
+    "i'm on a low carb diet this month", "what's a good comfort food when it's raining?",
+]
+
+
+def legacy_update_preferences(preferences, lower_input):
+    """update_user_preferences() as it was: each pattern through re.findall, list membership tests"""
+    dietary_keywords = {
+        'dietary_restrictions': ['vegetarian', 'vegan', 'pescatarian', 'gluten-free', 'gluten free', 'dairy-free',
+                               'dairy free', 'keto', 'paleo', 'low-carb', 'low carb', 'halal', 'kosher'],
+        'cuisines': ['italian', 'mexican', 'chinese', 'japanese', 'indian', 'thai', 'french', 'mediterranean',
+                    'greek', 'american', 'korean', 'vietnamese', 'middle eastern', 'spanish', 'cajun']
+    }
+    preference_patterns = {category: list(patterns) for category, patterns in PREFERENCE_PATTERNS.items()}
+    for pattern in preference_patterns['allergies']:
+        for match in re.findall(pattern, lower_input):
+            for allergen in [a.strip() for a in match.split(',')]:
+                if allergen and allergen not in preferences['allergies']:
+                    preferences['allergies'].append(allergen)
+    for pattern in preference_patterns['dietary_restrictions']:
+        for match in re.findall(pattern, lower_input):
+            for restriction in dietary_keywords['dietary_restrictions']:
+                if restriction in match.lower():
+                    if restriction not in preferences['dietary_restrictions']:
+                        preferences['dietary_restrictions'].append(restriction)
+    for pattern in preference_patterns['favorite_cuisines']:
+        for match in re.findall(pattern, lower_input):
+            for cuisine in dietary_keywords['cuisines']:
+                if cuisine in match.lower():
+                    if cuisine not in preferences['favorite_cuisines']:
+                        preferences['favorite_cuisines'].append(cuisine)
+    for pattern in preference_patterns['disliked_foods']:
+        for match in re.findall(pattern, lower_input):
+            for item in [i.strip() for i in match.split(',')]:
+                if item and item not in preferences['disliked_foods']:
+                    preferences['disliked_foods'].append(item)
+    return preferences
+
+
+def bench_preferences(args):
+    rng = random.Random(42)
+    # Each simulated user sends a run of messages; preferences accumulate per user
+    conversations = [[rng.choice(CHAT_CORPUS) for _ in range(args.per_user)]
+                     for _ in range(args.messages // args.per_user)]
+    results = {}
+    for name, update in [('re.findall per pattern', legacy_update_preferences),
+                         ('single-pass extractor', add_preferences)]:
+        start = time.perf_counter()
+        results[name] = []
+        for messages in conversations:
+            preferences = {category: [] for category in PREFERENCE_PATTERNS}
+            for message in messages:
+                update(preferences, message)
+            results[name].append(preferences)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24} {args.messages / elapsed:9.0f} messages/s  {elapsed / args.messages * 1e6:6.2f} us/message")
+    print('identical preferences:', len(set(map(repr, results.values()))) == 1)
+
+
+def legacy_build_prompt(session, user_input):
+    """build_prompt() as it was: persona, preferences and history concatenated on every call"""
+    context = PERSONA + preference_paragraph(session['preferences'])
+    context += "\nConversation so far:\n"
+    history = session['chat_history']
+    for msg in itertools.islice(history, max(0, len(history) - 6), None):
+        if msg["is_user"]:
+            context += f"Friend: {msg['message']}\n"
+        else:
+            context += f"You: {msg['message']}\n"
+    return None, context + f"\nFriend: {user_input}\nYou: "
+
+
+def bench_prompts(args):
+    rng = random.Random(42)
+    conversations = [[rng.choice(CHAT_CORPUS) for _ in range(args.turns)] for _ in range(args.users)]
+    client = GeminiClient(api_key='benchmark')
+    builders = [('rebuilt every call', legacy_build_prompt),
+                ('cached context', PromptBuilder().build),
+                ('cached + systemInstruction', PromptBuilder(system_instruction=True).build)]
+    prompts = {}
+    for name, build in builders:
+        builder = getattr(build, '__self__', None)
+        built, build_time, payload_bytes = [], 0.0, 0
+        for messages in conversations:
+            session = new_session(50)
+            for turn, message in enumerate(messages):
+                start = time.process_time()
+                system, prompt = build(session, message)
+                build_time += time.process_time() - start
+                built.append(prompt)
+                payload = client.payload(prompt, {'maxOutputTokens': 1024}, system)
+                payload_bytes += len(json.dumps(payload).encode('utf-8'))
+                # What record_exchange() does after the reply
+                add_preferences(session['preferences'], message.lower())
+                reply = f"reply {turn} to {message}"
+                if builder:
+                    builder.add_exchange(session, message, reply)
+                else:
+                    session['chat_history'].extend([{"message": message, "is_user": True},
+                                                    {"message": reply, "is_user": False}])
+        prompts[name] = built
+        print(f"{name:<28} {build_time / len(built) * 1e6:7.2f} us CPU/build  "
+              f"{payload_bytes / len(built):7.0f} bytes/request")
+    print('inline prompts identical:', prompts['rebuilt every call'] == prompts['cached context'])
+
+
+SERVE_MODES = {
+    'dev': ['--server', 'dev'],
+    'waitress': ['--server', 'waitress'],
+    'gunicorn': ['--server', 'gunicorn'],
+}
+
+
+def wait_until_up(url, process, timeout=60):
+    stop_at = time.perf_counter() + timeout
+    while time.perf_counter() < stop_at:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}")
+        try:
+            requests.get(url, timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def http_users(url, send, users, duration):
+    """`users` threads, each with its own keep-alive connection, sending until the time is up"""
+    samples, errors = [], []
+    stop_at = time.perf_counter() + duration
+
+    def user(n):
+        with requests.Session() as http:
+            for turn in itertools.count():
+                if time.perf_counter() >= stop_at:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = send(http, url, f'{n}-{turn}')
+                    ok = response.status_code == 200
+                except requests.RequestException:
+                    ok = False
+                (samples if ok else errors).append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors
+
+
+def send_food_chat(http, url, tag):
+    return http.post(f'{url}/api/chat', json={'message': f'Lunch idea {tag}?', 'userId': f'serve-{tag}'}, timeout=60)
+
+
+def send_dress_predict(http, url, tag):
+    return http.post(f'{url}/predict', data={'user_input': f'Hey assistant, what sells best this season? ({tag})'},
+                     timeout=60)
+
+
+def bench_serve(args):
+    server = start_fake_gemini(args.latency)
+    send = send_food_chat if args.app == 'food' else send_dress_predict
+    url = f'http://127.0.0.1:{args.port}'
+    print(f"{args.app} app, {args.users} concurrent clients for {args.duration:.0f}s, "
+          f"fake Gemini latency {args.latency * 1000:.0f} ms, {os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SESSION_DB=os.path.join(tmp, 'sessions.db'), LLM_CACHE_DIR='')
+        for mode in args.modes:
+            command = [sys.executable, os.path.join(ROOT, 'serve.py'), args.app, '--bind', f'127.0.0.1:{args.port}',
+                       *SERVE_MODES[mode]]
+            # Own process group, so the dev server's reloader child is stopped too
+            process = subprocess.Popen(command, env=env, start_new_session=True,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(url, process)
+                memory = process_tree_pss_mb(process.pid)
+                calls_before = server.requests
+                samples, errors = http_users(url, send, args.users, args.duration)
+                print(f"{mode:<9} {len(samples) / args.duration:7.1f} req/s  "
+                      f"p50={percentile_ms(samples, 50):7.1f} ms  p99={percentile_ms(samples, 99):7.1f} ms  "
+                      f"errors={len(errors)}  Gemini calls={server.requests - calls_before}  "
+                      f"memory (PSS)={memory:.0f} MB")
+            finally:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait()
+
+
+def process_tree_pss_mb(pid):
+    """Proportional set size of a process and its children: pages shared copy-on-write count once in total"""
+    output = subprocess.run(['ps', '-o', 'pid=', '--ppid', str(pid), '-p', str(pid)],
+                            capture_output=True, text=True).stdout
+    total_kb = 0
+    for child in output.split():
+        with open(f'/proc/{child}/smaps_rollup') as f:
+            total_kb += next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+    return total_kb / 1024
+
+
+def bench_metrics(args):
+    def make_app(instrumented):
+        app = Flask('bench')
+        recorder = metrics.Metrics(app) if instrumented else None
+
+        @app.route('/items/<int:item>')
+        def item(item):
+            # A route with a named phase and a branch, like /predict
+            if recorder:
+                recorder.branch('lookup')
+                with recorder.phase('pandas'):
+                    value = item * 2
+            else:
+                value = item * 2
+            return jsonify({'item': value})
+        return app, recorder
+
+    results = {}
+    for instrumented in [False, True] * 5:
+        app, recorder = make_app(instrumented)
+        client = app.test_client()
+        start = time.process_time()
+        for n in range(args.requests):
+            client.get(f'/items/{n % 100}')
+        results.setdefault(instrumented, []).append((time.process_time() - start) / args.requests)
+    plain, instrumented = min(results[False]), min(results[True])
+
+    # The hooks alone, without the rest of Flask's request handling
+    with app.test_request_context('/items/1'):
+        response = app.response_class('{}')
+        start = time.process_time()
+        for _ in range(args.requests):
+            recorder._before_request()
+            recorder.branch('lookup')
+            with recorder.phase('pandas'):
+                pass
+            recorder._after_request(response)
+        hooks = (time.process_time() - start) / args.requests
+
+    start = time.perf_counter()
+    text = recorder.render()
+    render = time.perf_counter() - start
+    print(f"plain Flask route      {plain * 1e6:7.1f} us CPU/request")
+    print(f"with Metrics           {instrumented * 1e6:7.1f} us CPU/request")
+    print(f"overhead               {(instrumented - plain) * 1e6:7.1f} us/request (budget 50 us)")
+    print(f"  of which the hooks   {hooks * 1e6:7.1f} us/request")
+    print(f"/metrics render        {render * 1e3:7.2f} ms for {len(text.splitlines())} lines")
+
+
+# food suggestion.py's TIME_PERIODS; the script itself needs plyer and twilio to import
+SUGGESTION_PERIODS = {"morning": (5, 11), "afternoon": (12, 16), "evening": (17, 23)}
+SUGGESTION_FOODS = ["Idli", "Dosa", "Poha", "Biryani", "Curd Rice", "Lemon Rice", "Pongal", "Upma",
+                    "Chapati", "Paneer Tikka", "Masala Dosa", "Sambar Rice", "Khichdi", "Paratha"]
+
+
+def suggestion_period(hour):
+    for period, (start, end) in SUGGESTION_PERIODS.items():
+        if start <= hour <= end:
+            return period
+    return "morning"
+
+
+def suggestion_row(rng, user, moment):
+    return [f"User {user}", f"+1555{user:07d}", rng.choice(["Chennai", "Mumbai", "Delhi", "Pune"]),
+            "Clear", f"{rng.uniform(15, 38):.1f}", rng.choice(["hot", "moderate", "cold"]),
+            rng.choice(SUGGESTION_FOODS), moment.strftime("%Y-%m-%d %H:%M:%S"), suggestion_period(moment.hour)]
+
+
+def legacy_recent_suggestions(path, name, phone, days=1, time_period=None):
+    """get_recent_suggestions() as it was: the whole CSV read and every row's timestamp parsed"""
+    with open(path, newline='', encoding='utf-8') as file:
+        dataset = list(csv.reader(file))[1:]
+    now = datetime.datetime.now()
+    recent_suggestions = []
+    for row in dataset:
+        if row[0] == name and row[1] == phone:
+            try:
+                suggestion_time = datetime.datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
+                row_time_period = row[8] if len(row) > 8 else suggestion_period(suggestion_time.hour)
+                days_diff = (now - suggestion_time).days
+                if days_diff <= days and (time_period is None or row_time_period == time_period):
+                    recent_suggestions.append(row[6])
+            except Exception:
+                pass
+    return recent_suggestions
+
+
+def write_suggestion_history(path, rows, users, rng):
+    """A user_suggestions.csv of three sends a day per user, oldest first, as the scheduler appends them"""
+    now = datetime.datetime.now()
+    start = now - datetime.timedelta(days=rows / users / 3)
+    step = (now - start) / rows
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for n in range(rows):
+            writer.writerow(suggestion_row(rng, rng.randrange(users), start + step * n))
+    print(f"{rows:,} rows for {users:,} users, {os.path.getsize(path) / 2**20:.0f} MB of CSV")
+
+
+def bench_history(args):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'user_suggestions.csv')
+        write_suggestion_history(path, args.rows, args.users, rng)
+
+        history = SuggestionHistory(path, time_period_of=suggestion_period)
+        t = time.perf_counter()
+        history.sync()
+        print(f"first index build        {time.perf_counter() - t:8.2f} s (once; later syncs read only appended bytes)")
+
+        def send(lookup, append, user):
+            # What send_auto_suggestion() does against the history: look up, then record
+            period = suggestion_period(datetime.datetime.now().hour)
+            previous = lookup(f"User {user}", f"+1555{user:07d}", 1, period)
+            append(suggestion_row(rng, user, datetime.datetime.now()))
+            return previous
+
+        def csv_append(row):
+            with open(path, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerow(row)
+
+        results = {}
+        for name, lookup, append, sends in [
+                ('full CSV scan', lambda *key: legacy_recent_suggestions(path, *key), csv_append, args.legacy_sends),
+                ('indexed history', history.recent_foods, history.add, args.sends)]:
+            samples = []
+            for _ in range(sends):
+                user = rng.randrange(args.users)
+                t = time.perf_counter()
+                send(lookup, append, user)
+                samples.append(time.perf_counter() - t)
+            results[name] = samples
+            print(f"{name:<24} n={sends:<5} p50={percentile_ms(samples, 50):9.2f} ms  "
+                  f"p99={percentile_ms(samples, 99):9.2f} ms per send")
+
+        # Rows written by another process are picked up on the next lookup
+        for _ in range(1000):
+            csv_append(suggestion_row(rng, rng.randrange(args.users), datetime.datetime.now()))
+        t = time.perf_counter()
+        history.has_user("User 0", "+15550000000")
+        print(f"after 1,000 external rows {(time.perf_counter() - t) * 1000:7.2f} ms for the next lookup")
+
+        users = rng.sample(range(args.users), 20)
+        same = all(history.recent_foods(f"User {u}", f"+1555{u:07d}", days, period)
+                   == legacy_recent_suggestions(path, f"User {u}", f"+1555{u:07d}", days, period)
+                   for u in users[:10] for days, period in [(1, None), (7, 'evening')])
+        print('same suggestions as the CSV scan:', same)
+        history.close()
+
+
+def bench_delivery(args):
+    rng = random.Random(42)
+    cities = [f"City {n}" for n in range(args.locations)]
+    recipients = [Recipient(f"User {n}", f"+1555{n:07d}", rng.choice(cities)) for n in range(args.recipients)]
+    calls = {'weather': 0, 'sms': 0}
+    lock = threading.Lock()
+
+    def fetch_weather(location):
+        with lock:
+            calls['weather'] += 1
+        time.sleep(args.weather_latency)
+        return 28.0, "Clear"
+
+    def send_sms(phone, text):
+        with lock:
+            calls['sms'] += 1
+        time.sleep(args.sms_latency)
+
+    def compose(recipient, weather, time_period, previous, now):
+        food = rng.choice([food for food in SUGGESTION_FOODS if food not in previous] or SUGGESTION_FOODS)
+        row = [recipient.name, recipient.phone, recipient.location, weather[1], weather[0], "moderate",
+               food, now.strftime("%Y-%m-%d %H:%M:%S"), time_period]
+        return row, f"Here's your {time_period} food suggestion: {food}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = SuggestionHistory(os.path.join(tmp, 'user_suggestions.csv'), time_period_of=suggestion_period)
+
+        # What each schedule job did before: weather, history, write and SMS, one user after another
+        legacy = recipients[:args.legacy_recipients]
+        start = time.perf_counter()
+        for recipient in legacy:
+            now = datetime.datetime.now()
+            period = suggestion_period(now.hour)
+            weather = fetch_weather(recipient.location)
+            previous = history.recent_foods(recipient.name, recipient.phone, 1, period)
+            row, text = compose(recipient, weather, period, previous, now)
+            history.add(row)
+            send_sms(recipient.phone, text)
+        per_user = (time.perf_counter() - start) / len(legacy)
+        print(f"one job per user         {per_user * 1000:7.1f} ms/user -> {per_user * args.recipients:7.1f} s "
+              f"for {args.recipients:,} users (measured on {len(legacy)})")
+
+        calls.update(weather=0, sms=0)
+        engine = DeliveryEngine(fetch_weather, compose, send_sms, history, suggestion_period,
+                                workers=args.workers, rate=args.sms_rate, burst=args.workers)
+        for recipient in recipients:
+            engine.add("08:30", recipient)
+        report = engine.deliver("08:30")
+        engine.close()
+        print(f"slot delivery            {report.seconds:7.1f} s for {report.recipients:,} users "
+              f"({report.sent:,} sent, {report.failed} failed); weather calls {calls['weather']}, "
+              f"SMS {calls['sms']:,}; floor at {args.sms_rate:.0f} SMS/s is "
+              f"{args.recipients / args.sms_rate:.1f} s")
+        history.close()
+
+
+def legacy_current_temperature(base_url, location):
+    """get_current_temperature() as it was: a new connection per call, no timeout, made-up fallback"""
+    try:
+        data = requests.get(f"{base_url}/current.json?key=benchmark&q={location}").json()
+        return data["current"]["temp_c"], data["current"]["condition"]["text"]
+    except Exception:
+        return 25, "Unknown"
+
+
+def bench_weather(args):
+    server = fake_weather.start(latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    rng = random.Random(42)
+    # A crowded slot: many users, a handful of cities, written the way people type them
+    cities = [f"City {n}" for n in range(args.locations)]
+    lookups = [rng.choice([city, city.upper(), f"  {city.lower()} "]) for city in rng.choices(cities, k=args.lookups)]
+
+    def run_slot(lookup):
+        samples = []
+
+        def worker(locations):
+            for location in locations:
+                t = time.perf_counter()
+                lookup(location)
+                samples.append(time.perf_counter() - t)
+        threads = [threading.Thread(target=worker, args=(lookups[n::args.threads],)) for n in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    for name, lookup in [('no cache', lambda location: legacy_current_temperature(base_url, location)),
+                         ('WeatherCache', WeatherCache('benchmark', base_url=base_url).current)]:
+        server.requests = 0
+        samples, elapsed = run_slot(lookup)
+        print(f"{name:<14} {len(samples)} lookups by {args.threads} threads in {elapsed:5.2f} s  "
+              f"p50={percentile_ms(samples, 50):7.2f} ms  p99={percentile_ms(samples, 99):7.2f} ms  "
+              f"API calls={server.requests}")
+
+    # TTL, stale-while-revalidate, stale fallback and the timeout, on a short clock
+    cache = WeatherCache('benchmark', base_url=base_url, ttl=0.5, stale_ttl=60, timeout=args.latency * 3)
+    fresh = cache.current("City 0")
+    server.requests = 0
+    checks = {'hit within the TTL': cache.current(" city 0") == fresh and server.requests == 0}
+    time.sleep(0.6)
+    t = time.perf_counter()
+    stale = cache.current("City 0")
+    checks['stale reading answered at once'] = stale == fresh and time.perf_counter() - t < args.latency / 2
+    time.sleep(args.latency * 2)
+    checks['refreshed in the background'] = server.requests == 1
+    server.failing = True
+    time.sleep(0.6)
+    cache.current("City 0")  # stale again; its refresh fails
+    time.sleep(args.latency * 2)
+    checks['API down: last reading kept'] = cache.current("City 0") == fresh
+    checks['API down, never read: default'] = cache.current("Nowhere") == DEFAULT_WEATHER
+    server.failing = False
+    server.latency = args.latency * 10
+    t = time.perf_counter()
+    cache.current("Slow City")
+    checks['slow API: gave up after the timeout'] = time.perf_counter() - t < args.latency * 5
+    server.latency = args.latency
+    for name, ok in checks.items():
+        print(f"  {name:<36} {'ok' if ok else 'FAILED'}")
+    print('stats:', json.dumps(cache.stats()))
+    server.shutdown()
+
+
+def lateness_report(name, lateness, cpu, wall):
+    print(f"{name:<22} fired {len(lateness):,}  late p50={percentile_ms(lateness, 50):9.2f} ms  "
+          f"p99={percentile_ms(lateness, 99):9.2f} ms  max={max(lateness) * 1000:9.2f} ms  "
+          f"CPU {cpu:5.2f} s over {wall:5.1f} s")
+
+
+def bench_scheduler(args):
+    import schedule
+
+    rng = random.Random(42)
+    # Registering 100k schedule jobs takes seconds; a time already passed would move to tomorrow
+    start = time.time() + 10
+    # Whole seconds, as schedule's at("HH:MM:SS") cannot express anything finer (the script uses HH:MM)
+    offsets = [rng.randrange(int(args.window)) for _ in range(args.jobs)]
+    dues = [int(start) + offset for offset in offsets]
+
+    # schedule as food suggestion.py ran it: run_pending(), then sleep for the tick
+    legacy = schedule.Scheduler()
+    lateness = []
+    for n, due in enumerate(dues):
+        at = datetime.datetime.fromtimestamp(due).strftime("%H:%M:%S")
+        legacy.every().day.at(at).do(lambda due=due: lateness.append(time.time() - due)).tag(f"user_{n}")
+    t = time.perf_counter()
+    legacy.run_pending()
+    tick = time.perf_counter() - t
+    cpu, wall = time.process_time(), time.perf_counter()
+    while len(lateness) < len(dues) and time.time() < max(dues) + 2 * args.legacy_tick:
+        time.sleep(args.legacy_tick)
+        legacy.run_pending()
+    lateness_report(f"schedule, {args.legacy_tick:.0f} s tick", lateness, time.process_time() - cpu,
+                    time.perf_counter() - wall)
+    print(f"{'':<22} one idle tick walks all {args.jobs:,} jobs: {tick * 1000:.1f} ms")
+
+    lateness = []
+    done = threading.Event()
+
+    def fire(jobs):
+        now = time.time()
+        lateness.extend(now - job.due for job in jobs)
+        if len(lateness) >= len(dues):
+            done.set()
+
+    start = time.time() + 5
+    dues = [int(start) + offset for offset in offsets]
+    scheduler = TimerScheduler(fire)
+    t = time.perf_counter()
+    scheduler.add_many((f"user_{n}", "08:30", {"n": n}, due) for n, due in enumerate(dues))
+    added = time.perf_counter() - t
+    cpu, wall = time.process_time(), time.perf_counter()
+    scheduler.start()
+    done.wait()
+    lateness_report("min-heap scheduler", lateness, time.process_time() - cpu, time.perf_counter() - wall)
+    print(f"{'':<22} adding {args.jobs:,} jobs: {added:.2f} s")
+
+    # Single operations against a full heap
+    ids = rng.sample(range(args.jobs), 1000)
+    t = time.perf_counter()
+    for n in ids:
+        scheduler.add(f"user_{n}", "13:30", {"n": n})
+    add = (time.perf_counter() - t) / len(ids)
+    t = time.perf_counter()
+    for n in ids:
+        scheduler.cancel(f"user_{n}")
+    cancel = (time.perf_counter() - t) / len(ids)
+    print(f"{'':<22} add {add * 1e6:.0f} us, cancel {cancel * 1e6:.0f} us")
+    scheduler.close()
+
+
+def legacy_startup_schedules(path):
+    """startup() as it was: every row replayed, the latest time per user and period kept"""
+    with open(path, newline='', encoding='utf-8') as file:
+        dataset = list(csv.reader(file))[1:]
+    user_schedules = {}
+    for row in dataset:
+        user_schedules.setdefault((row[0], row[1]), [])
+        if len(row) >= 8:
+            try:
+                dt = datetime.datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
+                user_schedules[(row[0], row[1])].append({
+                    'time': dt.strftime("%H:%M"), 'location': row[2],
+                    'time_period': row[8] if len(row) > 8 else suggestion_period(dt.hour)})
+            except Exception:
+                pass
+    schedules = []
+    for (name, phone), timestamps in user_schedules.items():
+        period_times = {"morning": [], "afternoon": [], "evening": []}
+        for entry in timestamps:
+            period_times[entry['time_period']].append(entry)
+        for period, entries in period_times.items():
+            if entries:
+                schedules.append((name, phone, period, entries[-1]['time'], entries[-1]['location'], None))
+    return schedules
+
+
+def bench_boot(args):
+    rng = random.Random(42)
+
+    def register(schedules):
+        scheduler = TimerScheduler(lambda jobs: None)
+        scheduler.add_many((f"{name}_{phone}_{at}", at, {"name": name, "phone": phone, "location": location,
+                                                         "food_type": food_type}, None)
+                           for name, phone, _, at, location, food_type in schedules)
+        return len(scheduler)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'user_suggestions.csv')
+        write_suggestion_history(path, args.rows, args.users, rng)
+
+        t = time.perf_counter()
+        replayed = legacy_startup_schedules(path)
+        jobs = register(replayed)
+        print(f"replay the CSV           {time.perf_counter() - t:7.2f} s  ({jobs:,} jobs)")
+
+        # One-off costs the first time the new code sees this history
+        history = SuggestionHistory(path, time_period_of=suggestion_period)
+        t = time.perf_counter()
+        history.sync()
+        indexed = time.perf_counter() - t
+        t = time.perf_counter()
+        history.schedules()
+        print(f"first boot only          {indexed:7.2f} s to index the CSV, {time.perf_counter() - t:.2f} s "
+              f"to derive the snapshot")
+        history.close()
+
+        t = time.perf_counter()
+        history = SuggestionHistory(path, time_period_of=suggestion_period)
+        snapshot = history.schedules()
+        jobs = register(snapshot)
+        print(f"load the snapshot        {time.perf_counter() - t:7.2f} s  ({jobs:,} jobs)")
+        print('same schedules as the replay:', sorted(snapshot) == sorted(replayed))
+        history.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cache = sub.add_parser('cache', help='chat latency with and without the response cache')
+    cache.add_argument('--app', choices=['food', 'dress'], default='food')
+    cache.add_argument('--requests', type=int, default=400)
+    cache.add_argument('--distinct', type=int, default=40, help='different messages among the requests')
+    cache.add_argument('--latency', type=float, default=0.3, help='fake Gemini reply delay in seconds')
+    cache.set_defaults(run=bench_cache)
+
+    load = sub.add_parser('load', help='throughput and tail latency of concurrent chat users')
+    load.add_argument('--users', type=int, default=50)
+    load.add_argument('--duration', type=float, default=20, help='seconds per mode')
+    load.add_argument('--latency', type=float, default=0.3, help='fake Gemini reply delay in seconds')
+    load.add_argument('--error-rate', type=float, default=0.0, help='share of fake Gemini calls failing')
+    load.add_argument('--max-concurrency', type=int, default=50, help='Gemini calls in flight at once')
+    load.set_defaults(run=bench_load)
+
+    stream = sub.add_parser('stream', help='time to first byte, /api/chat vs /api/chat/stream')
+    stream.add_argument('--requests', type=int, default=20)
+    stream.add_argument('--latency', type=float, default=0.3, help='fake Gemini delay before the first word')
+    stream.add_argument('--token-delay', type=float, default=0.03, help='fake Gemini seconds per word')
+    stream.set_defaults(run=bench_stream)
+
+    sessions = sub.add_parser('sessions', help='/api/chat latency and memory with many users')
+    sessions.add_argument('--users', type=int, default=100000)
+    sessions.add_argument('--messages', type=int, default=3, help='messages per user')
+    sessions.add_argument('--cache-users', type=int, default=10000, help='sessions kept in memory')
+    sessions.add_argument('--store', choices=['unbounded', 'sqlite'], help=argparse.SUPPRESS)
+    sessions.set_defaults(run=bench_sessions)
+
+    prefs = sub.add_parser('preferences', help='messages/second through the preference extractor')
+    prefs.add_argument('--messages', type=int, default=50000)
+    prefs.add_argument('--per-user', type=int, default=20, help='messages per simulated user')
+    prefs.set_defaults(run=bench_preferences)
+
+    prompts = sub.add_parser('prompts', help='CPU time and request size of prompt building')
+    prompts.add_argument('--users', type=int, default=1000)
+    prompts.add_argument('--turns', type=int, default=20, help='messages per user')
+    prompts.set_defaults(run=bench_prompts)
+
+    serve = sub.add_parser('serve', help='throughput of the dev server vs serve.py (gunicorn, waitress)')
+    serve.add_argument('--app', choices=['food', 'dress'], default='food')
+    serve.add_argument('--modes', nargs='+', choices=list(SERVE_MODES), default=list(SERVE_MODES))
+    serve.add_argument('--users', type=int, default=64)
+    serve.add_argument('--duration', type=float, default=15)
+    serve.add_argument('--latency', type=float, default=0.3, help='fake Gemini seconds per call')
+    serve.add_argument('--port', type=int, default=5055)
+    serve.set_defaults(run=bench_serve)
+
+    metrics_parser = sub.add_parser('metrics', help='per-request cost of the metrics hooks')
+    metrics_parser.add_argument('--requests', type=int, default=10000, help='per round; best of 5 rounds')
+    metrics_parser.set_defaults(run=bench_metrics)
+
+    history = sub.add_parser('history', help='per-send history lookup, full CSV scan vs indexed store')
+    history.add_argument('--rows', type=int, default=1000000)
+    history.add_argument('--users', type=int, default=10000)
+    history.add_argument('--sends', type=int, default=2000)
+    history.add_argument('--legacy-sends', type=int, default=5, help='sends timed with the full scan')
+    history.set_defaults(run=bench_history)
+
+    delivery = sub.add_parser('delivery', help='time to deliver one crowded schedule slot')
+    delivery.add_argument('--recipients', type=int, default=2000)
+    delivery.add_argument('--locations', type=int, default=50)
+    delivery.add_argument('--workers', type=int, default=16)
+    delivery.add_argument('--sms-rate', type=float, default=200, help='SMS per second allowed by the provider')
+    delivery.add_argument('--weather-latency', type=float, default=0.2, help='seconds per weather call')
+    delivery.add_argument('--sms-latency', type=float, default=0.05, help='seconds per SMS call')
+    delivery.add_argument('--legacy-recipients', type=int, default=50, help='users timed one job at a time')
+    delivery.set_defaults(run=bench_delivery)
+
+    weather = sub.add_parser('weather', help='weather lookups of a crowded slot, with and without WeatherCache')
+    weather.add_argument('--lookups', type=int, default=400)
+    weather.add_argument('--locations', type=int, default=20)
+    weather.add_argument('--threads', type=int, default=16)
+    weather.add_argument('--latency', type=float, default=0.2, help='fake weather API seconds per call')
+    weather.set_defaults(run=bench_weather)
+
+    timer = sub.add_parser('scheduler', help='firing accuracy and CPU of schedule vs the min-heap scheduler')
+    timer.add_argument('--jobs', type=int, default=100000)
+    timer.add_argument('--window', type=float, default=20, help='seconds the due times are spread over')
+    timer.add_argument('--legacy-tick', type=float, default=60, help="seconds run_scheduler() slept between ticks")
+    timer.set_defaults(run=bench_scheduler)
+
+    boot = sub.add_parser('boot', help='startup() scheduling: CSV replay vs the schedule snapshot')
+    boot.add_argument('--rows', type=int, default=1000000)
+    boot.add_argument('--users', type=int, default=10000)
+    boot.set_defaults(run=bench_boot)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
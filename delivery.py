@@ -0,0 +1,203 @@
+"""Delivery of scheduled food suggestions, one time slot at a time.
+
+food suggestion.py used to register a schedule job per user and period,
+and each job fetched the weather, scanned the history, appended to the
+CSV and sent its SMS before the next job could start. A DeliveryEngine
+instead keeps the recipients of each "HH:MM" slot together and delivers
+a slot in one go:
+
+  1. the weather is fetched once per distinct location, in parallel
+  2. each recipient's suggestion is composed from that weather and their
+     recent history
+  3. the history rows are written a batch at a time (one CSV append and
+     one index sync per batch)
+  4. the SMS of a written batch go out through a bounded worker pool,
+     paced by a token bucket so the provider's rate limit is respected
+
+Environment:
+    DELIVERY_WORKERS      weather calls / SMS sends in flight at once (default 8)
+    DELIVERY_SMS_RATE     SMS per second across all workers, 0 for no limit (default 10)
+    DELIVERY_SMS_BURST    SMS that may go out at once after a quiet spell (default 10)
+    DELIVERY_WRITE_BATCH  history rows per write (default 500)
+    DELIVERY_WINDOW       seconds a slot should be delivered in (default 300)
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Recipient:
+    name: str
+    phone: str
+    location: str
+    food_type: Optional[str] = None
+
+
+@dataclass
+class SlotReport:
+    slot: str
+    recipients: int = 0
+    locations: int = 0
+    sent: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return (f"slot {self.slot}: {self.sent}/{self.recipients} sent, {self.failed} failed, "
+                f"{self.locations} locations, {self.seconds:.1f} s")
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and `burst` at once.
+
+    A caller that finds the bucket empty takes its token anyway and sleeps
+    until it would have refilled, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(1.0, float(burst or rate or 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait_for = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait_for:
+            time.sleep(wait_for)
+
+
+class DeliveryEngine:
+    """Recipients grouped by slot, and the delivery of a whole slot.
+
+    fetch_weather(location) -> (temperature, condition)
+    compose(recipient, (temperature, condition), time_period, previous_foods, now) -> (history row, SMS text)
+    send_sms(phone, text) raises when the message was not accepted
+    history is a SuggestionHistory; time_period_of(hour) names the period
+    """
+
+    def __init__(self, fetch_weather, compose, send_sms, history, time_period_of,
+                 workers=None, rate=None, burst=None, write_batch=None, window=None):
+        self.fetch_weather = fetch_weather
+        self.compose = compose
+        self.send_sms = send_sms
+        self.history = history
+        self.time_period_of = time_period_of
+        self.workers = workers or int(os.getenv('DELIVERY_WORKERS', 8))
+        rate = rate if rate is not None else float(os.getenv('DELIVERY_SMS_RATE', 10))
+        self.limiter = TokenBucket(rate, burst or float(os.getenv('DELIVERY_SMS_BURST', 10)))
+        self.write_batch = write_batch or int(os.getenv('DELIVERY_WRITE_BATCH', 500))
+        self.window = window or float(os.getenv('DELIVERY_WINDOW', 300))
+        self._slots = {}  # "HH:MM" -> {(name, phone): Recipient}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    # === Recipients ===
+    def add(self, slot, recipient):
+        """Put the recipient in the slot; True when the slot is new and needs a job"""
+        with self._lock:
+            new_slot = slot not in self._slots
+            # Scheduling the same user twice at one time still sends them one message
+            self._slots.setdefault(slot, {})[(recipient.name, recipient.phone)] = recipient
+        return new_slot
+
+    def recipients(self, slot):
+        with self._lock:
+            return list(self._slots.get(slot, {}).values())
+
+    def slots(self):
+        with self._lock:
+            return sorted(self._slots)
+
+    # === Delivery ===
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='delivery')
+        return self._pool
+
+    def deliver(self, slot, now=None):
+        """Send every recipient of the slot their suggestion; returns a SlotReport"""
+        return self.deliver_to(self.recipients(slot), slot, now)
+
+    def deliver_to(self, recipients, slot, now=None):
+        start = time.monotonic()
+        now = now or datetime.datetime.now()
+        time_period = self.time_period_of(now.hour)
+        report = SlotReport(slot, recipients=len(recipients))
+        if not recipients:
+            return report
+        if self.limiter.rate and len(recipients) / self.limiter.rate > self.window:
+            log.warning('Slot %s: %d SMS at %.0f/s take longer than the %.0f s window',
+                        slot, len(recipients), self.limiter.rate, self.window)
+
+        pool = self._executor()
+        locations = sorted({recipient.location for recipient in recipients})
+        report.locations = len(locations)
+        weather = dict(zip(locations, pool.map(self._weather, locations)))
+
+        sends = []
+        for begin in range(0, len(recipients), self.write_batch):
+            rows, outbox = [], []
+            for recipient in recipients[begin:begin + self.write_batch]:
+                if weather[recipient.location] is None:
+                    report.failed += 1
+                    continue
+                try:
+                    previous = self.history.recent_foods(recipient.name, recipient.phone, days=1,
+                                                         time_period=time_period)
+                    row, text = self.compose(recipient, weather[recipient.location], time_period, previous, now)
+                except Exception:
+                    log.exception('Could not compose a suggestion for %s', recipient.name)
+                    report.failed += 1
+                    continue
+                rows.append(row)
+                outbox.append((recipient, text))
+            # Recorded before sending, as the single-user flow did
+            self.history.add_many(rows)
+            sends += [pool.submit(self._send, recipient, text) for recipient, text in outbox]
+
+        wait(sends)
+        for future in sends:
+            if future.result():
+                report.sent += 1
+            else:
+                report.failed += 1
+        report.seconds = time.monotonic() - start
+        return report
+
+    def _weather(self, location):
+        try:
+            return self.fetch_weather(location)
+        except Exception:
+            # Only the recipients in this location miss out
+            log.exception('Weather lookup for %s failed', location)
+            return None
+
+    def _send(self, recipient, text):
+        self.limiter.acquire()
+        try:
+            self.send_sms(recipient.phone, text)
+            return True
+        except Exception as e:
+            log.warning('SMS to %s failed: %s', recipient.phone, e)
+            return False
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,293 @@
+"""Quantity sold over any date range, grouped by any dimensions and period.
+
+    GET /analytics?start=2023-01-01&end=2023-12-31&group_by=Agent,Quality
+                  &granularity=month&Composition=100% Cotton
+
+    start, end    inclusive dates; the whole history when left out
+    group_by      comma-separated category columns (Agent, Customer, Quality, ...)
+    granularity   day, week (starting Monday), month or year; no time bucket when left out
+    <column>=...  keep only rows with these values (case-insensitive); repeat the
+                  parameter or separate values with commas
+
+The answer is columnar, one list per column:
+
+    {"columns": ["period", "Agent", "Quality", "Quantity"],
+     "data": [["2023-01", ...], ["Mark", ...], ["Premium", ...], [412, ...]],
+     "rows": 48, "engine": "pandas"}
+
+Runs on DuckDB when it is installed (or ANALYTICS_ENGINE=duckdb), otherwise
+on pandas. The pandas engine scans ANALYTICS_CHUNK_ROWS rows at a time and
+copies only the columns the query needs, so a query over years of sales
+holds one chunk's worth of rows plus the partial sums, never a filtered
+copy of the whole frame.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from sales_store import CATEGORY_COLUMNS
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+log = logging.getLogger(__name__)
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+CHUNK_ROWS = int(os.getenv('ANALYTICS_CHUNK_ROWS', 250_000))
+# Bigger answers are refused rather than built; narrow the range or the group-by
+MAX_GROUPS = int(os.getenv('ANALYTICS_MAX_GROUPS', 100_000))
+DUCKDB_MEMORY_LIMIT = os.getenv('ANALYTICS_DUCKDB_MEMORY', '1GB')
+
+
+def default_engine():
+    engine = os.getenv('ANALYTICS_ENGINE') or ('duckdb' if duckdb else 'pandas')
+    if engine == 'duckdb' and duckdb is None:
+        log.warning('duckdb is not installed; running analytics on pandas')
+        engine = 'pandas'
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown ANALYTICS_ENGINE: {engine}')
+    return engine
+
+
+@dataclass(frozen=True)
+class AnalyticsQuery:
+    start: Optional[pd.Timestamp] = None
+    end: Optional[pd.Timestamp] = None
+    group_by: tuple = ()
+    filters: tuple = ()  # ((column, (value, ...)), ...)
+    granularity: Optional[str] = None
+
+    @classmethod
+    def from_args(cls, args):
+        """Parse request.args, raising ValueError for anything the engines can't run"""
+        columns = {column.lower(): column for column in CATEGORY_COLUMNS}
+
+        def column_name(name):
+            if name.lower() not in columns:
+                raise ValueError(f"Unknown column: {name} (one of {', '.join(CATEGORY_COLUMNS)})")
+            return columns[name.lower()]
+
+        start = pd.Timestamp(args['start']).normalize() if args.get('start') else None
+        end = pd.Timestamp(args['end']).normalize() if args.get('end') else None
+        if start is not None and end is not None and end < start:
+            raise ValueError('end must not be before start')
+
+        group_by = tuple(dict.fromkeys(
+            column_name(name.strip()) for name in args.get('group_by', '').split(',') if name.strip()))
+
+        granularity = args.get('granularity') or None
+        if granularity is not None and granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+        filters = []
+        for name in args:
+            if name.lower() in columns:
+                values = [v.strip() for value in args.getlist(name) for v in value.split(',') if v.strip()]
+                if values:
+                    filters.append((column_name(name), tuple(values)))
+        return cls(start, end, group_by, tuple(filters), granularity)
+
+    @property
+    def keys(self):
+        return (('period',) if self.granularity else ()) + self.group_by
+
+
+def matching_values(column, values):
+    """The categories of `column` equal to any of `values`, ignoring case"""
+    wanted = {value.lower() for value in values}
+    return [c for c in column.cat.categories if str(c).lower() in wanted]
+
+
+def aggregate(df, query, engine=None):
+    """Run the query over a sales frame; returns the columnar answer"""
+    engine = engine or default_engine()
+    # Filter values are resolved against the frame's categories, so both engines match the same rows
+    filters = [(column, matching_values(df[column], values)) for column, values in query.filters]
+    columns, data = ENGINES[engine](df, query, filters)
+    return {'columns': columns, 'data': data, 'rows': len(data[-1]), 'engine': engine}
+
+
+def _check_size(groups):
+    if groups > MAX_GROUPS:
+        raise ValueError(f'The answer would have {groups:,} rows (limit {MAX_GROUPS:,}); '
+                         'narrow the date range, the filters or the group_by')
+
+
+# === pandas ===
+# Each group is one int64 key: the period code, then the category codes of the group_by
+# columns as mixed-radix digits, so a chunk is summed with np.bincount instead of groupby
+MAX_KEY_SPACE = 2 ** 40
+
+
+def _period_codes(chunk, rows, granularity):
+    """An integer per selected row identifying its period; turned into labels only once per group"""
+    def column(name):
+        return chunk[name].to_numpy()[rows].astype(np.int64)
+
+    if granularity == 'year':
+        return column('Year')
+    if granularity == 'month':
+        return column('Year') * 12 + column('Month') - 1
+    days = chunk['Date'].to_numpy()[rows].astype('datetime64[D]').astype(np.int64)
+    if granularity == 'week':
+        days = days - column('DayOfWeek')
+    return days
+
+
+def _period_labels(codes, granularity):
+    if granularity == 'year':
+        return [str(code) for code in codes.tolist()]
+    if granularity == 'month':
+        return [f'{code // 12}-{code % 12 + 1:02d}' for code in codes.tolist()]
+    return np.datetime_as_string(codes.astype('datetime64[D]')).tolist()
+
+
+def _sum_by_key(keys, quantity):
+    """(distinct keys, sorted; Quantity summed per key)"""
+    low, high = int(keys.min()), int(keys.max())
+    if high - low <= 4 * len(keys) + 1024:
+        # Dense enough to count straight into an array over the key range
+        offsets = keys - low
+        counts = np.bincount(offsets)
+        sums = np.bincount(offsets, weights=quantity)
+        present = np.flatnonzero(counts)
+        return present + low, sums[present]
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    return distinct, np.bincount(inverse, weights=quantity, minlength=len(distinct))
+
+
+def _aggregate_pandas(df, query, filters):
+    keys = query.keys
+    # Compared as raw datetime64, and filters as a lookup table indexed by category code
+    # (-1, a missing value, hits the extra False at the end)
+    date_unit = df['Date'].to_numpy().dtype
+    start = np.datetime64(query.start).astype(date_unit) if query.start is not None else None
+    end = np.datetime64(query.end + pd.Timedelta(days=1)).astype(date_unit) if query.end is not None else None
+    lookups = []
+    for column, values in filters:
+        lookup = np.zeros(len(df[column].cat.categories) + 1, dtype=bool)
+        lookup[df[column].cat.categories.get_indexer(values)] = True
+        lookups.append((column, lookup))
+
+    categories = [df[column].cat.categories for column in query.group_by]
+    radices = [max(len(values), 1) for values in categories]
+    strides = [int(np.prod(radices[i + 1:], dtype=np.int64)) for i in range(len(radices))]
+    key_space = int(np.prod(radices, dtype=np.int64))
+    if key_space > MAX_KEY_SPACE:
+        raise ValueError('Too many group_by combinations; group by fewer columns')
+
+    partials = []
+    total = 0
+    for begin in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[begin:begin + CHUNK_ROWS]
+        mask = np.ones(len(chunk), dtype=bool)
+        if start is not None or end is not None:
+            dates = chunk['Date'].to_numpy()
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                mask &= dates < end
+        for column, lookup in lookups:
+            mask &= lookup[chunk[column].cat.codes.to_numpy()]
+        rows = np.flatnonzero(mask)
+        # Only the key columns and Quantity of the matching rows are copied
+        codes = [chunk[column].cat.codes.to_numpy()[rows] for column in query.group_by]
+        if codes:
+            # Rows without a value are left out, as groupby does
+            present = np.logical_and.reduce([column_codes >= 0 for column_codes in codes])
+            if not present.all():
+                rows = rows[present]
+                codes = [column_codes[present] for column_codes in codes]
+        if not len(rows):
+            continue
+        quantity = chunk['Quantity'].to_numpy()[rows]
+        if not keys:
+            total += int(quantity.sum())
+            continue
+        key = np.zeros(len(rows), dtype=np.int64)
+        if query.granularity:
+            key += _period_codes(chunk, rows, query.granularity) * key_space
+        for column_codes, stride in zip(codes, strides):
+            key += column_codes.astype(np.int64) * stride
+        partial = _sum_by_key(key, quantity)
+        _check_size(len(partial[0]))
+        partials.append(partial)
+
+    if not keys:
+        return ['Quantity'], [[total]]
+    if not partials:
+        return list(keys) + ['Quantity'], [[] for _ in range(len(keys) + 1)]
+    if len(partials) == 1:
+        distinct, sums = partials[0]
+    else:
+        distinct, sums = _sum_by_key(np.concatenate([p[0] for p in partials]),
+                                     np.concatenate([p[1] for p in partials]))
+    _check_size(len(distinct))
+
+    # Keys sort by period, then by each column's category order, like a sorted groupby
+    data = []
+    if query.granularity:
+        data.append(_period_labels(distinct // key_space, query.granularity))
+    for values, radix, stride in zip(categories, radices, strides):
+        labels = np.asarray(values.astype(str), dtype=object)
+        data.append(labels[(distinct % key_space) // stride % radix].tolist())
+    data.append(np.rint(sums).astype(np.int64).tolist())
+    return list(keys) + ['Quantity'], data
+
+
+# === DuckDB ===
+PERIOD_SQL = {
+    'day': "strftime(\"Date\", '%Y-%m-%d')",
+    'week': "strftime(date_trunc('week', \"Date\"), '%Y-%m-%d')",
+    'month': "strftime(\"Date\", '%Y-%m')",
+    'year': "CAST(year(\"Date\") AS VARCHAR)",
+}
+
+
+def _aggregate_duckdb(df, query, filters):
+    keys = query.keys
+    selects = [f'{PERIOD_SQL[query.granularity]} AS period'] if query.granularity else []
+    selects += [f'CAST("{column}" AS VARCHAR) AS "{column}"' for column in query.group_by]
+    where, params = [], []
+    if query.start is not None:
+        where.append('"Date" >= ?')
+        params.append(query.start.to_pydatetime())
+    if query.end is not None:
+        where.append('"Date" < ?')
+        params.append((query.end + pd.Timedelta(days=1)).to_pydatetime())
+    for column, values in filters:
+        if not values:
+            where.append('FALSE')
+            continue
+        where.append(f'CAST("{column}" AS VARCHAR) IN ({", ".join("?" * len(values))})')
+        params.extend(str(value) for value in values)
+
+    sql = f'SELECT {", ".join(selects + ["CAST(SUM(Quantity) AS BIGINT) AS Quantity"])} FROM sales'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    if keys:
+        positions = ', '.join(str(i + 1) for i in range(len(keys)))
+        sql += f' GROUP BY {positions} ORDER BY {positions} LIMIT {MAX_GROUPS + 1}'
+
+    # A connection per query: the frame it scans is replaced after every ingest
+    con = duckdb.connect()
+    try:
+        con.execute(f"SET memory_limit='{DUCKDB_MEMORY_LIMIT}'")
+        con.register('sales', df)
+        rows = con.execute(sql, params).fetchall()
+    finally:
+        con.close()
+    if not keys:
+        return ['Quantity'], [[int(rows[0][0] or 0)]]
+    _check_size(len(rows))
+    data = [list(column) for column in zip(*rows)] if rows else [[] for _ in range(len(keys) + 1)]
+    return list(keys) + ['Quantity'], data
+
+
+ENGINES = {'pandas': _aggregate_pandas, 'duckdb': _aggregate_duckdb}
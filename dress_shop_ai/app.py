@@ -1,10 +1,23 @@
+import io
+import json
 import os
+import sys
 from flask import Flask, render_template, request, jsonify, session
 from dotenv import load_dotenv
 import pandas as pd
-import joblib
 import datetime
-import requests
+from compact_forest import load_encoders, load_model
+from dashboard import DashboardSnapshots
+from forecast import DemandForecaster, ForecastUnavailable, clean_composition
+import analytics
+import intent
+from sales_cube import DIMENSIONS
+from sales_store import SalesStore
+
+# The Gemini client is shared with the food chat API in the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gemini_client import GeminiClient, GeminiError
+from metrics import Metrics, gemini_metrics
 
 # Load environment variables
 load_dotenv()
@@ -14,38 +27,42 @@ print("Loaded Gemini API Key:", os.getenv('GEMINI_API_KEY'))
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # For session support
 
-# Load model and encoders
-model = joblib.load('model.pkl')
-encoders = joblib.load('encoders.pkl')
+# Load dataset once (data.csv, or a Parquet dataset from storage.py); Date is parsed a single time by the store
+store = SalesStore.load(os.getenv('SALES_DATA', 'data.csv'))
+# Dashboard charts per month, prebuilt and refreshed in the background after ingests
+snapshots = DashboardSnapshots(store)
+
+# The model and encoders are mapped in lazily, on the first forecast
+forecaster = DemandForecaster(load_model, load_encoders, store)
 
-# Load dataset for context
-df = pd.read_csv('data.csv')
+# Gemini API call function; repeated prompts are served from the response cache
+llm = GeminiClient(api_key=os.getenv('GEMINI_API_KEY'))
 
-# Gemini API call function
+# Route latency by predict() branch, pandas vs Gemini time and errors, in Prometheus format on /metrics
+metrics = Metrics(app)
+metrics.add_collector(gemini_metrics(llm))
 
 def call_gemini_api(user_input, api_key):
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
-    data = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": user_input
-                    }
-                ]
-            }
-        ]
-    }
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        result = response.json()
-        try:
-            return result['candidates'][0]['content']['parts'][0]['text']
-        except Exception:
+    try:
+        with metrics.phase('gemini'):
+            return llm.generate(user_input, api_key=api_key)
+    except GeminiError as e:
+        if e.status_code == 200:
             return "Sorry, I couldn't understand the response from Gemini."
-    else:
-        return f"Error: {response.status_code} - {response.text}"
+        return f"Error: {e.status_code} - {e.text}"
+
+# Units for each Quality x Composition pair in the data, from cube totals grouped by (Quality, Composition)
+def quality_composition_sales(totals):
+    sales_distribution = {}
+    compositions = dict.fromkeys(clean_composition(pd.Series(store.values('Composition'))))
+    for quality in store.values('Quality'):
+        for composition in compositions:
+            key = f"{quality} {composition}"
+            sales_distribution[key] = int(sum(
+                qty for (q, c), qty in totals.items()
+                if q.lower() == quality.lower() and composition.lower() in c.lower()
+            ))
+    return sales_distribution
 
 @app.route('/')
 def index():
@@ -53,255 +70,153 @@ def index():
         session['messages'] = []
     return render_template('index.html', messages=session['messages'])
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    # Initialize variables outside try block
-    response = ""
-    chart_data = None
-    sales_data = None
-    sales_date = None
-    best_seller = None
-    date_found = None
+# /predict answers, one per intent; each gets the parsed Query
+def predict_answer(response, chart_data=None, sales_data=None, sales_date=None, best_seller=None):
+    return jsonify({'response': response, 'chart_data': chart_data, 'sales_data': sales_data,
+                    'sales_date': sales_date, 'best_seller': best_seller})
 
+def answer_best_seller(query):
+    # Suggest best dress for a given day by analyzing all previous years
+    date_found = query.date
+    # Quantity by Quality, Weave, Composition for the same month and day across all years, from the cube
+    with metrics.phase('pandas'):
+        group = store.cube.totals(date_found.month, date_found.day)
+    if group.empty:
+        return predict_answer(f"No historical sales data available for {date_found.strftime('%B %d')}.")
+    best = group.idxmax()
+    best_qty = group.max()
+    best_name = f"{best[0]} {best[1]} {best[2]}"
+    suggested_stock = int(best_qty * 1.2)  # 20% safety margin
+    response = (
+        f"Based on previous years' data for {date_found.strftime('%B %d')}, "
+        f"the best-selling dress is **{best_name}** with a total of **{best_qty} units** sold.\n\n"
+        f"Suggestion: The owner should stock up at least **{suggested_stock} units** of {best_name} for this day (including a 20% safety margin)!"
+    )
     try:
-        api_key = os.getenv('GEMINI_API_KEY')
-        user_input = request.form['user_input']
-        
-        # Check for date in user input
-        for word in user_input.split():
-            try:
-                date = pd.to_datetime(word)
-                date_found = date
-                break
-            except:
-                continue
-
-        # New: Suggest best dress for a given day by analyzing all previous years
-        if date_found and ("which dress" in user_input.lower() or "best seller" in user_input.lower() or "most number" in user_input.lower()):
-            # Get all sales for the same month and day across all years
-            day_data = df[(pd.to_datetime(df['Date']).dt.month == date_found.month) & (pd.to_datetime(df['Date']).dt.day == date_found.day)]
-            if not day_data.empty:
-                # Group by Quality, Weave, Composition, sum Quantity
-                group = day_data.groupby(['Quality', 'Weave', 'Composition'])['Quantity'].sum()
-                best = group.idxmax()
-                best_qty = group.max()
-                best_name = f"{best[0]} {best[1]} {best[2]}"
-                suggested_stock = int(best_qty * 1.2)  # 20% safety margin
-                response = (
-                    f"Based on previous years' data for {date_found.strftime('%B %d')}, "
-                    f"the best-selling dress is **{best_name}** with a total of **{best_qty} units** sold.\n\n"
-                    f"Suggestion: The owner should stock up at least **{suggested_stock} units** of {best_name} for this day (including a 20% safety margin)!"
-                )
-            else:
-                response = f"No historical sales data available for {date_found.strftime('%B %d')}."
-            return jsonify({'response': response, 'chart_data': None, 'sales_data': None, 'sales_date': None, 'best_seller': None})
-
-        # Check for date or sales-related queries
-        date_found = None
-        for word in user_input.split():
-            try:
-                date = pd.to_datetime(word)
-                date_found = date
-                break
-            except Exception:
-                continue
-
-        if date_found:
-            # Get data for the same day from both 2022 and 2023
-            sales_2022 = df[
-                (pd.to_datetime(df['Date']).dt.month == date_found.month) &
-                (pd.to_datetime(df['Date']).dt.day == date_found.day) &
-                (pd.to_datetime(df['Date']).dt.year == 2022)
-            ]
-            
-            sales_2023 = df[
-                (pd.to_datetime(df['Date']).dt.month == date_found.month) &
-                (pd.to_datetime(df['Date']).dt.day == date_found.day) &
-                (pd.to_datetime(df['Date']).dt.year == 2023)
-            ]
+        with metrics.phase('model'):
+            predictions = forecaster.forecast(date_found, date_found)[date_found.normalize()]
+        composition = clean_composition(pd.Series([best[2]]))[0]
+        predicted = sum(
+            p['Quantity'] for p in predictions['products']
+            if (p['Quality'], p['Weave'], p['Composition']) == (best[0], best[1], composition)
+        )
+        response += f"\n\nModel forecast for {date_found.strftime('%B %d, %Y')}: about **{predicted:.0f} units** of {best_name}."
+    except ForecastUnavailable:
+        pass
+    return predict_answer(response)
 
-            # Prepare comparison data
-            sales_distribution = {
-                '2022': {},
-                '2023': {}
-            }
+def answer_year_compare(query):
+    date_found = query.date
+    # Get data for the same day from both 2022 and 2023
+    by = ['Quality', 'Composition']
+    with metrics.phase('pandas'):
+        sales_distribution = {
+            year: quality_composition_sales(
+                store.cube.totals(date_found.month, date_found.day, year=int(year), by=by))
+            for year in ['2022', '2023']
+        }
 
-            for year, data in [('2022', sales_2022), ('2023', sales_2023)]:
-                for quality in ['Premium', 'Standard']:
-                    for composition in ['Cotton', 'Silk']:
-                        key = f"{quality} {composition}"
-                        sales_distribution[year][key] = int(data[
-                            (data['Quality'] == quality) & 
-                            (data['Composition'].str.contains(composition))
-                        ]['Quantity'].sum())
-
-            # Create chart data for comparison
-            chart_data = {
-                'labels': list(sales_distribution['2022'].keys()),
-                'datasets': [
-                    {
-                        'label': '2022',
-                        'data': list(sales_distribution['2022'].values()),
-                        'backgroundColor': ['rgba(255, 99, 132, 0.5)', 'rgba(54, 162, 235, 0.5)', 
-                                          'rgba(255, 206, 86, 0.5)', 'rgba(75, 192, 192, 0.5)'],
-                        'borderColor': ['rgba(255, 99, 132, 1)', 'rgba(54, 162, 235, 1)',
-                                      'rgba(255, 206, 86, 1)', 'rgba(75, 192, 192, 1)'],
-                        'borderWidth': 1
-                    },
-                    {
-                        'label': '2023',
-                        'data': list(sales_distribution['2023'].values()),
-                        'backgroundColor': ['rgba(255, 99, 132, 0.8)', 'rgba(54, 162, 235, 0.8)',
-                                          'rgba(255, 206, 86, 0.8)', 'rgba(75, 192, 192, 0.8)'],
-                        'borderColor': ['rgba(255, 99, 132, 1)', 'rgba(54, 162, 235, 1)',
-                                      'rgba(255, 206, 86, 1)', 'rgba(75, 192, 192, 1)'],
-                        'borderWidth': 1
-                    }
-                ]
+    # Create chart data for comparison
+    chart_data = {
+        'labels': list(sales_distribution['2022'].keys()),
+        'datasets': [
+            {
+                'label': '2022',
+                'data': list(sales_distribution['2022'].values()),
+                'backgroundColor': ['rgba(255, 99, 132, 0.5)', 'rgba(54, 162, 235, 0.5)', 
+                                  'rgba(255, 206, 86, 0.5)', 'rgba(75, 192, 192, 0.5)'],
+                'borderColor': ['rgba(255, 99, 132, 1)', 'rgba(54, 162, 235, 1)',
+                              'rgba(255, 206, 86, 1)', 'rgba(75, 192, 192, 1)'],
+                'borderWidth': 1
+            },
+            {
+                'label': '2023',
+                'data': list(sales_distribution['2023'].values()),
+                'backgroundColor': ['rgba(255, 99, 132, 0.8)', 'rgba(54, 162, 235, 0.8)',
+                                  'rgba(255, 206, 86, 0.8)', 'rgba(75, 192, 192, 0.8)'],
+                'borderColor': ['rgba(255, 99, 132, 1)', 'rgba(54, 162, 235, 1)',
+                              'rgba(255, 206, 86, 1)', 'rgba(75, 192, 192, 1)'],
+                'borderWidth': 1
             }
+        ]
+    }
 
-            # Calculate best sellers for both years
-            best_seller_2022 = max(sales_distribution['2022'].items(), key=lambda x: x[1])[0] if sales_distribution['2022'] else None
-            best_seller_2023 = max(sales_distribution['2023'].items(), key=lambda x: x[1])[0] if sales_distribution['2023'] else None
-
-            return jsonify({
-                'response': f"Comparing sales for {date_found.strftime('%B %d')} between 2022 and 2023",
-                'chart_data': chart_data,
-                'sales_data': sales_distribution,
-                'sales_date': date_found.strftime('%B %d'),
-                'best_seller': {'2022': best_seller_2022, '2023': best_seller_2023}
-            })
-
-        elif date_found or 'stock' in user_input.lower() or 'should i sell' in user_input.lower():
-            # Get sales data for the specific date if provided
-            if date_found:
-                current_data = df[pd.to_datetime(df['Date']).dt.date == date_found.date()]
-                sales_distribution = {}
-                for quality in ['Premium', 'Standard']:
-                    for composition in ['Cotton', 'Silk']:
-                        key = f"{quality} {composition}"
-                        sales_distribution[key] = int(current_data[
-                            (current_data['Quality'].str.lower() == quality.lower()) &
-                            (current_data['Composition'].str.lower().str.contains(composition.lower()))
-                        ]['Quantity'].sum())
-                if sum(sales_distribution.values()) == 0:
-                    # If no data for the day, fallback to month
-                    current_data = df[pd.to_datetime(df['Date']).dt.month == date_found.month]
-                    for quality in ['Premium', 'Standard']:
-                        for composition in ['Cotton', 'Silk']:
-                            key = f"{quality} {composition}"
-                            sales_distribution[key] = int(current_data[
-                                (current_data['Quality'].str.lower() == quality.lower()) &
-                                (current_data['Composition'].str.lower().str.contains(composition.lower()))
-                            ]['Quantity'].sum())
-                best_seller = max(sales_distribution.items(), key=lambda x: x[1])[0] if sales_distribution else None
-                chart_data = {
-                    'labels': list(sales_distribution.keys()),
-                    'datasets': [{
-                        'data': list(sales_distribution.values()),
-                        'backgroundColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
-                        'borderColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
-                        'borderWidth': 1
-                    }]
-                }
-                response = f"Based on historical data, here's the sales analysis for {date_found.strftime('%B %d, %Y')}:\n\n🏆 Best-seller: {best_seller}\n📊 Sales Distribution:\n"
-                for dress, quantity in sales_distribution.items():
-                    response += f"- {dress}: {quantity} units\n"
-                sales_data = sales_distribution
-                sales_date = date_found.strftime('%B %d, %Y')
-                return jsonify({
-                    'response': response,
-                    'chart_data': chart_data,
-                    'sales_data': sales_data,
-                    'sales_date': sales_date,
-                    'best_seller': best_seller
-                })
-            else:
-                # If no date was found, use current month data
-                current_month = pd.Timestamp.now().month
-                current_data = df[pd.to_datetime(df['Date']).dt.month == current_month]
-                sales_distribution = {}
-                for quality in ['Premium', 'Standard']:
-                    for composition in ['Cotton', 'Silk']:
-                        key = f"{quality} {composition}"
-                        sales_distribution[key] = int(current_data[
-                            (current_data['Quality'] == quality) & 
-                            (current_data['Composition'].str.contains(composition))
-                        ]['Quantity'].sum())
-                best_seller = max(sales_distribution.items(), key=lambda x: x[1])[0]
-                chart_data = {
-                    'labels': list(sales_distribution.keys()),
-                    'datasets': [{
-                        'data': list(sales_distribution.values()),
-                        'backgroundColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
-                        'borderColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
-                        'borderWidth': 1
-                    }]
-                }
-                response = f"Based on current month data, here's the sales analysis for {pd.Timestamp.now().strftime('%B %Y')}:\n\n🏆 Best-seller: {best_seller}\n📊 Sales Distribution:\n"
-                for dress, quantity in sales_distribution.items():
-                    response += f"- {dress}: {quantity} units\n"
-                sales_data = sales_distribution
-                sales_date = pd.Timestamp.now().strftime('%B %Y')
-                return jsonify({
-                    'response': response,
-                    'chart_data': chart_data,
-                    'sales_data': sales_data,
-                    'sales_date': sales_date,
-                    'best_seller': best_seller
-                })
-        else:
-            # Direct price and amount logic for owner queries
-            user_input_lower = user_input.lower()
-            dress_catalog = [
-                {
-                    'name': 'Premium Cotton Plain',
-                    'keywords': ['cotton', 'plain'],
-                    'price': '₹490',
-                    'composition': '100% Cotton',
-                    'quality': 'Premium'
-                },
-                {
-                    'name': 'Standard Silk Satin',
-                    'keywords': ['silk', 'satin', 'standard'],
-                    'price': '₹199',
-                    'composition': '100% Silk',
-                    'quality': 'Standard'
-                },
-                {
-                    'name': 'Premium Silk Satin',
-                    'keywords': ['silk', 'satin', 'premium'],
-                    'price': '₹225',
-                    'composition': '100% Silk',
-                    'quality': 'Premium'
-                }
-            ]
-            for dress in dress_catalog:
-                if 'price' in user_input_lower and any(k in user_input_lower for k in dress['keywords']):
-                    # Find total sold for this dress
-                    mask = (
-                        (df['Quality'].str.lower() == dress['quality'].lower()) &
-                        (df['Composition'].str.lower() == dress['composition'].lower())
-                    )
-                    total_sold = df[mask]['Quantity'].sum()
-                    response = f"The price of {dress['name']} is {dress['price']}. Total sold: {total_sold} units."
-                    return jsonify({'response': response, 'chart_data': None, 'sales_data': None, 'sales_date': None, 'best_seller': None})
-            # General chat/AI assistant
-            context = (
-                "You are a fun and witty AI assistant in a dress shop. "
-                "Your job is to answer questions about dress sales and collections. "
-                "You are a dress shop assistant and owner of the shop. "
-                "You may share the sales data and other information about the shop and the dresses about owner, "
-                "basically you are working for the owner of the shop to show all the information about customers and sales data. "
-                f"Here is a summary of the sales data:\n"
-                f"Customers: {', '.join(df['Customer'].unique()) if 'Customer' in df.columns else 'N/A'}\n"
-                f"Top customer: {df.groupby('Customer')['Quantity'].sum().idxmax() if 'Customer' in df.columns else 'N/A'}\n"
-            )
-            full_prompt = f"{context}\n\nUser: {user_input}"
-            response = call_gemini_api(full_prompt, api_key)
-            return jsonify({'response': response, 'chart_data': None, 'sales_data': None, 'sales_date': None, 'best_seller': None})
+    # Calculate best sellers for both years
+    best_seller_2022 = max(sales_distribution['2022'].items(), key=lambda x: x[1])[0] if sales_distribution['2022'] else None
+    best_seller_2023 = max(sales_distribution['2023'].items(), key=lambda x: x[1])[0] if sales_distribution['2023'] else None
+
+    return predict_answer(
+        f"Comparing sales for {date_found.strftime('%B %d')} between 2022 and 2023",
+        chart_data=chart_data,
+        sales_data=sales_distribution,
+        sales_date=date_found.strftime('%B %d'),
+        best_seller={'2022': best_seller_2022, '2023': best_seller_2023}
+    )
+
+def answer_stock(query):
+    # No date in the message, so use current month data
+    now = pd.Timestamp.now()
+    with metrics.phase('pandas'):
+        sales_distribution = quality_composition_sales(
+            store.cube.totals(now.month, by=['Quality', 'Composition']))
+    best_seller = max(sales_distribution.items(), key=lambda x: x[1])[0]
+    chart_data = {
+        'labels': list(sales_distribution.keys()),
+        'datasets': [{
+            'data': list(sales_distribution.values()),
+            'backgroundColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
+            'borderColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
+            'borderWidth': 1
+        }]
+    }
+    response = f"Based on current month data, here's the sales analysis for {now.strftime('%B %Y')}:\n\n🏆 Best-seller: {best_seller}\n📊 Sales Distribution:\n"
+    for dress, quantity in sales_distribution.items():
+        response += f"- {dress}: {quantity} units\n"
+    return predict_answer(response, chart_data=chart_data, sales_data=sales_distribution,
+                          sales_date=now.strftime('%B %Y'), best_seller=best_seller)
+
+def answer_price(query):
+    # Direct price and amount logic for owner queries
+    dress = query.dress
+    # Find total sold for this dress
+    with metrics.phase('pandas'):
+        total_sold = store.total_quantity(Quality=dress['quality'], Composition=dress['composition'])
+    return predict_answer(f"The price of {dress['name']} is {dress['price']}. Total sold: {total_sold} units.")
+
+def answer_llm(query):
+    # General chat/AI assistant
+    with metrics.phase('pandas'):
+        summary = store.chat_summary()
+    context = (
+        "You are a fun and witty AI assistant in a dress shop. "
+        "Your job is to answer questions about dress sales and collections. "
+        "You are a dress shop assistant and owner of the shop. "
+        "You may share the sales data and other information about the shop and the dresses about owner, "
+        "basically you are working for the owner of the shop to show all the information about customers and sales data. "
+        f"Here is a summary of the sales data:\n"
+        f"{summary}"
+    )
+    full_prompt = f"{context}\n\nUser: {query.text}"
+    return predict_answer(call_gemini_api(full_prompt, os.getenv('GEMINI_API_KEY')))
+
+PREDICT_HANDLERS = {
+    intent.BEST_SELLER: answer_best_seller,
+    intent.YEAR_COMPARE: answer_year_compare,
+    intent.STOCK: answer_stock,
+    intent.PRICE: answer_price,
+    intent.LLM: answer_llm,
+}
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    try:
+        # Date, intent and catalog dress in one pass over the message
+        with metrics.phase('parse'):
+            query = intent.parse_query(request.form['user_input'])
+        metrics.branch(query.intent)
+        return PREDICT_HANDLERS[query.intent](query)
     except Exception as e:
-        print(f"Error: {e}")
+        metrics.error(e)
         return jsonify({
             'response': f'Error occurred: {e}',
             'chart_data': None,
@@ -318,15 +233,23 @@ def update_chart():
         if not date_str:
             return jsonify({'error': 'Date parameter is required'}), 400
         selected_date = pd.to_datetime(date_str)
-        selected_data = df[pd.to_datetime(df['Date']).dt.month == selected_date.month]
-        if selected_data.empty:
-            return jsonify({'error': 'No data available for selected month'}), 404
+        with metrics.phase('pandas'):
+            if group_by in DIMENSIONS:
+                # Cube dimensions are answered without touching the raw rows
+                totals = store.cube.totals(selected_date.month, by=[group_by])
+                if totals.empty:
+                    return jsonify({'error': 'No data available for selected month'}), 404
+            else:
+                selected_data = store.month(selected_date.month)
+                if selected_data.empty:
+                    return jsonify({'error': 'No data available for selected month'}), 404
 
-        # Group by the selected field
-        if group_by not in selected_data.columns:
-            return jsonify({'error': f'Invalid group_by: {group_by}'}), 400
+                # Group by the selected field
+                if group_by not in selected_data.columns:
+                    return jsonify({'error': f'Invalid group_by: {group_by}'}), 400
+                totals = selected_data.groupby(group_by, observed=True)['Quantity'].sum()
 
-        sales_distribution = selected_data.groupby(group_by)['Quantity'].sum().to_dict()
+        sales_distribution = totals.to_dict()
         best_seller = max(sales_distribution.items(), key=lambda x: x[1])[0]
         has_sales = any(sales_distribution.values())
         response_data = {
@@ -355,61 +278,125 @@ def update_chart():
     except ValueError as e:
         return jsonify({'error': 'Invalid date format'}), 400
     except Exception as e:
-        print(f"Error in update_chart: {str(e)}")
+        metrics.error(e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/analytics')
+def analytics_query():
+    # Quantity over any date range, grouped by any columns and period; parameters in analytics.py
+    try:
+        query = analytics.AnalyticsQuery.from_args(request.args)
+        engine = analytics.default_engine()
+        with metrics.phase(engine):
+            return jsonify(analytics.aggregate(store.df, query, engine))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        metrics.error(e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Parse an ingestion body: CSV chunk with header, JSON lines, or a JSON array of rows
+def parse_sales_rows(req):
+    content_type = req.mimetype
+    body = req.get_data(as_text=True)
+    if content_type == 'text/csv':
+        return pd.read_csv(io.StringIO(body))
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        return pd.DataFrame([json.loads(line) for line in body.splitlines() if line.strip()])
+    if content_type == 'application/json':
+        payload = json.loads(body)
+        return pd.DataFrame(payload['rows'] if isinstance(payload, dict) else payload)
+    raise ValueError(f'Unsupported content type: {content_type}')
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    # Append new sales without restarting: written to the CSV log and folded into the store
+    try:
+        rows = parse_sales_rows(request)
+        if rows.empty:
+            return jsonify({'error': 'No rows provided'}), 400
+        with metrics.phase('pandas'):
+            count = store.append(rows)
+        snapshots.refresh_soon()
+        return jsonify({'ingested': count, 'total_rows': len(store)})
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Invalid sales rows: {e}'}), 400
+    except Exception as e:
+        metrics.error(e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/forecast')
+def forecast():
+    # Predicted units per product for each day in [start, end]; defaults to the next 7 days
+    try:
+        start = pd.to_datetime(request.args.get('start') or pd.Timestamp.now().normalize())
+        end = pd.to_datetime(request.args.get('end') or start + pd.Timedelta(days=6))
+        if end < start:
+            return jsonify({'error': 'end must not be before start'}), 400
+        with metrics.phase('model'):
+            predictions = forecaster.forecast(start, end)
+        return jsonify({
+            'start': start.strftime('%Y-%m-%d'),
+            'end': end.strftime('%Y-%m-%d'),
+            'forecast': [
+                dict(day, date=date.strftime('%Y-%m-%d'))
+                for date, day in predictions.items()
+            ]
+        })
+    except ForecastUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
+    except Exception as e:
+        metrics.error(e)
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/llm_stats')
+def llm_stats():
+    # Response cache hits/misses and Gemini latency since startup
+    stats = llm.stats.snapshot()
+    stats['cached_responses'] = len(llm.cache)
+    stats['circuit'] = llm.breaker.state
+    return jsonify(stats)
+
 @app.route('/dashboard')
 def dashboard():
-    # Show the current month's sales data
-    current_month = pd.Timestamp.now().month
-    current_data = df[pd.to_datetime(df['Date']).dt.month == current_month]
-    
-    # Calculate sales by agent and quality
-    sales_distribution = {}
-    for agent in ['Sammy', 'Mark']:
-        for quality in ['Premium', 'Standard']:
-            key = f"{agent}'s {quality}"
-            sales_distribution[key] = int(current_data[
-                (current_data['Agent'] == agent) & 
-                (current_data['Quality'] == quality)
-            ]['Quantity'].sum())
-    
-    # If no data for current month, use the most recent month's data
-    if sum(sales_distribution.values()) == 0:
-        latest_date = pd.to_datetime(df['Date']).max()
-        current_data = df[pd.to_datetime(df['Date']).dt.month == latest_date.month]
-        for agent in ['Sammy', 'Mark']:
-            for quality in ['Premium', 'Standard']:
-                key = f"{agent}'s {quality}"
-                sales_distribution[key] = int(current_data[
-                    (current_data['Agent'] == agent) & 
-                    (current_data['Quality'] == quality)
-                ]['Quantity'].sum())
-    
-    best_seller = max(sales_distribution.items(), key=lambda x: x[1])[0]
-    
-    chart_data = {
-        'labels': list(sales_distribution.keys()),
-        'datasets': [{
-            'data': list(sales_distribution.values()),
-            'backgroundColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
-            'borderColor': ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'],
-            'borderWidth': 1
-        }]
-    }
-    
-    if not current_data.empty:
-        display_date = pd.to_datetime(current_data['Date'].iloc[0]).strftime('%Y-%m')
-    else:
-        display_date = pd.Timestamp.now().strftime('%Y-%m')
+    # This month's agent x quality breakdown (or the latest month with sales), prebuilt
+    snapshot = snapshots.current()
+
+    # Next week's forecast; cached per date, so reloading the page doesn't re-run the forest
+    upcoming = []
+    try:
+        today = pd.Timestamp.now().normalize()
+        with metrics.phase('model'):
+            predictions = forecaster.forecast(today, today + pd.Timedelta(days=6))
+        for date, day in predictions.items():
+            upcoming.append({'date': date.strftime('%a %b %d'), 'dress': day['best_seller'], 'quantity': round(day['best_quantity'])})
+    except ForecastUnavailable:
+        pass
     
     return render_template(
         'dashboard.html',
-                          chart_data=chart_data,
-                          sales_data=sales_distribution,
-                          sales_date=display_date,
-        best_seller=best_seller
+                          chart_data=snapshot.payload['chart_data'],
+                          sales_data=snapshot.payload['sales_data'],
+                          sales_date=snapshot.payload['sales_date'] or pd.Timestamp.now().strftime('%Y-%m'),
+        best_seller=snapshot.payload['best_seller'],
+        forecast=upcoming
     )
 
+@app.route('/dashboard/data')
+def dashboard_data():
+    # The dashboard chart as JSON (?month=1-12, default as /dashboard); 304 while it is unchanged
+    month = request.args.get('month', type=int)
+    if month is not None and not 1 <= month <= 12:
+        return jsonify({'error': 'month must be 1-12'}), 400
+    snapshot = snapshots.month(month) if month else snapshots.current()
+    response = app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    # Cached by the browser, but revalidated with If-None-Match every time
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Werkzeug debug server for development; serve.py runs the app in production
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,486 @@
+"""Benchmarks for the dress shop app.
+
+Run from the dress_shop_ai directory:
+
+    python benchmark.py routes --scale 100
+    python benchmark.py ingest --rows 200000 --batch 1000
+    python benchmark.py startup
+    python benchmark.py intent --queries 10000
+    python benchmark.py dashboard --scale 100
+    python benchmark.py analytics --scale 1000
+    python benchmark.py storage --rows 10000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import intent
+from sales_store import SalesStore
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def report(name, samples):
+    print(f"{name:<40} n={len(samples):<5} p50={percentile_ms(samples, 50):8.2f} ms  "
+          f"p99={percentile_ms(samples, 99):8.2f} ms")
+
+
+def write_scaled_csv(source, scale, path):
+    """Write `scale` copies of the source data, each shifted by two years"""
+    base = pd.read_csv(source)
+    years = base['Date'].str[:4].astype(int)
+    rest = base['Date'].str[4:]
+    with open(path, 'w', newline='') as f:
+        for k in range(scale):
+            chunk = base.copy()
+            chunk['Date'] = (years + 2 * k).astype(str) + rest
+            chunk.to_csv(f, index=False, header=(k == 0))
+    return path
+
+
+def load_app(data_path):
+    """Import app.py against the given data file"""
+    os.environ['SALES_DATA'] = data_path
+    sys.modules.pop('app', None)
+    import app
+    return app
+
+
+def time_requests(call, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = call()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_data(as_text=True)[:200]
+    return samples
+
+
+# === Route latency ===
+PREDICT_QUERIES = {
+    'predict (best seller)': 'which dress is the best seller on 2023-03-15',
+    'predict (year compare)': 'show sales on 2023-03-15',
+    'predict (stock)': 'how much stock should i keep',
+    'predict (price)': 'what is the price of premium silk',
+}
+
+
+def bench_routes(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = write_scaled_csv('data.csv', args.scale, os.path.join(tmp, 'data.csv'))
+
+        start = time.perf_counter()
+        app = load_app(data_path)
+        print(f"Loaded {len(app.store):,} rows (scale {args.scale}x) in "
+              f"{time.perf_counter() - start:.2f} s")
+        client = app.app.test_client()
+
+        for name, query in PREDICT_QUERIES.items():
+            report(name, time_requests(
+                lambda: client.post('/predict', data={'user_input': query}), args.repeat))
+        report('update_chart', time_requests(
+            lambda: client.get('/update_chart?date=2023-03-15&group_by=Quality'), args.repeat))
+        report('dashboard', time_requests(lambda: client.get('/dashboard'), args.repeat))
+
+
+# === Ingestion throughput ===
+def bench_ingest(args):
+    source = pd.read_csv('data.csv')
+    source['Date'] = '2024' + source['Date'].str[4:]
+    n_batches = args.rows // args.batch
+    batches = [source.sample(args.batch, replace=True, random_state=i) for i in range(n_batches)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, 'data.csv')
+        source.to_csv(data_path, index=False)
+        app = load_app(data_path)
+        client = app.app.test_client()
+
+        for fmt in ['csv', 'jsonl']:
+            if fmt == 'csv':
+                bodies = [b.to_csv(index=False) for b in batches]
+                content_type = 'text/csv'
+            else:
+                bodies = [b.to_json(orient='records', lines=True) for b in batches]
+                content_type = 'application/x-ndjson'
+            start = time.perf_counter()
+            for body in bodies:
+                response = client.post('/ingest', data=body, content_type=content_type)
+                assert response.status_code == 200, response.get_json()
+            elapsed = time.perf_counter() - start
+            print(f"ingest {fmt:<6} batch={args.batch:<6} {n_batches * args.batch:,} rows in "
+                  f"{elapsed:.2f} s = {n_batches * args.batch / elapsed:,.0f} rows/s")
+
+        # /ingest wakes the dashboard refresh, which reads store.df in the background and so
+        # does the concat first; a store that nothing else reads shows what that read costs
+        store = SalesStore(source)
+        for batch in batches:
+            store.append(batch)
+        start = time.perf_counter()
+        rows = len(store.df)
+        print(f"first read after {n_batches} appends (concat of pending batches): "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms, {rows:,} rows in store")
+        report('predict (best seller) after ingest', time_requests(
+            lambda: client.post('/predict', data={'user_input': 'which dress is the best seller on 2024-03-15'}),
+            args.repeat))
+
+
+# === Cold start ===
+# Each step runs in a fresh interpreter and prints its wall time and peak RSS
+STARTUP_STEPS = {
+    'load model.pkl (joblib)': "import joblib; joblib.load('model.pkl')",
+    'map model.forest': "from compact_forest import CompactForest; CompactForest('model.forest')",
+    'import app (eager pickles, before)':
+        "import joblib; joblib.load('model.pkl'); joblib.load('encoders.pkl'); import app",
+    'import app (lazy model, after)': "import app",
+    'import app + first /forecast': "import app; app.app.test_client().get('/forecast')",
+}
+# Peak RSS comes from VmHWM where there is one: ru_maxrss also counts the parent at fork time
+STARTUP_PROBE = '''
+import json, resource, sys, time, warnings
+warnings.filterwarnings('ignore')
+start = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - start
+try:
+    with open('/proc/self/status') as f:
+        rss_mb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+except OSError:
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({'seconds': seconds, 'rss_mb': rss_mb}))
+'''
+
+
+def bench_startup(args):
+    if not os.path.exists(os.path.join('model.forest', 'meta.json')):
+        sys.exit('model.forest not found; run train_model.py first')
+    for name, code in STARTUP_STEPS.items():
+        runs = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, code],
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        seconds = sorted(run['seconds'] for run in runs)[len(runs) // 2]
+        rss = max(run['rss_mb'] for run in runs)
+        print(f"{name:<40} {seconds * 1000:8.1f} ms  peak RSS {rss:6.1f} MB")
+
+    # Both formats must agree on what the app actually asks for
+    import joblib
+    from compact_forest import CompactForest
+    app = load_app(os.getenv('SALES_DATA', 'data.csv'))
+    X, _ = app.forecaster.build_features(pd.date_range('2024-01-01', periods=366))
+    diff = np.abs(joblib.load('model.pkl').predict(X) - CompactForest('model.forest').predict(X)).max()
+    print(f"max |model.pkl - model.forest| over a year of forecasts: {diff:.2e}")
+
+
+# Owner messages for the intent benchmark: dates in several formats, numbers, prices and chat
+QUERY_TEMPLATES = [
+    "which dress is the best seller on {iso}", "which dress sold the most number on {iso}?",
+    "show sales on {iso}", "sales {dmy} please", "compare {Month} {day} with last year",
+    "how much stock should i keep for the wedding season", "should i sell more silk this month?",
+    "what is the price of premium silk", "price of cotton plain", "price of the standard satin one",
+    "hello! how are the sales going today", "tell me a joke about dresses",
+    "we got 25 new customers and 3 returns, what should the 2 agents focus on next?",
+    "summarize the market trends for our customers in a few sentences, keep it natural and short",
+    "can you decide which collection to promote before the festival, maybe the silk one?",
+    "give me a long answer: " + "the shop had a busy week with many visitors and orders " * 6,
+]
+MONTHS = ['January', 'March', 'May', 'August', 'October', 'December']
+
+
+def owner_queries(count, seed=42):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for n in range(count):
+        day = int(rng.integers(1, 29))
+        month = int(rng.integers(1, 13))
+        year = int(rng.choice([2022, 2023, 2024]))
+        template = QUERY_TEMPLATES[n % len(QUERY_TEMPLATES)]
+        queries.append(template.format(iso=f'{year}-{month:02d}-{day:02d}', dmy=f'{day:02d}/{month:02d}/{year}',
+                                       Month=MONTHS[month % len(MONTHS)], day=day))
+    return queries
+
+
+def legacy_parse_query(user_input):
+    """predict()'s routing as it was: pd.to_datetime per word (twice), then substring checks"""
+    date_found = None
+    for word in user_input.split():
+        try:
+            date_found = pd.to_datetime(word)
+            break
+        except Exception:
+            continue
+    if date_found and any(p in user_input.lower() for p in ["which dress", "best seller", "most number"]):
+        return intent.Query(intent.BEST_SELLER, user_input, date=date_found)
+    date_found = None
+    for word in user_input.split():
+        try:
+            date_found = pd.to_datetime(word)
+            break
+        except Exception:
+            continue
+    if date_found:
+        return intent.Query(intent.YEAR_COMPARE, user_input, date=date_found)
+    if 'stock' in user_input.lower() or 'should i sell' in user_input.lower():
+        return intent.Query(intent.STOCK, user_input)
+    user_input_lower = user_input.lower()
+    for dress in intent.DRESS_CATALOG:
+        if 'price' in user_input_lower and any(k in user_input_lower for k in dress['keywords']):
+            return intent.Query(intent.PRICE, user_input, dress=dress)
+    return intent.Query(intent.LLM, user_input)
+
+
+def bench_intent(args):
+    import warnings
+    # pandas warns about guessed formats for every dd/mm/yyyy word
+    warnings.filterwarnings('ignore', category=UserWarning)
+    queries = owner_queries(args.queries)
+    results = {}
+    for name, parse in [('pd.to_datetime per word', legacy_parse_query), ('intent.parse_query', intent.parse_query)]:
+        samples = []
+        parsed = []
+        for query in queries:
+            start = time.perf_counter()
+            parsed.append(parse(query))
+            samples.append(time.perf_counter() - start)
+        results[name] = parsed
+        print(f"{name:<24} {len(queries) / sum(samples):9.0f} queries/s  "
+              f"p50={percentile_ms(samples, 50) * 1000:8.1f} us  p99={percentile_ms(samples, 99) * 1000:8.1f} us")
+    # By calendar day: "today" reads the clock, so its time differs between the two runs
+    same = [[(q.intent, q.dress, q.date.normalize() if q.date is not None else None) for q in parsed]
+            for parsed in results.values()]
+    print('same intent, date and dress:', same[0] == same[1])
+    fast = results['intent.parse_query']
+    counts = {}
+    for query in fast:
+        counts[query.intent] = counts.get(query.intent, 0) + 1
+    print('intents:', counts)
+
+
+# === Dashboard snapshots ===
+def legacy_dashboard_payload(df, month):
+    """What /dashboard computed on every request before the snapshots, on the raw CSV frame"""
+    current_data = df[pd.to_datetime(df['Date']).dt.month == month]
+    sales_distribution = {}
+    for agent in ['Sammy', 'Mark']:
+        for quality in ['Premium', 'Standard']:
+            sales_distribution[f"{agent}'s {quality}"] = int(current_data[
+                (current_data['Agent'] == agent) & (current_data['Quality'] == quality)]['Quantity'].sum())
+    if sum(sales_distribution.values()) == 0:
+        latest_date = pd.to_datetime(df['Date']).max()
+        current_data = df[pd.to_datetime(df['Date']).dt.month == latest_date.month]
+        for agent in ['Sammy', 'Mark']:
+            for quality in ['Premium', 'Standard']:
+                sales_distribution[f"{agent}'s {quality}"] = int(current_data[
+                    (current_data['Agent'] == agent) & (current_data['Quality'] == quality)]['Quantity'].sum())
+    best_seller = max(sales_distribution.items(), key=lambda x: x[1])[0]
+    display_date = (pd.to_datetime(current_data['Date'].iloc[0]).strftime('%Y-%m') if not current_data.empty
+                    else pd.Timestamp.now().strftime('%Y-%m'))
+    return {'sales_data': sales_distribution, 'sales_date': display_date, 'best_seller': best_seller}
+
+
+def bench_dashboard(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = write_scaled_csv('data.csv', args.scale, os.path.join(tmp, 'data.csv'))
+        app = load_app(data_path)
+        print(f"Loaded {len(app.store):,} rows (scale {args.scale}x)")
+        client = app.app.test_client()
+
+        month = pd.Timestamp.now().month
+        raw = pd.read_csv(data_path)
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            legacy_dashboard_payload(raw, month)
+            samples.append(time.perf_counter() - start)
+        report('pandas filters per request (before)', samples)
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            app.snapshots.current()
+            samples.append(time.perf_counter() - start)
+        report('snapshots.current() (after)', samples)
+
+        report('GET /dashboard', time_requests(lambda: client.get('/dashboard'), args.repeat))
+        first = client.get('/dashboard/data')
+        report(f'GET /dashboard/data ({len(first.data)} B)',
+               time_requests(lambda: client.get('/dashboard/data'), args.repeat))
+        etag = first.headers['ETag']
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get('/dashboard/data', headers={'If-None-Match': etag})
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 304 and not response.data
+        report('GET /dashboard/data, unchanged (304)', samples)
+
+        # Ingest a batch and time until the background rebuild has swapped in new snapshots
+        source = pd.read_csv('data.csv').sample(args.batch, replace=True, random_state=0)
+        refreshes = app.snapshots.refreshes
+        start = time.perf_counter()
+        response = client.post('/ingest', data=source.to_csv(index=False), content_type='text/csv')
+        assert response.status_code == 200, response.get_json()
+        ingest_seconds = time.perf_counter() - start
+        while app.snapshots.refreshes == refreshes:
+            time.sleep(0.001)
+        print(f"ingest of {args.batch} rows returned in {ingest_seconds * 1000:.1f} ms, snapshots rebuilt "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms after the POST; etag changed: "
+              f"{client.get('/dashboard/data').headers['ETag'] != etag}")
+
+
+# === Analytics ===
+ANALYTICS_QUERIES = {
+    'all years by year, agent': {'granularity': 'year', 'group_by': 'Agent'},
+    'one year by month, quality, comp.': {'start': '2030-01-01', 'end': '2030-12-31', 'granularity': 'month',
+                                          'group_by': 'Quality,Composition', 'Agent': 'Sammy'},
+    'ten years by day, customer': {'start': '2030-01-01', 'end': '2039-12-31', 'granularity': 'day',
+                                   'group_by': 'Customer'},
+}
+
+
+def whole_frame_aggregate(df, params):
+    """The same answer the straightforward way: filter a copy of the frame, then one groupby"""
+    selected = df
+    if 'start' in params:
+        selected = selected[(selected['Date'] >= params['start']) & (selected['Date'] <= params['end'])]
+    if 'Agent' in params:
+        selected = selected[selected['Agent'] == params['Agent']]
+    periods = {'year': selected['Date'].dt.year, 'month': selected['Date'].dt.to_period('M'),
+               'day': selected['Date'].dt.normalize()}[params['granularity']]
+    keys = [periods] + [selected[column] for column in params['group_by'].split(',')]
+    return selected.groupby(keys, observed=True)['Quantity'].sum()
+
+
+def bench_analytics(args):
+    import tracemalloc
+    import analytics
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = write_scaled_csv('data.csv', args.scale, os.path.join(tmp, 'data.csv'))
+        app = load_app(data_path)
+        df = app.store.df
+        print(f"Loaded {len(df):,} rows, {df['Year'].min()}-{df['Year'].max()} "
+              f"({df.memory_usage(deep=True).sum() / 2**20:.0f} MB in memory); "
+              f"engine {analytics.default_engine()}, {analytics.CHUNK_ROWS:,} rows per chunk")
+        client = app.app.test_client()
+
+        class Args(dict):
+            def getlist(self, name):
+                return [self[name]]
+
+        for name, params in ANALYTICS_QUERIES.items():
+            query = analytics.AnalyticsQuery.from_args(Args(params))
+            for label, run in [('whole frame', lambda: whole_frame_aggregate(df, params)),
+                               ('chunked', lambda: analytics.aggregate(df, query))]:
+                samples = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    result = run()
+                    samples.append(time.perf_counter() - start)
+                # Peak is measured on a separate run; tracing slows the allocations down
+                tracemalloc.start()
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                groups = result['rows'] if isinstance(result, dict) else len(result)
+                print(f"{name:<36} {label:<12} p50={percentile_ms(samples, 50):7.1f} ms  "
+                      f"peak {peak / 2**20:6.1f} MB  {groups:,} groups")
+            response = client.get('/analytics', query_string=params)
+            print(f"{'':<36} GET /analytics {len(response.data) / 1024:7.1f} KB of columnar JSON")
+
+
+# === On-disk format ===
+def storage_steps(csv_path, dataset_path):
+    return {
+        'imports only': "import pandas, pyarrow.dataset, pyarrow.parquet",
+        'pd.read_csv': f"import pandas as pd; pd.read_csv({csv_path!r})",
+        'read_sales (Parquet, mmap)': f"import storage; storage.read_sales({dataset_path!r})",
+        'SalesStore.load (CSV)': f"from sales_store import SalesStore; SalesStore.load({csv_path!r})",
+        'SalesStore.load (Parquet)': f"from sales_store import SalesStore; SalesStore.load({dataset_path!r})",
+        'one month, 2 columns (CSV)':
+            f"import storage; storage.read_sales({csv_path!r}, '2020-03-01', '2020-03-31', ['Date', 'Quantity'])",
+        'one month, 2 columns (Parquet)':
+            f"import storage; storage.read_sales({dataset_path!r}, '2020-03-01', '2020-03-31', ['Date', 'Quantity'])",
+    }
+
+
+def bench_storage(args):
+    import storage
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'data.csv')
+        dataset_path = os.path.join(tmp, 'sales.parquet')
+        days = len(pd.date_range('2015-01-01', '2024-12-31'))
+        subprocess.run([sys.executable, 'generate_data.py', '--start', '2015-01-01', '--end', '2024-12-31',
+                        '--customers', '1000', '--sales-per-day', str(args.rows / days), '--output', csv_path],
+                       check=True, stdout=subprocess.DEVNULL)
+        start = time.perf_counter()
+        rows = storage.convert_csv(csv_path, dataset_path)
+        info = storage.describe(dataset_path)
+        print(f"{rows:,} rows: CSV {os.path.getsize(csv_path) / 2**20:.0f} MB, Parquet {info['bytes'] / 2**20:.0f} MB "
+              f"in {info['files']} files; converted in {time.perf_counter() - start:.1f} s")
+
+        # Each step runs in a fresh interpreter, like the startup benchmark
+        for name, code in storage_steps(csv_path, dataset_path).items():
+            runs = []
+            for _ in range(args.repeat):
+                output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, code],
+                                        capture_output=True, text=True, check=True).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            seconds = sorted(run['seconds'] for run in runs)[len(runs) // 2]
+            rss = max(run['rss_mb'] for run in runs)
+            print(f"{name:<40} {seconds * 1000:8.1f} ms  peak RSS {rss:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    routes = sub.add_parser('routes', help='p50/p99 latency of the HTTP routes')
+    routes.add_argument('--scale', type=int, default=100, help='copies of data.csv to load')
+    routes.add_argument('--repeat', type=int, default=50)
+    routes.set_defaults(func=bench_routes)
+
+    ingest = sub.add_parser('ingest', help='rows/second through POST /ingest')
+    ingest.add_argument('--rows', type=int, default=200000)
+    ingest.add_argument('--batch', type=int, default=1000)
+    ingest.add_argument('--repeat', type=int, default=20)
+    ingest.set_defaults(func=bench_ingest)
+
+    startup = sub.add_parser('startup', help='cold start time and RSS, pickle vs compact model')
+    startup.add_argument('--repeat', type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    intents = sub.add_parser('intent', help='/predict message routing, old date loop vs intent.parse_query')
+    intents.add_argument('--queries', type=int, default=10000)
+    intents.set_defaults(func=bench_intent)
+
+    dash = sub.add_parser('dashboard', help='/dashboard computed per request vs served from snapshots')
+    dash.add_argument('--scale', type=int, default=100, help='copies of data.csv to load')
+    dash.add_argument('--repeat', type=int, default=200)
+    dash.add_argument('--batch', type=int, default=1000, help='rows ingested before the refresh is timed')
+    dash.set_defaults(func=bench_dashboard)
+
+    analytic = sub.add_parser('analytics', help='/analytics, chunked engine vs one groupby over the whole frame')
+    analytic.add_argument('--scale', type=int, default=1000, help='copies of data.csv to load')
+    analytic.add_argument('--repeat', type=int, default=10)
+    analytic.set_defaults(func=bench_analytics)
+
+    disk = sub.add_parser('storage', help='cold load time and RSS, data.csv vs the Parquet dataset')
+    disk.add_argument('--rows', type=int, default=10_000_000)
+    disk.add_argument('--repeat', type=int, default=3)
+    disk.set_defaults(func=bench_storage)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import json
+import os
+
+import numpy as np
+
+# Directory written next to model.pkl by train_model.py
+COMPACT_MODEL = 'model.forest'
+FORMAT_VERSION = 1
+
+# Rows scored per traversal step; bounds the (trees x rows) index arrays
+PREDICT_CHUNK = 1024
+
+
+class LabelCodes:
+    """The part of a fitted LabelEncoder the app needs, without importing sklearn"""
+
+    def __init__(self, classes):
+        self.classes_ = np.array(classes, dtype=object)
+
+    def transform(self, values):
+        codes = {label: code for code, label in enumerate(self.classes_)}
+        return np.array([codes[value] for value in values])
+
+
+def export_forest(model, encoders, path=COMPACT_MODEL):
+    """Write a fitted RandomForestRegressor as flat, memory-mappable node arrays.
+
+    All trees are concatenated into one set of arrays with global node
+    ids. Leaves point to themselves, so prediction can step every tree a
+    fixed number of times without checking for leaves. Thresholds are
+    stored as the largest float32 not above the float64 threshold, which
+    gives the same split decisions sklearn makes on float32 inputs. The
+    label encoder classes are saved alongside, so serving needs no sklearn.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    sizes = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+
+    children, feature, threshold, value = [], [], [], []
+    for root, tree in zip(roots, trees):
+        nodes = np.arange(tree.node_count, dtype=np.int32) + root
+        is_leaf = tree.children_left == -1
+        children.append(np.stack([
+            np.where(is_leaf, nodes, tree.children_left + root),
+            np.where(is_leaf, nodes, tree.children_right + root),
+        ], axis=1).astype(np.int32))
+        feature.append(np.where(is_leaf, 0, tree.feature).astype(np.int16))
+        thresholds = tree.threshold.astype(np.float32)
+        too_high = thresholds.astype(np.float64) > tree.threshold
+        thresholds[too_high] = np.nextafter(thresholds[too_high], np.float32(-np.inf))
+        threshold.append(thresholds)
+        value.append(tree.value[:, 0, 0].astype(np.float32))
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        'roots': roots, 'children': np.concatenate(children),
+        'feature': np.concatenate(feature), 'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    meta = {
+        'version': FORMAT_VERSION,
+        'features': [str(name) for name in model.feature_names_in_],
+        'max_depth': int(max(tree.max_depth for tree in trees)),
+        'n_trees': len(trees),
+        'encoders': {col: [str(c) for c in le.classes_] for col, le in encoders.items()},
+    }
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return path
+
+
+class CompactForest:
+    """Predicts like the exported RandomForestRegressor from memory-mapped arrays"""
+
+    def __init__(self, path=COMPACT_MODEL):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model format version: {meta.get('version')}")
+        self.feature_names_in_ = np.array(meta['features'], dtype=object)
+        self.max_depth = meta['max_depth']
+        self.n_estimators = meta['n_trees']
+        for name in ['roots', 'children', 'feature', 'threshold', 'value']:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_CHUNK):
+            out[start:start + PREDICT_CHUNK] = self._predict_chunk(X[start:start + PREDICT_CHUNK])
+        return out
+
+    def _predict_chunk(self, X):
+        # Gather from the flattened rows; children[node, 0] is left, [node, 1] right
+        flat = np.ascontiguousarray(X).ravel()
+        row_starts = np.arange(len(X)) * X.shape[1]
+        nodes = np.repeat(np.asarray(self.roots)[:, None], len(X), axis=1)  # trees x rows
+        for _ in range(self.max_depth):
+            go_right = flat[row_starts + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes, go_right.astype(np.intp)]
+        return self.value[nodes].mean(axis=0, dtype=np.float64)
+
+
+def load_model(compact_path=COMPACT_MODEL, pickle_path='model.pkl'):
+    """The compact forest when it has been exported, otherwise the pickled model"""
+    if os.path.exists(os.path.join(compact_path, 'meta.json')):
+        return CompactForest(compact_path)
+    import joblib  # Only needed for the pickle fallback; pulls in sklearn when unpickling
+    return joblib.load(pickle_path)
+
+
+def load_encoders(compact_path=COMPACT_MODEL, pickle_path='encoders.pkl'):
+    """Label classes from the compact model when exported, otherwise encoders.pkl"""
+    meta_path = os.path.join(compact_path, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return {col: LabelCodes(classes) for col, classes in json.load(f)['encoders'].items()}
+    import joblib
+    return joblib.load(pickle_path)
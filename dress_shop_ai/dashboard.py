@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import weakref
+
+import pandas as pd
+
+# The dashboard pie chart: units per agent and quality, for every agent and quality in the data
+CHART_COLORS = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#C9CBCF', '#8BC34A']
+
+log = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """One month's dashboard payload, with its JSON body and ETag built once"""
+
+    def __init__(self, month, payload):
+        self.month = month
+        self.payload = payload
+        self.body = json.dumps(payload).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    @property
+    def total(self):
+        return sum(self.payload['sales_data'].values())
+
+
+def agent_quality_sales(store, month):
+    totals = store.cube.totals(month, by=['Agent', 'Quality'])
+    return {
+        f"{agent}'s {quality}": int(totals.get((agent, quality), 0))
+        for agent in store.values('Agent')
+        for quality in store.values('Quality')
+    }
+
+
+def build_payload(store, month):
+    sales_distribution = agent_quality_sales(store, month)
+    years = store.cube.totals(month, by=['Year'])
+    if not years.empty:
+        display_date = f"{years.index.min()}-{month:02d}"
+    else:
+        display_date = None  # The route shows the current month instead
+    colors = [CHART_COLORS[i % len(CHART_COLORS)] for i in range(len(sales_distribution))]
+    return {
+        'chart_data': {
+            'labels': list(sales_distribution.keys()),
+            'datasets': [{
+                'data': list(sales_distribution.values()),
+                'backgroundColor': colors,
+                'borderColor': colors,
+                'borderWidth': 1
+            }]
+        },
+        'sales_data': sales_distribution,
+        'sales_date': display_date,
+        'best_seller': max(sales_distribution.items(), key=lambda x: x[1])[0],
+    }
+
+
+class DashboardSnapshots:
+    """Dashboard payloads for every month, rebuilt in the background after ingests.
+
+    The routes only read the prebuilt snapshots. refresh_soon() wakes a
+    background thread that rebuilds them from the cube; until it is done
+    the previous snapshots keep being served. Rebuilds are skipped when
+    the store has not grown since the last one.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # ({month: Snapshot}, latest month with sales), swapped in whole so readers never see a half-built set
+        self._state = ({}, None)
+        self._rows = None  # len(store) the snapshots were built from
+        self.refreshes = 0
+        self._lock = threading.Lock()  # one rebuild at a time
+        self._thread_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.refresh()
+        # A worker forked from a preloading master gets the snapshots, not the thread
+        snapshots = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: snapshots() and snapshots()._after_fork())
+
+    # === Reads ===
+    def month(self, month):
+        return self._state[0][month]
+
+    def current(self):
+        """This month's snapshot, or the latest month with sales if this one has none"""
+        snapshots, latest_month = self._state
+        snapshot = snapshots[pd.Timestamp.now().month]
+        if snapshot.total == 0 and latest_month is not None:
+            snapshot = snapshots[latest_month]
+        return snapshot
+
+    # === Refresh ===
+    def refresh(self):
+        """Rebuild every month's snapshot now, if rows were added since the last build"""
+        with self._lock:
+            rows = len(self.store)
+            if rows == self._rows:
+                return False
+            snapshots = {month: Snapshot(month, build_payload(self.store, month)) for month in range(1, 13)}
+            self._state = (snapshots, self.store.latest_date().month if rows else None)
+            self._rows = rows
+            self.refreshes += 1
+            return True
+
+    def refresh_soon(self):
+        """Ask the background thread to rebuild; returns at once"""
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def _refresh_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the previous snapshots; the next ingest tries again
+                log.exception('Dashboard refresh failed')
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
@@ -0,0 +1,99 @@
+import hashlib
+import os
+
+import pandas as pd
+
+# Rolling averages of Quantity, over the previous N sales rows of the same dress
+GROUP_KEYS = ['Quality', 'Composition']
+ROLLING_WINDOWS = {'MA7_Quantity': 7, 'MA30_Quantity': 30}
+LONGEST_WINDOW = max(ROLLING_WINDOWS.values())
+
+# Persisted feature table used by train_model.py
+FEATURE_TABLE = 'features.pkl'
+
+# Model input columns, in training order
+MODEL_FEATURES = ['Year', 'Month', 'DayOfMonth', 'DayOfWeek', 'Agent',
+                  'Quality', 'Weave', 'Composition', 'MA7_Quantity', 'MA30_Quantity']
+
+
+def add_date_features(df):
+    dates = pd.to_datetime(df['Date'])
+    df['Date'] = dates
+    df['Month'] = dates.dt.month
+    df['DayOfWeek'] = dates.dt.dayofweek
+    df['Year'] = dates.dt.year
+    df['DayOfMonth'] = dates.dt.day
+    df['Season'] = pd.cut(df['Month'],
+        bins=[0,3,6,9,12],
+        labels=['Winter', 'Spring', 'Summer', 'Fall'])
+    return df
+
+
+def add_rolling_features(df):
+    """Per-dress rolling means of Quantity, in row order, with min_periods=1.
+
+    Computed from grouped cumulative sums: the sum over the last N rows is
+    cumsum - cumsum shifted by N, so no Python code runs per group.
+    """
+    groups = df.groupby(GROUP_KEYS, observed=True, sort=False).ngroup()
+    cumsum = df['Quantity'].groupby(groups).cumsum()
+    count = groups.groupby(groups).cumcount() + 1
+    for col, window in ROLLING_WINDOWS.items():
+        previous = cumsum.groupby(groups).shift(window).fillna(0)
+        df[col] = (cumsum - previous) / count.clip(upper=window)
+    return df
+
+
+def rolling_tail(df):
+    """The last rows per dress that later rows' windows can still reach"""
+    return df.groupby(GROUP_KEYS, observed=True, sort=False).tail(LONGEST_WINDOW - 1)
+
+
+def extend_features(table, new_rows):
+    """Append feature rows for new_rows, reusing only the tail of the existing table"""
+    new_rows = add_date_features(new_rows.copy())
+    tail = rolling_tail(table)
+    combined = add_rolling_features(pd.concat([tail, new_rows], ignore_index=True))
+    extended = combined.iloc[len(tail):]
+    return pd.concat([table, extended], ignore_index=True)
+
+
+def latest_moving_averages(df):
+    """MA7/MA30 of each dress's most recent sale, as training computes them"""
+    tail = df.groupby(GROUP_KEYS, observed=True, sort=False).tail(LONGEST_WINDOW)
+    tail = tail[GROUP_KEYS + ['Quantity']].reset_index(drop=True)
+    tail = add_rolling_features(tail)
+    return tail.groupby(GROUP_KEYS, observed=True)[list(ROLLING_WINDOWS)].last()
+
+
+def source_fingerprint(raw):
+    """Hash of the rows' Date and Quantity, in row order"""
+    days = pd.to_datetime(raw['Date']).to_numpy().astype('datetime64[D]').astype('int64')
+    rows = pd.DataFrame({'Date': days, 'Quantity': raw['Quantity'].to_numpy()})
+    return hashlib.sha1(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def save_feature_table(table, raw, path):
+    table.attrs['source'] = source_fingerprint(raw)
+    table.to_pickle(path)
+
+
+def build_feature_table(raw, path=FEATURE_TABLE):
+    """Feature table for the raw sales rows, extending the persisted one if possible.
+
+    The saved table records a fingerprint of the rows it was built from.
+    When the first rows of raw still match it, only the rows past them are
+    new (data.csv is append-only). Anything else, such as rows backfilled
+    into an earlier month of a Parquet dataset, which reads in partition
+    order, recomputes the whole table.
+    """
+    table = pd.read_pickle(path) if os.path.exists(path) else None
+    if (table is not None and 0 < len(table) <= len(raw)
+            and table.attrs.get('source') == source_fingerprint(raw.iloc[:len(table)])):
+        if len(table) < len(raw):
+            table = extend_features(table, raw.iloc[len(table):])
+            save_feature_table(table, raw, path)
+        return table
+    table = add_rolling_features(add_date_features(raw.copy()))
+    save_feature_table(table, raw, path)
+    return table
@@ -0,0 +1,136 @@
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from features import MODEL_FEATURES, latest_moving_averages
+
+PRODUCT_COLUMNS = ['Agent', 'Quality', 'Weave', 'Composition']
+
+# Largest date range a single forecast request may ask for
+MAX_FORECAST_DAYS = 366
+
+
+class ForecastUnavailable(Exception):
+    pass
+
+
+def clean_composition(values):
+    # train_model.py strips the "100% " prefix before encoding Composition
+    return values.astype(str).str.replace('100% ', '')
+
+
+class DemandForecaster:
+    """Scores every product combination for a range of dates with the trained forest.
+
+    All dates that are not cached yet are scored in one model.predict
+    call. Each date's result is cached ready to serve (product records
+    plus the best-selling dress) and the cache is dropped whenever the
+    store grows, since the moving-average features depend on the latest
+    sales.
+    """
+
+    def __init__(self, load_model, load_encoders, store):
+        # The forest and encoders are only loaded when a forecast is first asked for
+        self._load_model = load_model
+        self._load_encoders = load_encoders
+        self._model = None
+        self._encoders = None
+        self.store = store
+        self._cache = {}  # date -> {'best_seller', 'best_quantity', 'products'}
+        self._cache_rows = None
+        self._lock = threading.Lock()
+        self._products = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._encoders = self._load_encoders()
+                    self._model = self._load_model()
+        return self._model
+
+    @property
+    def encoders(self):
+        self.model
+        return self._encoders
+
+    def check_model(self):
+        names = list(getattr(self.model, 'feature_names_in_', []))
+        if names != MODEL_FEATURES:
+            raise ForecastUnavailable(
+                'model.pkl was not trained on the forecast features; run train_model.py first')
+
+    def products(self):
+        """Every Agent x Quality x Weave x Composition combination, labels and codes"""
+        if self._products is None:
+            classes = [list(self.encoders[col].classes_) for col in PRODUCT_COLUMNS]
+            labels = pd.DataFrame(list(itertools.product(*classes)), columns=PRODUCT_COLUMNS)
+            codes = pd.DataFrame({
+                col: self.encoders[col].transform(labels[col]) for col in PRODUCT_COLUMNS
+            })
+            self._products = (labels, codes)
+        return self._products
+
+    def moving_averages(self):
+        """Latest MA7/MA30 of Quantity per (Quality, Composition), as in training"""
+        averages = latest_moving_averages(self.store.df).reset_index()
+        averages['Quality'] = averages['Quality'].astype(str)
+        averages['Composition'] = clean_composition(averages['Composition'])
+        return averages.set_index(['Quality', 'Composition'])
+
+    def build_features(self, dates):
+        """Feature matrix for every product on every date"""
+        labels, codes = self.products()
+        averages = self.moving_averages()
+        per_product = labels[['Quality', 'Composition']].merge(
+            averages, left_on=['Quality', 'Composition'], right_index=True, how='left'
+        )[['MA7_Quantity', 'MA30_Quantity']].fillna(0).reset_index(drop=True)
+
+        # Product-major rows: each product repeated once per date
+        dates = pd.DatetimeIndex(dates)
+        rows = np.repeat(np.arange(len(labels)), len(dates))
+        X = pd.concat([codes, per_product], axis=1).iloc[rows].reset_index(drop=True)
+        row_dates = pd.DatetimeIndex(np.tile(dates.values, len(labels)))
+        X['Year'] = row_dates.year
+        X['Month'] = row_dates.month
+        X['DayOfMonth'] = row_dates.day
+        X['DayOfWeek'] = row_dates.dayofweek
+        rows_labels = labels.iloc[rows].reset_index(drop=True)
+        rows_labels['Date'] = row_dates
+        return X[MODEL_FEATURES], rows_labels
+
+    def forecast(self, start, end):
+        """Predicted Quantity per product for each date from start to end (inclusive)"""
+        self.check_model()
+        dates = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+        if len(dates) > MAX_FORECAST_DAYS:
+            raise ValueError(f'Date range is limited to {MAX_FORECAST_DAYS} days')
+        with self._lock:
+            if self._cache_rows != len(self.store) or len(self._cache) > 4 * MAX_FORECAST_DAYS:
+                self._cache = {}
+                self._cache_rows = len(self.store)
+            missing = [d for d in dates if d not in self._cache]
+            if missing:
+                X, labels = self.build_features(missing)
+                # One vectorized call for every product on every missing date
+                labels['Quantity'] = self.model.predict(X).round(2)
+                self._store_results(labels)
+            return {date: self._cache[date] for date in dates}
+
+    def _store_results(self, labels):
+        # Best dress per date, summed over agents
+        dress = ['Quality', 'Weave', 'Composition']
+        totals = labels.groupby(['Date'] + dress)['Quantity'].sum()
+        best = totals.groupby(level='Date').idxmax()
+        labels = labels.sort_values('Date', kind='stable')
+        records = labels.drop(columns='Date').to_dict(orient='records')
+        per_date = len(self.products()[0])
+        for i, date in enumerate(labels['Date'].unique()):
+            self._cache[date] = {
+                'best_seller': ' '.join(best[date][1:]),
+                'best_quantity': float(totals[best[date]]),
+                'products': records[i * per_date:(i + 1) * per_date],
+            }
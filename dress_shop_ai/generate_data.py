@@ -1,74 +1,140 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-
-# Set random seed for reproducibility
-np.random.seed(42)
-
-# Generate dates for 2 years
-start_date = datetime(2022, 1, 1)
-end_date = datetime(2023, 12, 31)
-dates = pd.date_range(start=start_date, end=end_date, freq='D')
-
-# Define possible values
-agents = ['Sammy', 'Mark']
-customers = ['Mike Wilson', 'Sarah Johnson', 'David Lee', 'Emma Brown', 'James Smith']
-qualities = ['Premium', 'Standard']
-weaves = ['Plain', 'Satin']
-compositions = ['100% Cotton', '100% Silk']
-
-# Generate random data
-n_records = len(dates) * 3  # Average 3 sales per day
-data = {
-    'Date': np.random.choice(dates, n_records),
-    'Agent': np.random.choice(agents, n_records),
-    'Customer': np.random.choice(customers, n_records),
-    'Quality': np.random.choice(qualities, n_records),
-    'Weave': np.random.choice(weaves, n_records),
-    'Composition': np.random.choice(compositions, n_records)
-}
-
-# Add seasonal variations and trends
-def generate_quantity(date, quality, composition):
-    # Convert numpy.datetime64 to pandas Timestamp
-    date = pd.Timestamp(date)
-    
-    # Base quantity
-    base = np.random.randint(1, 5)
-    
-    # Seasonal factor (higher in wedding seasons: Feb-March and Oct-Nov)
-    month = date.month
-    if month in [2, 3, 10, 11]:
-        base *= 1.5
-    
-    # Premium items tend to sell less but steadily
-    if quality == 'Premium':
-        base *= 0.7
-    
-    # Cotton sells more in summer, Silk in winter
-    if composition == '100% Cotton' and month in [4, 5, 6, 7]:
-        base *= 1.3
-    elif composition == '100% Silk' and month in [11, 12, 1, 2]:
-        base *= 1.3
-    
-    return int(max(1, base))
-
-# Generate quantities with patterns
-data['Quantity'] = [generate_quantity(date, quality, comp) 
-                   for date, quality, comp in zip(data['Date'], data['Quality'], data['Composition'])]
-
-# Create DataFrame and sort by date
-df = pd.DataFrame(data)
-df = df.sort_values('Date')
-
-# Save to CSV
-df.to_csv('data.csv', index=False)
-
-print("Generated 2 years of sales data with the following statistics:")
-print("\nTotal number of records:", len(df))
-print("\nSales by Agent:")
-print(df.groupby('Agent')['Quantity'].sum())
-print("\nSales by Quality:")
-print(df.groupby('Quality')['Quantity'].sum())
-print("\nSales by Composition:")
-print(df.groupby('Composition')['Quantity'].sum())
\ No newline at end of file
+"""Generate synthetic dress sales data.
+
+    python generate_data.py                                   # 2 years, 1 shop -> data.csv
+    python generate_data.py --start 2015-01-01 --end 2024-12-31 --shops 50 \\
+        --agents 200 --customers 100000 --output big.csv --format both
+
+Rows are generated a chunk of days at a time with vectorized numpy draws,
+so memory stays bounded however many rows are written. The same
+arguments and seed always produce the same file.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# Define possible values
+agents = ['Sammy', 'Mark']
+customers = ['Mike Wilson', 'Sarah Johnson', 'David Lee', 'Emma Brown', 'James Smith']
+qualities = ['Premium', 'Standard']
+weaves = ['Plain', 'Satin']
+compositions = ['100% Cotton', '100% Silk']
+
+WEDDING_MONTHS = [2, 3, 10, 11]
+COTTON_MONTHS = [4, 5, 6, 7]
+SILK_MONTHS = [11, 12, 1, 2]
+
+
+def names(base, count, prefix):
+    # The shipped names first, then numbered ones for larger cardinalities
+    extra = [f"{prefix} {i}" for i in range(len(base) + 1, count + 1)]
+    return np.array((base + extra)[:count], dtype=object)
+
+
+def generate_quantity(rng, months, quality, composition, seasonality):
+    # Base quantity
+    base = rng.integers(1, 5, len(months)).astype(float)
+
+    # Seasonal factor (higher in wedding seasons: Feb-March and Oct-Nov)
+    base[np.isin(months, WEDDING_MONTHS)] *= 1 + 0.5 * seasonality
+
+    # Premium items tend to sell less but steadily
+    base[quality == 'Premium'] *= 0.7
+
+    # Cotton sells more in summer, Silk in winter
+    base[(composition == '100% Cotton') & np.isin(months, COTTON_MONTHS)] *= 1 + 0.3 * seasonality
+    base[(composition == '100% Silk') & np.isin(months, SILK_MONTHS)] *= 1 + 0.3 * seasonality
+
+    return np.maximum(1, base).astype(np.int64)
+
+
+def generate_chunk(rng, dates, args, agent_names, customer_names, shop_names):
+    # Number of sales per (day, shop), then one row per sale
+    counts = rng.poisson(args.sales_per_day, size=len(dates) * len(shop_names))
+    day_index = np.repeat(np.repeat(np.arange(len(dates)), len(shop_names)), counts)
+    shop_index = np.repeat(np.tile(np.arange(len(shop_names)), len(dates)), counts)
+    n = len(day_index)
+
+    row_dates = dates[day_index]
+    chunk = {'Date': row_dates.strftime('%Y-%m-%d')}
+    if len(shop_names) > 1:
+        chunk['Shop'] = shop_names[shop_index]
+    chunk['Agent'] = agent_names[rng.integers(0, len(agent_names), n)]
+    chunk['Customer'] = customer_names[rng.integers(0, len(customer_names), n)]
+    chunk['Quality'] = np.array(qualities, dtype=object)[rng.integers(0, len(qualities), n)]
+    chunk['Weave'] = np.array(weaves, dtype=object)[rng.integers(0, len(weaves), n)]
+    chunk['Composition'] = np.array(compositions, dtype=object)[rng.integers(0, len(compositions), n)]
+    chunk['Quantity'] = generate_quantity(rng, row_dates.month.to_numpy(), chunk['Quality'],
+                                          chunk['Composition'], args.seasonality)
+    return pd.DataFrame(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__)
+    parser.add_argument('--start', default='2022-01-01')
+    parser.add_argument('--end', default='2023-12-31')
+    parser.add_argument('--shops', type=int, default=1, help='adds a Shop column when > 1')
+    parser.add_argument('--agents', type=int, default=len(agents))
+    parser.add_argument('--customers', type=int, default=len(customers))
+    parser.add_argument('--sales-per-day', type=float, default=3, help='average sales per shop per day')
+    parser.add_argument('--seasonality', type=float, default=1.0,
+                        help='strength of the wedding/summer/winter effects (0 = none)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-days', type=int, default=30, help='days generated per chunk')
+    parser.add_argument('--output', default='data.csv',
+                        help='CSV path; the Parquet dataset (see storage.py) uses the same name')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'both'], default='csv')
+    args = parser.parse_args()
+
+    dates = pd.date_range(start=args.start, end=args.end, freq='D')
+    agent_names = names(agents, args.agents, 'Agent')
+    customer_names = names(customers, args.customers, 'Customer')
+    shop_names = np.array([f"Shop {i}" for i in range(1, args.shops + 1)], dtype=object)
+
+    csv_file = open(args.output, 'w', newline='') if args.format in ('csv', 'both') else None
+    parquet = None
+    if args.format in ('parquet', 'both'):
+        parquet = storage.DatasetWriter(args.output.rsplit('.', 1)[0] + '.parquet')
+
+    # One independent random stream per chunk, derived from the seed
+    n_chunks = -(-len(dates) // args.chunk_days)
+    streams = np.random.SeedSequence(args.seed).spawn(n_chunks)
+
+    start = time.perf_counter()
+    total_rows = 0
+    totals = {'Agent': {}, 'Quality': {}, 'Composition': {}}
+    for i, stream in enumerate(streams):
+        chunk = generate_chunk(np.random.default_rng(stream),
+                               dates[i * args.chunk_days:(i + 1) * args.chunk_days],
+                               args, agent_names, customer_names, shop_names)
+        if csv_file:
+            chunk.to_csv(csv_file, index=False, header=(i == 0))
+        if parquet:
+            parquet.write(chunk)
+        total_rows += len(chunk)
+        for col, sums in totals.items():
+            for key, qty in chunk.groupby(col)['Quantity'].sum().items():
+                sums[key] = sums.get(key, 0) + qty
+    if csv_file:
+        csv_file.close()
+    if parquet:
+        parquet.close()
+
+    print(f"Generated {len(dates)} days of sales data in {time.perf_counter() - start:.1f} s "
+          f"with the following statistics:")
+    print("\nTotal number of records:", total_rows)
+    for col, sums in totals.items():
+        print(f"\nSales by {col}:")
+        for key in sorted(sums)[:10]:
+            print(f"{key:<20} {sums[key]}")
+        if len(sums) > 10:
+            print(f"... and {len(sums) - 10} more")
+
+
+if __name__ == '__main__':
+    main()
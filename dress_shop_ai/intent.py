@@ -0,0 +1,97 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+# What /predict can answer, in the order the checks are made
+BEST_SELLER = 'best_seller'    # a date and "which dress"/"best seller"/"most number"
+YEAR_COMPARE = 'year_compare'  # any other message with a date
+STOCK = 'stock'                # "stock" or "should i sell", no date
+PRICE = 'price'                # "price" and a catalog dress keyword
+LLM = 'llm'                    # everything else goes to Gemini
+
+BEST_SELLER_PHRASES = ('which dress', 'best seller', 'most number')
+STOCK_PHRASES = ('stock', 'should i sell')
+
+# Dresses with a fixed price; the first entry whose keywords appear is used
+DRESS_CATALOG = [
+    {
+        'name': 'Premium Cotton Plain',
+        'keywords': ['cotton', 'plain'],
+        'price': '₹490',
+        'composition': '100% Cotton',
+        'quality': 'Premium'
+    },
+    {
+        'name': 'Standard Silk Satin',
+        'keywords': ['silk', 'satin', 'standard'],
+        'price': '₹199',
+        'composition': '100% Silk',
+        'quality': 'Standard'
+    },
+    {
+        'name': 'Premium Silk Satin',
+        'keywords': ['silk', 'satin', 'premium'],
+        'price': '₹225',
+        'composition': '100% Silk',
+        'quality': 'Premium'
+    }
+]
+
+# 2023-03-15 / 2023-3-5: built straight into a Timestamp, the same one pd.to_datetime gives
+ISO_DATE = re.compile(r'([1-9]\d{3})-(\d{1,2})-(\d{1,2})')
+# Every other word pd.to_datetime accepts has a digit or one of these in it (month names,
+# "now", "today", "nan"/"nat"); anything else is skipped without calling pandas
+MAYBE_DATE = re.compile(r'\d|jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|now|today|nan|nat', re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Query:
+    """A /predict message with its intent and the entities the handlers need"""
+    intent: str
+    text: str
+    date: Optional[pd.Timestamp] = None
+    dress: Optional[dict] = None
+
+
+def parse_date(word):
+    """The Timestamp pd.to_datetime(word) gives, or None where it fails or gives NaT"""
+    match = ISO_DATE.fullmatch(word)
+    if match:
+        try:
+            return pd.Timestamp(int(match[1]), int(match[2]), int(match[3]))
+        except ValueError:
+            return None
+    if not MAYBE_DATE.search(word):
+        return None
+    try:
+        date = pd.to_datetime(word)
+    except Exception:
+        return None
+    return None if date is pd.NaT else date
+
+
+def find_date(text):
+    """The first whitespace-separated word of the message that is a date"""
+    for word in text.split():
+        date = parse_date(word)
+        if date is not None:
+            return date
+    return None
+
+
+def parse_query(text):
+    """Classify a /predict message; one pass over its words, one lowercase copy"""
+    lower = text.lower()
+    date = find_date(text)
+    if date is not None:
+        intent = BEST_SELLER if any(phrase in lower for phrase in BEST_SELLER_PHRASES) else YEAR_COMPARE
+        return Query(intent, text, date=date)
+    if any(phrase in lower for phrase in STOCK_PHRASES):
+        return Query(STOCK, text)
+    if 'price' in lower:
+        for dress in DRESS_CATALOG:
+            if any(keyword in lower for keyword in dress['keywords']):
+                return Query(PRICE, text, dress=dress)
+    return Query(LLM, text)
@@ -0,0 +1,70 @@
+import threading
+
+import pandas as pd
+
+# Dimensions the cube is summed over; Quantity is the only measure
+DIMENSIONS = ['Agent', 'Quality', 'Weave', 'Composition']
+KEYS = ['Year', 'Month', 'Day'] + DIMENSIONS
+
+
+class SalesCube:
+    """Quantity pre-summed by (year, month, day, agent, quality, weave, composition).
+
+    Cells are bucketed by calendar day and by month, then by year, so a
+    lookup for a given day or month is a couple of dict hits no matter
+    how many years of history are loaded. New rows are folded in with
+    add(), which costs one update per aggregated cell of the new batch.
+    """
+
+    def __init__(self, df=None):
+        # Buckets map year -> {(agent, quality, weave, composition): qty}, plus an
+        # all-years rollup under the key None
+        self._days = {}    # (month, day) -> bucket
+        self._months = {}  # month -> bucket
+        self._lock = threading.Lock()
+        if df is not None:
+            self.add(df)
+
+    @staticmethod
+    def _bump(buckets, key, year, cell, qty):
+        bucket = buckets.setdefault(key, {})
+        for y in (year, None):
+            cells = bucket.setdefault(y, {})
+            cells[cell] = cells.get(cell, 0) + qty
+
+    def add(self, df):
+        """Fold new sales rows (with Year/Month/Day columns) into the cube"""
+        if df.empty:
+            return
+        cells = df.groupby(KEYS, observed=True)['Quantity'].sum()
+        with self._lock:
+            for (year, month, day, *dims), qty in cells.items():
+                year, month, day, qty = int(year), int(month), int(day), int(qty)
+                cell = tuple(str(d) for d in dims)
+                self._bump(self._days, (month, day), year, cell, qty)
+                self._bump(self._months, month, year, cell, qty)
+
+    def totals(self, month, day=None, year=None, by=('Quality', 'Weave', 'Composition')):
+        """Summed Quantity for a calendar day (all years unless year is set) or a month"""
+        positions = [KEYS.index(level) for level in by]
+        out = {}
+        with self._lock:
+            bucket = self._months.get(month) if day is None else self._days.get((month, day))
+            bucket = bucket or {}
+            if year is not None:
+                years = {year: bucket[year]} if year in bucket else {}
+            elif 'Year' in by:
+                years = {y: cells for y, cells in bucket.items() if y is not None}
+            else:
+                years = {None: bucket[None]} if None in bucket else {}
+            for y, cells in years.items():
+                for cell, qty in cells.items():
+                    # Full key is (Year, Month, Day, *DIMENSIONS); Month/Day never grouped on
+                    row = (y, month, day) + cell
+                    key = row[positions[0]] if len(positions) == 1 else tuple(row[p] for p in positions)
+                    out[key] = out.get(key, 0) + qty
+        if not out:
+            return pd.Series(dtype='int64')
+        totals = pd.Series(out, dtype='int64').sort_index()
+        totals.index.names = list(by)
+        return totals
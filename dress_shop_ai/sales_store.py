@@ -0,0 +1,165 @@
+import threading
+
+import pandas as pd
+
+import storage
+from sales_cube import SalesCube
+
+# Columns of data.csv, in file order
+SALES_COLUMNS = ['Date', 'Agent', 'Customer', 'Quality', 'Weave', 'Composition', 'Quantity']
+
+# Columns kept as pandas categoricals (few distinct values, repeated a lot)
+CATEGORY_COLUMNS = ['Agent', 'Customer', 'Quality', 'Weave', 'Composition']
+
+
+class SalesStore:
+    """Sales data loaded once, with the Date column parsed a single time.
+
+    Year/Month/Day/DayOfWeek are kept as small integer columns so the
+    routes can filter with plain integer comparisons instead of calling
+    pd.to_datetime on the whole frame for every request. Day and month
+    totals are answered from a pre-aggregated SalesCube.
+
+    New sales are added with append(): the cube is updated right away,
+    while the row batches are only concatenated onto the frame the next
+    time it is read, so a burst of small batches costs one concat.
+    """
+
+    def __init__(self, df, path=None):
+        self.path = path
+        self._df = self._prepare(df)
+        self._pending = []
+        self._lock = threading.Lock()
+        self.cube = SalesCube(self._df)
+        self._summary = (None, None)  # (row count, text) for chat_summary()
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path), path=path)
+
+    @classmethod
+    def load(cls, path):
+        """From a CSV file or a partitioned Parquet dataset (see storage.py)"""
+        return cls(storage.read_sales(path), path=path)
+
+    @property
+    def df(self):
+        if self._pending:
+            with self._lock:
+                if self._pending:
+                    self._df = self._concat([self._df] + self._pending)
+                    self._pending = []
+        return self._df
+
+    @staticmethod
+    def _concat(frames):
+        """One frame from the batches; the inputs are left untouched, as readers may still hold them"""
+        # Align category sets first, otherwise concat falls back to object dtype
+        aligned = {}
+        for col in CATEGORY_COLUMNS:
+            if col in frames[0].columns:
+                categories = frames[0][col].cat.categories
+                for frame in frames[1:]:
+                    categories = categories.union(frame[col].cat.categories)
+                aligned[col] = categories
+        frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)
+                                  for col, categories in aligned.items()}) for frame in frames]
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def validate(rows):
+        """Check and normalize a batch of raw sales rows, raising ValueError if invalid"""
+        missing = [col for col in SALES_COLUMNS if col not in rows.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        rows = rows[SALES_COLUMNS].copy()
+        if rows[CATEGORY_COLUMNS].isna().any().any():
+            raise ValueError('Agent, Customer, Quality, Weave and Composition are required')
+        rows['Date'] = pd.to_datetime(rows['Date']).dt.strftime('%Y-%m-%d')
+        quantity = pd.to_numeric(rows['Quantity'])
+        if (quantity % 1 != 0).any() or (quantity < 0).any():
+            raise ValueError('Quantity must be a non-negative whole number')
+        rows['Quantity'] = quantity.astype('int64')
+        return rows
+
+    def append(self, rows):
+        """Add a batch of sales rows to the CSV log or dataset, the cube and the frame"""
+        rows = self.validate(rows)
+        prepared = self._prepare(rows)
+        with self._lock:
+            if self.path and storage.is_dataset(self.path):
+                storage.append_sales(self.path, rows)
+            elif self.path:
+                with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                    rows.to_csv(f, header=False, index=False)
+            self.cube.add(prepared)
+            self._pending.append(prepared)
+        return len(rows)
+
+    @staticmethod
+    def _prepare(df):
+        df = df.copy()
+        dates = pd.to_datetime(df['Date'])
+        df['Date'] = dates
+        df['Year'] = dates.dt.year.astype('int16')
+        df['Month'] = dates.dt.month.astype('int8')
+        df['Day'] = dates.dt.day.astype('int8')
+        df['DayOfWeek'] = dates.dt.dayofweek.astype('int8')
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        return df
+
+    def __len__(self):
+        # Counted without forcing the pending batches to be concatenated
+        return len(self._df) + sum(len(batch) for batch in self._pending)
+
+    # === Row selections ===
+    def month(self, month):
+        df = self.df
+        return df[df['Month'] == month]
+
+    def latest_date(self):
+        return self.df['Date'].max()
+
+    # === Summaries ===
+    def total_quantity(self, **criteria):
+        """Total Quantity for rows matching column=value (case-insensitive)"""
+        df = self.df  # one frame for the whole call, even if an ingest lands meanwhile
+        mask = pd.Series(True, index=df.index)
+        for col, value in criteria.items():
+            column = df[col]
+            # Compare against the handful of categories, not every row
+            matches = [c for c in column.cat.categories if c.lower() == value.lower()]
+            mask &= column.isin(matches)
+        return df.loc[mask, 'Quantity'].sum()
+
+    def values(self, column):
+        """Distinct values of a category column, sorted"""
+        return [str(value) for value in self.df[column].cat.categories]
+
+    def customers(self):
+        df = self.df
+        if 'Customer' not in df.columns:
+            return []
+        return list(df['Customer'].unique())
+
+    def top_customer(self):
+        df = self.df
+        if 'Customer' not in df.columns:
+            return None
+        return df.groupby('Customer', observed=True)['Quantity'].sum().idxmax()
+
+    def chat_summary(self):
+        """Customer list and top customer for the assistant prompt.
+
+        Rebuilt only when rows have been added, so the prompt text (and
+        with it the LLM cache key) stays the same between ingests.
+        """
+        rows, text = self._summary
+        if rows != len(self):
+            rows = len(self)
+            text = (f"Customers: {', '.join(self.customers()) or 'N/A'}\n"
+                    f"Top customer: {self.top_customer() or 'N/A'}\n")
+            self._summary = (rows, text)
+        return text
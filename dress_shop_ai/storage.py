@@ -0,0 +1,273 @@
+"""Sales data on disk as Parquet files partitioned by year and month.
+
+    python storage.py convert data.csv sales.parquet
+    python storage.py info sales.parquet
+    SALES_DATA=sales.parquet python app.py
+
+    df = read_sales('sales.parquet', start='2023-03-01', end='2023-03-31', columns=['Date', 'Quantity'])
+
+A dataset is a directory:
+
+    sales.parquet/meta.json                               format version and columns
+    sales.parquet/Year=2023/Month=03/part-<ns>.parquet    one or more files per month
+
+Dates are stored as date32, Quantity as int64 and the other columns as
+dictionary-encoded strings, which come back as pandas categoricals. A
+read only opens the partitions that overlap the date range, only decodes
+the requested columns and filters rows on Date inside Arrow. Files are
+memory-mapped, so nothing is read through an intermediate buffer. Within
+a month, files are named by their write time, so rows come back in the
+order they were written.
+
+read_sales() also accepts a CSV path, in which case the whole file is
+parsed and filtered with pandas.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+# Rows are buffered per month and written in row groups of about this size
+ROW_GROUP_ROWS = 128 * 1024
+# Rows buffered over all months before the largest month is written early
+MAX_BUFFERED_ROWS = 4 * ROW_GROUP_ROWS
+DATE_COLUMN = 'Date'
+INTEGER_COLUMNS = {'Quantity': 'int64'}
+
+PARTITION = re.compile(r'Year=(\d{4})[/\\]Month=(\d{2})[/\\][^/\\]+\.parquet$')
+
+
+def _require_arrow():
+    if pa is None:
+        raise RuntimeError('pyarrow is required for Parquet sales datasets (pip install pyarrow)')
+
+
+def is_dataset(path):
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def _arrow_table(df):
+    """The rows as an Arrow table with the dataset's column types"""
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if name == DATE_COLUMN:
+            days = pd.to_datetime(values).to_numpy().astype('datetime64[D]')
+            columns[name] = pa.array(days, type=pa.date32())
+        elif name in INTEGER_COLUMNS:
+            columns[name] = pa.array(values.to_numpy(INTEGER_COLUMNS[name]))
+        else:
+            columns[name] = pa.array(values.astype(str).to_numpy(object), type=pa.string())
+    return pa.table(columns)
+
+
+class DatasetWriter:
+    """Writes sales rows into a dataset's month partitions.
+
+    Rows are buffered per month and flushed as row groups, with one file
+    per month for each writer; close() writes the rest and meta.json.
+    A month is also flushed once a write starts past it (input in date
+    order never returns to it), and the largest month is flushed when
+    more than MAX_BUFFERED_ROWS rows are buffered in all.
+    """
+
+    def __init__(self, path):
+        _require_arrow()
+        self.path = path
+        self.rows = 0
+        self._buffers = {}  # (year, month) -> [tables], rows buffered
+        self._buffered = 0  # rows over all buffers
+        self._writers = {}  # (year, month) -> ParquetWriter
+        self._schema = None
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows):
+        """Add a DataFrame or Arrow table of sales rows"""
+        table = _arrow_table(rows) if isinstance(rows, pd.DataFrame) else rows
+        if not len(table):
+            return
+        if self._schema is None:
+            self._schema = table.schema
+        dates = table.column(DATE_COLUMN)
+        keys = pc.add(pc.multiply(pc.year(dates), 100), pc.month(dates))
+        first = divmod(pc.min(keys).as_py(), 100)
+        for partition in [partition for partition in self._buffers if partition < first]:
+            self._flush(partition)
+        for key in pc.unique(keys).to_pylist():
+            part = table.filter(pc.equal(keys, key))
+            partition = divmod(key, 100)
+            tables, buffered = self._buffers.get(partition, ([], 0))
+            tables.append(part)
+            buffered += len(part)
+            self._buffers[partition] = (tables, buffered)
+            self._buffered += len(part)
+            if buffered >= ROW_GROUP_ROWS:
+                self._flush(partition)
+        while self._buffered > MAX_BUFFERED_ROWS:
+            self._flush(max(self._buffers, key=lambda partition: self._buffers[partition][1]))
+        self.rows += len(table)
+
+    def _flush(self, partition):
+        tables, buffered = self._buffers.pop(partition, ([], 0))
+        if not tables:
+            return
+        self._buffered -= buffered
+        writer = self._writers.get(partition)
+        if writer is None:
+            year, month = partition
+            directory = os.path.join(self.path, f'Year={year}', f'Month={month:02d}')
+            os.makedirs(directory, exist_ok=True)
+            # Nanosecond names sort in write order, which is the order rows are read back in
+            name = f'part-{time.time_ns():020d}-{os.getpid()}.parquet'
+            writer = self._writers[partition] = pq.ParquetWriter(os.path.join(directory, name), self._schema)
+        writer.write_table(pa.concat_tables(tables), row_group_size=ROW_GROUP_ROWS)
+
+    def close(self):
+        for partition in list(self._buffers):
+            self._flush(partition)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        if self._schema is not None and not is_dataset(self.path):
+            with open(os.path.join(self.path, META_FILE), 'w') as f:
+                json.dump({'version': FORMAT_VERSION, 'columns': self._schema.names}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_sales(df, path):
+    with DatasetWriter(path) as writer:
+        writer.write(df)
+    return path
+
+
+def append_sales(path, rows):
+    """Add a batch of rows as new files in their month partitions"""
+    write_sales(rows, path)
+
+
+def convert_csv(csv_path, path, block_size=64 * 1024 * 1024):
+    """Stream a sales CSV into a dataset, one block of the file at a time"""
+    _require_arrow()
+    import pyarrow.csv
+    convert = pyarrow.csv.ConvertOptions(column_types={DATE_COLUMN: pa.date32(), **INTEGER_COLUMNS})
+    reader = pyarrow.csv.open_csv(csv_path, read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+                                  convert_options=convert)
+    with DatasetWriter(path) as writer:
+        for batch in reader:
+            writer.write(pa.Table.from_batches([batch]))
+    return writer.rows
+
+
+def _meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported dataset version {meta.get('version')}")
+    return meta
+
+
+def partition_files(path, start=None, end=None):
+    """The dataset's files for months overlapping [start, end], in read order"""
+    first = (start.year, start.month) if start is not None else None
+    last = (end.year, end.month) if end is not None else None
+    files = []
+    for file in glob.glob(os.path.join(path, 'Year=*', 'Month=*', '*.parquet')):
+        match = PARTITION.search(file)
+        if not match:
+            continue
+        partition = (int(match[1]), int(match[2]))
+        if (first is None or partition >= first) and (last is None or partition <= last):
+            files.append((partition, os.path.basename(file), os.path.abspath(file)))
+    return [file for _, _, file in sorted(files)]
+
+
+def read_sales(path, start=None, end=None, columns=None):
+    """Sales rows with start <= Date <= end (both optional), only the given columns"""
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    if not is_dataset(path):
+        df = pd.read_csv(path)
+        if start is not None or end is not None:
+            dates = pd.to_datetime(df[DATE_COLUMN])
+            df = df[((dates >= start) if start is not None else True) & ((dates <= end) if end is not None else True)]
+        return df[columns] if columns else df
+
+    _require_arrow()
+    meta = _meta(path)
+    columns = list(columns or meta['columns'])
+    files = partition_files(path, start, end)
+    if not files:
+        return pd.DataFrame({name: pd.Series(dtype='object') for name in columns})
+    dictionary = [name for name in meta['columns'] if name != DATE_COLUMN and name not in INTEGER_COLUMNS]
+    dataset = ds.dataset(
+        files, format=ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=dictionary)),
+        filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True))
+    # Row filter for the first and last month; row-group statistics let Arrow skip whole groups
+    condition = None
+    date = ds.field(DATE_COLUMN)
+    if start is not None:
+        condition = date >= pa.scalar(start.date(), pa.date32())
+    if end is not None:
+        before_end = date <= pa.scalar(end.date(), pa.date32())
+        condition = before_end if condition is None else condition & before_end
+    table = dataset.to_table(columns=columns, filter=condition)
+    df = table.to_pandas(date_as_object=False)
+    # Dictionaries come back in order of first appearance; pandas sorts categories
+    for name in df.columns:
+        if isinstance(df[name].dtype, pd.CategoricalDtype) and not df[name].cat.categories.is_monotonic_increasing:
+            df[name] = df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+    return df
+
+
+def describe(path):
+    meta = _meta(path)
+    files = partition_files(path)
+    rows = sum(pq.ParquetFile(file).metadata.num_rows for file in files)
+    size = sum(os.path.getsize(file) for file in files)
+    months = {PARTITION.search(file).groups() for file in files}
+    return {'rows': rows, 'files': len(files), 'months': len(months), 'bytes': size, 'columns': meta['columns']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help='write a sales CSV as a partitioned dataset')
+    convert.add_argument('csv')
+    convert.add_argument('dataset')
+    info = sub.add_parser('info', help='rows, files and size of a dataset')
+    info.add_argument('dataset')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        if os.path.exists(args.dataset):
+            parser.error(f'{args.dataset} already exists')
+        start = time.perf_counter()
+        rows = convert_csv(args.csv, args.dataset)
+        print(f"Wrote {rows:,} rows to {args.dataset} in {time.perf_counter() - start:.1f} s")
+    info = describe(args.dataset)
+    print(f"{args.dataset}: {info['rows']:,} rows in {info['files']} files over {info['months']} months, "
+          f"{info['bytes'] / 2**20:.1f} MB; columns {', '.join(info['columns'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+
+from compact_forest import CompactForest, export_forest, load_encoders, load_model
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({
+        'Month': rng.integers(1, 13, 2000),
+        'DayOfWeek': rng.integers(0, 7, 2000),
+        'Quality': rng.integers(0, 2, 2000),
+        'Lag7': rng.normal(20, 5, 2000).round(2),
+    })
+    y = X['Month'] * 2 + X['Quality'] * 5 + X['Lag7'] / 3 + rng.normal(0, 1, 2000)
+    model = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0).fit(X, y)
+    encoders = {'Quality': LabelEncoder().fit(['Premium', 'Standard'])}
+    return model, encoders, X
+
+
+def test_predictions_match_sklearn(fitted, tmp_path):
+    model, encoders, X = fitted
+    path = export_forest(model, encoders, str(tmp_path / 'model.forest'))
+    forest = CompactForest(path)
+
+    # Whole-number and in-between values, including ones that land on a split threshold
+    rng = np.random.default_rng(1)
+    probe = pd.DataFrame({
+        'Month': rng.integers(1, 13, 3000), 'DayOfWeek': rng.integers(0, 7, 3000),
+        'Quality': rng.integers(0, 2, 3000), 'Lag7': rng.normal(20, 5, 3000),
+    })
+    probe.loc[:99, 'Lag7'] = model.estimators_[0].tree_.threshold[:100]
+    for frame in (X, probe):
+        np.testing.assert_allclose(forest.predict(frame), model.predict(frame), rtol=1e-5)
+    assert list(forest.feature_names_in_) == list(model.feature_names_in_)
+
+
+def test_loaders_prefer_the_export_and_fall_back_to_pickles(fitted, tmp_path):
+    joblib = pytest.importorskip('joblib')
+    model, encoders, _ = fitted
+    compact = str(tmp_path / 'model.forest')
+    joblib.dump(model, tmp_path / 'model.pkl')
+    joblib.dump(encoders, tmp_path / 'encoders.pkl')
+
+    assert isinstance(load_model(compact, str(tmp_path / 'model.pkl')), RandomForestRegressor)
+    export_forest(model, encoders, compact)
+    assert isinstance(load_model(compact, str(tmp_path / 'model.pkl')), CompactForest)
+    codes = load_encoders(compact)['Quality']
+    assert list(codes.transform(['Standard', 'Premium'])) == list(encoders['Quality'].transform(['Standard', 'Premium']))
+
+
+def test_unknown_format_version_is_refused(fitted, tmp_path):
+    model, encoders, _ = fitted
+    path = export_forest(model, encoders, str(tmp_path / 'model.forest'))
+    (tmp_path / 'model.forest' / 'meta.json').write_text('{"version": 99}')
+    with pytest.raises(ValueError, match='Unsupported model format version'):
+        CompactForest(path)
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import ROLLING_WINDOWS, add_date_features, add_rolling_features, build_feature_table
+
+DATA = os.path.join(os.path.dirname(__file__), 'data.csv')
+
+
+@pytest.fixture
+def raw():
+    return pd.read_csv(DATA)
+
+
+def full_build(raw):
+    return add_rolling_features(add_date_features(raw.copy()))
+
+
+def test_rolling_features_match_the_pandas_rolling_mean(raw):
+    df = add_rolling_features(raw.copy())
+    for col, window in ROLLING_WINDOWS.items():
+        # What train_model.py computed before the cumulative sums
+        expected = raw.groupby(['Quality', 'Composition'])['Quantity'].transform(
+            lambda x: x.rolling(window=window, min_periods=1).mean())
+        np.testing.assert_allclose(df[col], expected, rtol=1e-9)
+
+
+def test_extending_the_saved_table_equals_a_full_rebuild(raw, tmp_path):
+    path = str(tmp_path / 'features.pkl')
+    build_feature_table(raw.iloc[:1500], path)
+    table = build_feature_table(raw, path)
+    pd.testing.assert_frame_equal(table, full_build(raw))
+    # Reused as is when nothing was added
+    assert build_feature_table(raw, path).equals(table)
+
+
+def test_changed_earlier_rows_rebuild_the_table(raw, tmp_path):
+    path = str(tmp_path / 'features.pkl')
+    build_feature_table(raw.iloc[:1500], path)
+    # A month rewritten by a backfill, read back in partition order: earlier rows change
+    # while the row at the saved table's last position stays the same
+    backfill = raw.iloc[990:1000].assign(Quantity=99)
+    changed = pd.concat([raw.iloc[:990], backfill, raw.iloc[1000:]], ignore_index=True)
+    assert changed.iloc[1499].equals(raw.iloc[1499])
+    table = build_feature_table(changed, path)
+    pd.testing.assert_frame_equal(table, full_build(changed))
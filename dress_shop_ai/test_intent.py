@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+import intent
+
+
+def reference_date(word):
+    """What the route did per word before the parser: pd.to_datetime, failures skipped"""
+    try:
+        date = pd.to_datetime(word)
+    except Exception:
+        return None
+    return None if date is pd.NaT else date
+
+
+@pytest.mark.filterwarnings('ignore::UserWarning')
+@pytest.mark.parametrize('word', [
+    '2023-03-15', '2023-3-5', '2024-02-29', '2023-02-29', '2023-13-01', '0999-01-01',
+    '15/03/2023', '03/15/2023', '2023/03/15', '20230315', 'March', 'mar', 'Dec-2023', '15-Mar-2023',
+    '2023', '12', '3.5', 'nan', 'NaT', 'now', 'today',
+    'dress', 'price?', 'Satin', 'best', '', '-', 'premium',
+])
+def test_parse_date_agrees_with_to_datetime(word):
+    expected = reference_date(word)
+    got = intent.parse_date(word)
+    if expected is None or word in ('now', 'today'):
+        # "now" and "today" move between the two calls; only their presence is compared
+        assert (got is None) == (expected is None)
+    else:
+        assert got == expected
+
+
+@pytest.mark.filterwarnings('ignore::UserWarning')
+@pytest.mark.parametrize('text, expected', [
+    ('which dress sold most on 2023-03-15', intent.BEST_SELLER),
+    ('Best seller on 15/03/2023 ?', intent.BEST_SELLER),
+    ('best seller on 2023-03-15?', intent.LLM),  # the word is "2023-03-15?", not a date
+    ('how did 2023-03-15 compare', intent.YEAR_COMPARE),
+    ('should i sell satin', intent.STOCK),
+    ('Stock check please', intent.STOCK),
+    ('price of premium silk satin', intent.PRICE),
+    ('price of the blue one', intent.LLM),
+    ('hello there', intent.LLM),
+])
+def test_intents(text, expected):
+    assert intent.parse_query(text).intent == expected
+
+
+def test_first_date_word_wins():
+    query = intent.parse_query('best seller on 2023-03-15 or 2024-01-01')
+    assert query.date == pd.Timestamp('2023-03-15')
+
+
+def test_price_uses_the_first_matching_dress():
+    # "silk satin standard premium" matches both silk satin entries; the catalog order decides
+    query = intent.parse_query('price for standard and premium silk satin')
+    assert query.dress['name'] == 'Standard Silk Satin'
@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+from sales_cube import SalesCube
+from sales_store import SalesStore
+
+DATA = os.path.join(os.path.dirname(__file__), 'data.csv')
+BY = ['Quality', 'Weave', 'Composition']
+
+
+@pytest.fixture(scope='module')
+def sales():
+    return SalesStore(pd.read_csv(DATA)).df
+
+
+def pandas_totals(df, by, **keys):
+    mask = pd.Series(True, index=df.index)
+    for column, value in keys.items():
+        mask &= df[column] == value
+    totals = df[mask].groupby(by, observed=True)['Quantity'].sum()
+    return {(key if len(by) > 1 else (key,)): int(qty) for key, qty in totals.items() if qty}
+
+
+def cube_totals(cube, by, **kwargs):
+    return {(key if len(by) > 1 else (key,)): int(qty) for key, qty in cube.totals(by=by, **kwargs).items()}
+
+
+@pytest.mark.parametrize('month, day', [(1, 1), (3, 15), (6, 30), (12, 31)])
+def test_day_totals_match_pandas(sales, month, day):
+    cube = SalesCube(sales)
+    assert cube_totals(cube, BY, month=month, day=day) == pandas_totals(sales, BY, Month=month, Day=day)
+
+
+@pytest.mark.parametrize('month', range(1, 13))
+def test_month_totals_by_agent_and_quality_match_pandas(sales, month):
+    cube = SalesCube(sales)
+    by = ['Agent', 'Quality']
+    assert cube_totals(cube, by, month=month) == pandas_totals(sales, by, Month=month)
+
+
+def test_year_filter_and_year_grouping(sales):
+    cube = SalesCube(sales)
+    year = int(sales['Year'].min())
+    assert cube_totals(cube, BY, month=2, year=year) == pandas_totals(sales, BY, Month=2, Year=year)
+    assert cube_totals(cube, ['Year'], month=2) == pandas_totals(sales, ['Year'], Month=2)
+
+
+def test_added_batches_match_a_cube_built_at_once(sales):
+    cube = SalesCube()
+    for start in range(0, len(sales), 700):
+        cube.add(sales.iloc[start:start + 700])
+    whole = SalesCube(sales)
+    for month in range(1, 13):
+        assert cube.totals(month).equals(whole.totals(month))
+
+
+def test_unknown_day_is_empty(sales):
+    assert SalesCube(sales).totals(2, 30).empty
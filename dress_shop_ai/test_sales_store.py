@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+from sales_store import SALES_COLUMNS, SalesStore
+
+DATA = os.path.join(os.path.dirname(__file__), 'data.csv')
+
+
+@pytest.fixture
+def source():
+    return pd.read_csv(DATA).head(500)
+
+
+def batch(**overrides):
+    row = {'Date': '2024-03-15', 'Agent': 'Mark', 'Customer': 'New Customer', 'Quality': 'Premium',
+           'Weave': 'Satin', 'Composition': '100% Silk', 'Quantity': 4}
+    row.update(overrides)
+    return pd.DataFrame([row])
+
+
+def test_appends_are_read_through_one_frame(source):
+    store = SalesStore(source)
+    store.append(batch())
+    store.append(batch(Quantity=6, Weave='Twill'))
+
+    assert len(store) == len(source) + 2
+    df = store.df
+    assert len(df) == len(source) + 2
+    assert 'Twill' in store.values('Weave')
+    assert df['Customer'].dtype == 'category'
+    assert store.total_quantity(Customer='new customer') == 10
+    assert store.latest_date() == pd.Timestamp('2024-03-15')
+
+
+def test_append_leaves_a_frame_already_read_untouched(source):
+    store = SalesStore(source)
+    before = store.df
+    categories = list(before['Customer'].cat.categories)
+    codes = before['Customer'].cat.codes.copy()
+
+    store.append(batch())
+    assert len(store.df) == len(before) + 1
+    assert list(before['Customer'].cat.categories) == categories
+    assert before['Customer'].cat.codes.equals(codes)
+
+
+def test_cube_and_frame_agree_after_append(source):
+    store = SalesStore(source)
+    store.append(batch(Date='2022-03-15'))
+    df = store.df
+    month = df[(df['Month'] == 3) & (df['Day'] == 15)]
+    expected = month.groupby(['Quality', 'Weave', 'Composition'], observed=True)['Quantity'].sum()
+    assert store.cube.totals(3, 15).to_dict() == {key: qty for key, qty in expected.items() if qty}
+
+
+def test_month_and_top_customer(source):
+    store = SalesStore(source)
+    store.append(batch(Date='2022-01-20', Quantity=1000))
+    assert set(store.month(1)['Month']) == {1}
+    assert store.top_customer() == 'New Customer'
+    assert 'New Customer' in store.chat_summary()
+
+
+@pytest.mark.parametrize('rows, message', [
+    (batch().drop(columns='Weave'), 'Missing columns: Weave'),
+    (batch(Agent=None), 'are required'),
+    (batch(Quantity=1.5), 'whole number'),
+    (batch(Quantity=-1), 'whole number'),
+])
+def test_invalid_batches_are_rejected(source, rows, message):
+    store = SalesStore(source)
+    with pytest.raises(ValueError, match=message):
+        store.append(rows)
+    assert len(store) == len(source)
+
+
+def test_append_writes_to_the_csv_log(source, tmp_path):
+    path = str(tmp_path / 'data.csv')
+    source.to_csv(path, index=False)
+    store = SalesStore.from_csv(path)
+    store.append(batch())
+
+    reloaded = pd.read_csv(path)
+    assert list(reloaded.columns) == SALES_COLUMNS
+    assert len(reloaded) == len(source) + 1
+    assert reloaded.iloc[-1]['Customer'] == 'New Customer'
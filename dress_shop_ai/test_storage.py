@@ -0,0 +1,54 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+import storage
+from storage import DatasetWriter, read_sales
+
+DATA = os.path.join(os.path.dirname(__file__), 'data.csv')
+
+
+@pytest.fixture
+def source():
+    df = pd.read_csv(DATA)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.sort_values('Date', kind='stable').reset_index(drop=True)
+
+
+def month_files(path):
+    return sorted(os.path.relpath(file, path) for file in glob.glob(os.path.join(path, 'Year=*', 'Month=*', '*')))
+
+
+def test_a_month_is_written_once_the_input_moves_past_it(source, tmp_path):
+    path = str(tmp_path / 'sales.parquet')
+    months = source['Date'].dt.to_period('M')
+    first, second = months.unique()[:2]
+    writer = DatasetWriter(path)
+    writer.write(source[months == first])
+    assert month_files(path) == []
+
+    writer.write(source[months == second])
+    assert [file.split(os.sep)[:2] for file in month_files(path)] == [[f'Year={first.year}', f'Month={first.month:02d}']]
+    assert list(writer._buffers) == [(second.year, second.month)]
+    writer.close()
+
+
+def test_buffered_rows_stay_bounded_for_unordered_input(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'ROW_GROUP_ROWS', 1000)
+    monkeypatch.setattr(storage, 'MAX_BUFFERED_ROWS', 300)
+    path = str(tmp_path / 'sales.parquet')
+    shuffled = source.sample(frac=1, random_state=0)
+    with DatasetWriter(path) as writer:
+        for start in range(0, len(shuffled), 100):
+            writer.write(shuffled.iloc[start:start + 100])
+            assert writer._buffered <= 300
+
+    df = read_sales(path)
+    key = ['Date', 'Agent', 'Customer', 'Quality', 'Weave', 'Composition', 'Quantity']
+    expected = source.sort_values(key).reset_index(drop=True)
+    got = df.astype({name: str for name in key if name not in ('Date', 'Quantity')}).sort_values(key)
+    assert len(df) == len(source)
+    pd.testing.assert_frame_equal(got.reset_index(drop=True)[key], expected[key], check_dtype=False)
@@ -1,75 +1,243 @@
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-import joblib
-from datetime import datetime, timedelta
-
-# Load and preprocess the dataset
-df = pd.read_csv('data.csv')
-
-# Convert Date column to datetime and extract features
-df['Date'] = pd.to_datetime(df['Date'])
-df['Month'] = df['Date'].dt.month
-df['DayOfWeek'] = df['Date'].dt.dayofweek
-df['Year'] = df['Date'].dt.year
-df['DayOfMonth'] = df['Date'].dt.day
-df['Season'] = pd.cut(df['Month'], 
-    bins=[0,3,6,9,12], 
-    labels=['Winter', 'Spring', 'Summer', 'Fall'])
-
-# Calculate rolling averages for seasonal trends
-df['MA7_Quantity'] = df.groupby(['Quality', 'Composition'])['Quantity'].transform(
-    lambda x: x.rolling(window=7, min_periods=1).mean())
-df['MA30_Quantity'] = df.groupby(['Quality', 'Composition'])['Quantity'].transform(
-    lambda x: x.rolling(window=30, min_periods=1).mean())
-
-# Clean Composition column
-df['Composition'] = df['Composition'].str.replace('100% ', '')
-
-# Encode categorical columns
-label_cols = ['Agent', 'Customer', 'Quality', 'Weave', 'Composition', 'Season']
-encoders = {}
-for col in label_cols:
-    le = LabelEncoder()
-    df[col] = le.fit_transform(df[col])
-    encoders[col] = le
-
-# Define features and target
-features = ['Year', 'Month', 'DayOfMonth', 'DayOfWeek', 'Agent', 
-           'Quality', 'Weave', 'Composition', 'MA7_Quantity', 'MA30_Quantity']
-X = df[features]
-y = df['Quantity']
-
-# Split the data chronologically
-train_size = int(len(df) * 0.8)
-X_train, X_test = X[:train_size], X[train_size:]
-y_train, y_test = y[:train_size], y[train_size:]
-
-# Train the model
-model = RandomForestRegressor(
-    n_estimators=200,
-    max_depth=15,
-    min_samples_split=5,
-    min_samples_leaf=2,
-    random_state=42
-)
-model.fit(X_train, y_train)
-
-# Evaluate the model
-y_pred = model.predict(X_test)
-mse = mean_squared_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
-
-print("Model Performance:")
-print(f"Mean Squared Error: {mse:.2f}")
-print(f"R² Score: {r2:.2f}")
-
-# Save the model and encoders
-with open('model.pkl', 'wb') as f:
-    joblib.dump(model, f, protocol=4)
-with open('encoders.pkl', 'wb') as f:
-    joblib.dump(encoders, f, protocol=4)
-
-print("\n✅ Model and encoders saved successfully.")
+"""Train the demand forecasting model.
+
+    python train_model.py                             # full retrain, single core
+    python train_model.py --n-jobs -1                 # full retrain on all cores
+    python train_model.py --warm-start --add-trees 50 # add trees for new rows only
+    python train_model.py --search --budget 300       # time-boxed hyperparameter search
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import mean_squared_error, r2_score
+import joblib
+from compact_forest import COMPACT_MODEL, CompactForest, export_forest
+from features import MODEL_FEATURES, build_feature_table
+from storage import read_sales
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODEL_FILE = 'model.pkl'
+ENCODERS_FILE = 'encoders.pkl'
+
+DEFAULT_PARAMS = {
+    'n_estimators': 200,
+    'max_depth': 15,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+}
+
+# Candidates tried by --search, in order, until the time budget runs out
+SEARCH_SPACE = [
+    DEFAULT_PARAMS,
+    dict(DEFAULT_PARAMS, n_estimators=100),
+    dict(DEFAULT_PARAMS, max_depth=8),
+    dict(DEFAULT_PARAMS, max_depth=10, min_samples_leaf=5),
+    dict(DEFAULT_PARAMS, max_depth=None, min_samples_leaf=4),
+    dict(DEFAULT_PARAMS, n_estimators=300, max_depth=12),
+    dict(DEFAULT_PARAMS, min_samples_leaf=10),
+    dict(DEFAULT_PARAMS, max_features=0.5),
+    dict(DEFAULT_PARAMS, max_features=0.5, max_depth=10),
+    dict(DEFAULT_PARAMS, n_estimators=100, max_depth=6, min_samples_leaf=10),
+]
+
+
+def load_data():
+    # Load the dataset and its date and rolling-average features. The feature
+    # table is persisted, so only rows appended since the last run are computed.
+    raw = read_sales(os.getenv('SALES_DATA', 'data.csv'))
+    df = build_feature_table(raw).copy()
+
+    # Clean Composition column
+    df['Composition'] = df['Composition'].str.replace('100% ', '')
+
+    # Encode categorical columns
+    label_cols = ['Agent', 'Customer', 'Quality', 'Weave', 'Composition', 'Season']
+    encoders = {}
+    for col in label_cols:
+        le = LabelEncoder()
+        df[col] = le.fit_transform(df[col])
+        encoders[col] = le
+
+    # Split the data chronologically
+    X = df[MODEL_FEATURES]
+    y = df['Quantity']
+    train_size = int(len(df) * 0.8)
+    return X[:train_size], X[train_size:], y[:train_size], y[train_size:], encoders
+
+
+def peak_memory_mb(children=False):
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss / 1024  # KB on Linux
+
+
+def fit_and_score(params, X_train, y_train, X_test, y_test, n_jobs=None):
+    start = time.perf_counter()
+    model = RandomForestRegressor(**params, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    stats = {
+        'seconds': time.perf_counter() - start,
+        'memory_mb': peak_memory_mb(),
+        'mse': mean_squared_error(y_test, y_pred),
+        'r2': r2_score(y_test, y_pred),
+    }
+    return model, stats
+
+
+# Training data of a --search pool worker, sent once when the worker starts
+_search_data = None
+
+
+def init_search_worker(*data):
+    global _search_data
+    _search_data = data
+
+
+def search_candidate(params):
+    # Runs in a pool worker; only the scores travel back
+    return params, fit_and_score(params, *_search_data)[1]
+
+
+def print_run(label, stats):
+    memory = f"{stats['memory_mb']:.0f} MB" if stats['memory_mb'] is not None else 'n/a'
+    print(f"{label}: {stats['seconds']:.2f} s wall-clock, peak memory {memory}, "
+          f"MSE {stats['mse']:.2f}, R² {stats['r2']:.2f}")
+
+
+def save(model, encoders, trained_rows, X_check):
+    # Remember how much of the data the forest has seen, for --warm-start
+    model.trained_rows_ = trained_rows
+    with open(MODEL_FILE, 'wb') as f:
+        joblib.dump(model, f, protocol=4)
+    with open(ENCODERS_FILE, 'wb') as f:
+        joblib.dump(encoders, f, protocol=4)
+
+    # Compact copy the app loads at serving time; must predict like the original
+    export_forest(model, encoders, COMPACT_MODEL)
+    diff = abs(CompactForest(COMPACT_MODEL).predict(X_check) - model.predict(X_check)).max()
+    print(f"Exported {COMPACT_MODEL}; max prediction difference vs. model.pkl: {diff:.2e}")
+    if diff > 1e-4:
+        raise RuntimeError(f"{COMPACT_MODEL} does not reproduce model.pkl predictions")
+    print("\n✅ Model and encoders saved successfully.")
+
+
+def train(args):
+    X_train, X_test, y_train, y_test, encoders = load_data()
+    model, stats = fit_and_score(DEFAULT_PARAMS, X_train, y_train, X_test, y_test, n_jobs=args.n_jobs)
+    print_run(f"Full training ({len(X_train)} rows, n_jobs={args.n_jobs})", stats)
+    save(model, encoders, len(X_train), X_test)
+
+
+def warm_start(args):
+    X_train, X_test, y_train, y_test, encoders = load_data()
+    if not os.path.exists(MODEL_FILE) or not os.path.exists(ENCODERS_FILE):
+        print("⚠️ No saved model to extend; run a full training first.")
+        return
+    model = joblib.load(MODEL_FILE)
+    saved_encoders = joblib.load(ENCODERS_FILE)
+    trained_rows = getattr(model, 'trained_rows_', None)
+    if list(getattr(model, 'feature_names_in_', [])) != MODEL_FEATURES or trained_rows is None:
+        print("⚠️ The saved model was not produced by this script; run a full training first.")
+        return
+    # New categories shift the label codes the existing trees were built on
+    for col, le in encoders.items():
+        if list(le.classes_) != list(saved_encoders[col].classes_):
+            print(f"⚠️ New {col} values since the last training; run a full training instead.")
+            return
+    if trained_rows >= len(X_train):
+        print("No new rows since the last training; nothing to do.")
+        return
+
+    start = time.perf_counter()
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + args.add_trees, n_jobs=args.n_jobs)
+    # The extra trees only see the rows appended since the last run
+    model.fit(X_train[trained_rows:], y_train[trained_rows:])
+    y_pred = model.predict(X_test)
+    stats = {
+        'seconds': time.perf_counter() - start,
+        'memory_mb': peak_memory_mb(),
+        'mse': mean_squared_error(y_test, y_pred),
+        'r2': r2_score(y_test, y_pred),
+    }
+    print_run(f"Warm start (+{args.add_trees} trees on {len(X_train) - trained_rows} new rows, "
+              f"{model.n_estimators} trees total)", stats)
+    save(model, encoders, len(X_train), X_test)
+
+
+def search(args):
+    X_train, X_test, y_train, y_test, encoders = load_data()
+    deadline = time.perf_counter() + args.budget
+    results = []
+    pool = multiprocessing.Pool(args.workers, initializer=init_search_worker,
+                                initargs=(X_train, y_train, X_test, y_test))
+    try:
+        scores = pool.imap_unordered(search_candidate, SEARCH_SPACE)
+        for _ in SEARCH_SPACE:
+            try:
+                params, stats = scores.next(timeout=max(0, deadline - time.perf_counter()))
+            except multiprocessing.TimeoutError:
+                print(f"⏱️ Budget of {args.budget:.0f}s used up after "
+                      f"{len(results)} of {len(SEARCH_SPACE)} candidates.")
+                break
+            results.append((params, stats))
+            print_run(f"Candidate {params}", stats)
+    finally:
+        # Stops any candidate still fitting when the budget ran out
+        pool.terminate()
+        pool.join()
+
+    if not results:
+        print("No candidate finished within the budget.")
+        return
+    best_params, best_stats = min(results, key=lambda r: r[1]['mse'])
+    print(f"\n🏆 Best of {len(results)} candidates: {best_params}")
+    print_run("Best candidate", best_stats)
+    workers_memory = peak_memory_mb(children=True)
+    if workers_memory is not None:
+        print(f"Peak memory of the largest pool worker: {workers_memory:.0f} MB")
+    if args.save:
+        model, stats = fit_and_score(best_params, X_train, y_train, X_test, y_test, n_jobs=args.n_jobs)
+        print_run("Retrained best candidate", stats)
+        save(model, encoders, len(X_train), X_test)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--warm-start', action='store_true',
+                      help='add trees fitted on rows appended since the last training')
+    mode.add_argument('--search', action='store_true',
+                      help='evaluate candidate hyperparameters in a process pool')
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help='cores used to fit the forest (-1 = all); default single core')
+    parser.add_argument('--add-trees', type=int, default=50, help='trees added by --warm-start')
+    parser.add_argument('--budget', type=float, default=300, help='seconds allowed for --search')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes used by --search')
+    parser.add_argument('--save', action='store_true',
+                        help='with --search, retrain and save the best candidate')
+    args = parser.parse_args()
+
+    if args.search:
+        search(args)
+    elif args.warm_start:
+        warm_start(args)
+    else:
+        train(args)
+
+
+if __name__ == '__main__':
+    main()
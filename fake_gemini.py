@@ -0,0 +1,119 @@
+"""Local stand-in for the Gemini generateContent and streamGenerateContent endpoints.
+
+    python fake_gemini.py --port 8765 --latency 0.3
+    python fake_gemini.py --error-rate 0.1     # 10% of calls answer 503 or 429
+    python fake_gemini.py --token-delay 0.05   # 50 ms per generated word
+    GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta python app.py
+
+Replies echo the end of the prompt after a fixed delay, so the apps and
+benchmark.py can be exercised without an API key or network access.
+With --token-delay each word of the reply takes that long to "generate":
+streamed replies send it word by word as server-sent events, while plain
+replies arrive once every word is done. The
+server counts requests and TCP connections, which shows whether clients
+reuse keep-alive connections.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Small SSE writes would otherwise wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests += 1
+        streaming = ':streamGenerateContent' in self.path
+        if not streaming and ':generateContent' not in self.path:
+            return self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+        try:
+            prompt = json.loads(body)['contents'][-1]['parts'][0]['text']
+        except (ValueError, KeyError, IndexError, TypeError):
+            return self.send_json(400, {'error': {'code': 400, 'message': 'Invalid request'}})
+        time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            status = random.choice([429, 503])
+            return self.send_json(status, {'error': {'code': status, 'message': 'Try again later'}})
+        words = f"(fake) You said: {prompt.strip()[-80:]}".split(' ')
+        if streaming:
+            return self.send_stream(words)
+        time.sleep(self.server.token_delay * len(words))
+        self.send_json(200, {
+            'candidates': [{'content': {'parts': [{'text': ' '.join(words)}], 'role': 'model'},
+                            'finishReason': 'STOP'}],
+        })
+
+    def send_stream(self, words):
+        # One SSE event per word, sent with chunked transfer encoding
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.server.token_delay)
+            text = word if i == 0 else f' {word}'
+            event = {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]}
+            if i == len(words) - 1:
+                event['candidates'][0]['finishReason'] = 'STOP'
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+def start(port=0, latency=0.3, error_rate=0.0, token_delay=0.0):
+    """Serve in a background thread; returns the server (its port is server.server_port)"""
+    server = FakeGeminiServer(('127.0.0.1', port), FakeGeminiHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.token_delay = token_delay
+    server.requests = 0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds before each reply')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered 429/503')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='seconds per generated word')
+    args = parser.parse_args()
+    server = start(args.port, args.latency, args.error_rate, args.token_delay)
+    print(f"Fake Gemini listening on http://127.0.0.1:{server.server_port}/v1beta")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
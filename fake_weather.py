@@ -0,0 +1,94 @@
+"""Local stand-in for the weatherapi.com current.json endpoint.
+
+    python fake_weather.py --port 8766 --latency 0.2
+    python fake_weather.py --error-rate 0.2     # 20% of calls answer 503
+    WEATHER_BASE_URL=http://127.0.0.1:8766/v1 python "food suggestion.py"
+
+Each location gets a steady temperature derived from its name, so
+repeated readings agree. The server counts requests per location, which
+shows whether a client coalesces and caches its calls.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONDITIONS = ["Sunny", "Partly cloudy", "Overcast", "Light rain", "Clear", "Mist"]
+
+
+class FakeWeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/v1/current.json':
+            return self.send_json(404, {'error': {'code': 1005, 'message': 'API URL is invalid.'}})
+        location = parse_qs(url.query).get('q', [''])[0]
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.locations[location.casefold()] += 1
+        if not location:
+            return self.send_json(400, {'error': {'code': 1003, 'message': 'Parameter q is missing.'}})
+        time.sleep(self.server.latency)
+        if self.server.failing or random.random() < self.server.error_rate:
+            return self.send_json(503, {'error': {'code': 9999, 'message': 'Internal application error.'}})
+        seed = zlib.crc32(location.casefold().encode('utf-8'))
+        self.send_json(200, {
+            'location': {'name': location},
+            'current': {'temp_c': round(12 + seed % 300 / 10, 1), 'condition': {'text': CONDITIONS[seed % len(CONDITIONS)]}},
+        })
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeWeatherServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start(port=0, latency=0.2, error_rate=0.0):
+    """Serve in a background thread; returns the server (its port is server.server_port).
+
+    Set server.failing = True to answer every call with a 503.
+    """
+    server = FakeWeatherServer(('127.0.0.1', port), FakeWeatherHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.failing = False
+    server.requests = 0
+    server.locations = Counter()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before each reply')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered 503')
+    args = parser.parse_args()
+    server = start(args.port, args.latency, args.error_rate)
+    print(f"Fake weather API listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
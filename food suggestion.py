@@ -1,13 +1,15 @@
-import csv
-import os
+import atexit
 import random
-import requests
 import datetime
-import time
-import schedule
+import sys
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from plyer import notification
 from twilio.rest import Client
+from delivery import DeliveryEngine, Recipient
+from suggestion_history import SuggestionHistory
+from timer_scheduler import TimerScheduler
+from weather_cache import WeatherCache
 
 # === API Keys and Configuration ===
 WEATHER_API_KEY = "dffaccbef5bb4312a1950640252404"
@@ -99,18 +101,13 @@ FOOD_DATABASE = {
 
 
 # === Helper Functions ===
+# Readings are shared per city for a few minutes, see weather_cache.py
+weather_cache = WeatherCache(WEATHER_API_KEY)
+
 def get_current_temperature(location):
-    try:
-        url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API_KEY}&q={location}"
-        response = requests.get(url)
-        data = response.json()
-        temperature = data["current"]["temp_c"]
-        condition = data["current"]["condition"]["text"]
-        print(f"\n📊 Current Weather in {location}: {condition} at {temperature}°C")
-        return temperature, condition
-    except Exception as e:
-        print(f"⚠️ Weather API error: {e}")
-        return 25, "Unknown"  # Default fallback
+    temperature, condition = weather_cache.current(location)
+    print(f"\n📊 Current Weather in {location}: {condition} at {temperature}°C")
+    return temperature, condition
 
 def get_temperature_category(temp):
     if temp >= 35:
@@ -127,47 +124,15 @@ def get_time_period(hour):
             return period
     return "morning"  # Default fallback
 
-def read_csv():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, newline='', encoding='utf-8') as file:
-        return list(csv.reader(file))[1:]  # Skip header
+# Suggestions are appended to DATA_FILE and indexed per user in an SQLite file beside it
+history = SuggestionHistory(DATA_FILE, time_period_of=get_time_period)
 
 def save_to_csv(data_row):
-    file_exists = os.path.isfile(DATA_FILE)
-    with open(DATA_FILE, mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow([
-                "Name", "Phone", "Location", "Weather", "Temperature",
-                "Category", "Suggested Food", "Timestamp", "TimePeriod"  # Added TimePeriod
-            ])
-        writer.writerow(data_row)
+    history.add(data_row)
 
 def get_recent_suggestions(name, phone, days=1, time_period=None):
     """Get suggestions made to this user in the last specified days, optionally filtered by time period"""
-    dataset = read_csv()
-    now = datetime.datetime.now()
-    
-    recent_suggestions = []
-    
-    for row in dataset:
-        if row[0] == name and row[1] == phone:
-            try:
-                # Parse the timestamp
-                suggestion_time = datetime.datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
-                
-                # Get the time period for this suggestion
-                row_time_period = row[8] if len(row) > 8 else get_time_period(suggestion_time.hour)
-                
-                # Check if it's within the specified days and matches time period (if specified)
-                days_diff = (now - suggestion_time).days
-                if days_diff <= days and (time_period is None or row_time_period == time_period):
-                    recent_suggestions.append(row[6])  # Add food suggestion
-            except Exception:
-                pass  # Skip invalid timestamps
-                
-    return recent_suggestions
+    return history.recent_foods(name, phone, days=days, time_period=time_period)
 
 def get_unique_suggestion(category, time_period, previous_foods, food_type=None):
     # Get time-specific food options
@@ -202,14 +167,23 @@ def show_popup_notification(title, message):
     except Exception as e:
         print(f"⚠️ Notification error: {e}")
 
+# One Twilio client (and its HTTP connection pool) for every message
+twilio_client = None
+
+def deliver_sms(to_phone, message):
+    """Send one SMS, raising if Twilio does not accept it"""
+    global twilio_client
+    if twilio_client is None:
+        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    twilio_client.messages.create(
+        body=message,
+        from_=TWILIO_FROM,
+        to=to_phone
+    )
+
 def send_sms_notification(to_phone, message):
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        client.messages.create(
-            body=message,
-            from_=TWILIO_FROM,
-            to=to_phone
-        )
+        deliver_sms(to_phone, message)
         print(f"📲 SMS sent to {to_phone}")
     except Exception as e:
         print(f"⚠️ Failed to send SMS: {e}")
@@ -218,42 +192,63 @@ def format_time_for_message(time_string):
     dt = datetime.datetime.strptime(time_string, "%Y-%m-%d %H:%M:%S")
     return dt.strftime("%I:%M %p on %b %d, %Y")
 
-# === Automated Suggestion Function ===
-def send_auto_suggestion(name, phone, location, scheduled_time, food_type=None):
+# === Automated Suggestion Functions ===
+def compose_suggestion(recipient, weather, time_period, recent_suggestions, now):
+    """The history row and SMS text for one scheduled recipient"""
+    temperature, condition = weather
+    category = get_temperature_category(temperature)
+    
+    # Get unique suggestion for this time period, avoiding recent ones
+    suggestion = get_unique_suggestion(category, time_period, recent_suggestions, recipient.food_type)
+    
+    current_time = now.strftime("%Y-%m-%d %H:%M:%S")
+    formatted_time = format_time_for_message(current_time)
+    
+    # Create message with time period-specific greeting
+    greeting = "Good morning" if time_period == "morning" else "Good afternoon" if time_period == "afternoon" else "Good evening"
+    sms_message = f"🍽️ {greeting}, {recipient.name}! Here's your {time_period} food suggestion for {temperature}°C in {recipient.location}: {suggestion[0]} (sent at {formatted_time})"
+    row = [recipient.name, recipient.phone, recipient.location, condition, temperature, category,
+           suggestion[0], current_time, time_period]
+    return row, sms_message
+
+# Scheduled suggestions go out a whole time slot at a time (see delivery.py)
+delivery = DeliveryEngine(get_current_temperature, compose_suggestion, deliver_sms, history, get_time_period)
+
+def deliver_slot(scheduled_time, recipients):
+    """Send the suggestions of everyone scheduled at this HH:MM"""
     try:
-        print(f"\n🔄 Sending automated suggestion to {name} at {phone} (scheduled for {scheduled_time})")
-        
-        # Get current time information
-        now = datetime.datetime.now()
-        current_hour = now.hour
-        time_period = get_time_period(current_hour)
-        
-        temperature, weather = get_current_temperature(location)
-        category = get_temperature_category(temperature)
-        
-        # Get recent suggestions for this specific time period to avoid repeating
-        recent_suggestions = get_recent_suggestions(name, phone, days=1, time_period=time_period)
-        print(f"🚫 Avoiding recent suggestions for {time_period}: {recent_suggestions}")
-        
-        # Get unique suggestion for this time period
-        suggestion = get_unique_suggestion(category, time_period, recent_suggestions, food_type)
-        
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_time = format_time_for_message(current_time)
-        
-        # Save data with timestamp and time period
-        save_to_csv([name, phone, location, weather, temperature, category, suggestion[0], current_time, time_period])
-        
-        # Create message with time period-specific greeting
-        greeting = "Good morning" if time_period == "morning" else "Good afternoon" if time_period == "afternoon" else "Good evening"
-        sms_message = f"🍽️ {greeting}, {name}! Here's your {time_period} food suggestion for {temperature}°C in {location}: {suggestion[0]} (sent at {formatted_time})"
-        send_sms_notification(phone, sms_message)
-        
-        print(f"✅ Automated {time_period} suggestion sent to {name}: {suggestion[0]}")
-        return True
+        print(f"\n🔄 Sending automated suggestions for {scheduled_time}")
+        report = delivery.deliver_to(recipients, scheduled_time)
+        print(f"✅ Automated suggestions {report}")
     except Exception as e:
-        print(f"⚠️ Auto-suggestion error for {name}: {e}")
-        return False
+        print(f"⚠️ Delivery error for {scheduled_time}: {e}")
+
+# Slots are delivered off the scheduler thread, so a long one does not hold up the next minute's;
+# a few at once at most, as they share the delivery workers and the SMS rate limit
+slot_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="slot")
+
+def deliver_due(jobs):
+    """Scheduler callback: the jobs due now, delivered a time slot at a time"""
+    slots = {}
+    for job in jobs:
+        slots.setdefault(job.at, []).append(Recipient(**job.payload))
+    for scheduled_time, recipients in slots.items():
+        slot_pool.submit(deliver_slot, scheduled_time, recipients)
+
+# One daily job per user and time (see timer_scheduler.py). Only the schedule snapshot in the
+# history database is kept on disk; startup() rebuilds the jobs from it, so the two cannot disagree
+scheduler = TimerScheduler(deliver_due)
+
+def suggestion_job(name, phone, location, scheduled_time, food_type=None):
+    """(job_id, time, payload, first run) for the scheduler, tagged as before"""
+    return (f"{name}_{phone}_{scheduled_time}", scheduled_time,
+            {"name": name, "phone": phone, "location": location, "food_type": food_type}, None)
+
+def send_auto_suggestion(name, phone, location, scheduled_time, food_type=None):
+    """Send one user their scheduled suggestion right away"""
+    report = delivery.deliver_to([Recipient(name, phone, location, food_type)], scheduled_time)
+    print(f"✅ Automated suggestion for {name}: {report}")
+    return report.sent == 1
 
 # === Schedule Next Day Suggestions ===
 def schedule_next_day_suggestion(name, phone, location, time_str, food_type=None):
@@ -263,13 +258,13 @@ def schedule_next_day_suggestion(name, phone, location, time_str, food_type=None
         scheduled_time = dt.strftime("%H:%M")
         time_period = get_time_period(dt.hour)
         
-        # Schedule task for same time tomorrow
-        job_id = f"{name}_{phone}_{scheduled_time}"
+        # One time per user and period, saved in the snapshot; a new time replaces the old one's job
+        previous_time = history.save_schedule(name, phone, time_period, scheduled_time, location, food_type)
+        if previous_time and previous_time != scheduled_time:
+            scheduler.cancel(f"{name}_{phone}_{previous_time}")
         
-        # Create a unique job for this user at this time
-        schedule.every().day.at(scheduled_time).do(
-            send_auto_suggestion, name, phone, location, scheduled_time, food_type
-        ).tag(job_id)
+        # Schedule task for same time tomorrow; a job with the same id is replaced
+        scheduler.add(*suggestion_job(name, phone, location, scheduled_time, food_type))
         
         print(f"🔔 Scheduled {time_period} suggestion for {name} tomorrow at {scheduled_time}")
         return True
@@ -277,12 +272,6 @@ def schedule_next_day_suggestion(name, phone, location, time_str, food_type=None
         print(f"⚠️ Scheduling error: {e}")
         return False
 
-# === Run the scheduler in background ===
-def run_scheduler():
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
-
 # === Main Interactive Function ===
 def interactive_food_suggester():
     try:
@@ -301,8 +290,7 @@ def interactive_food_suggester():
         # Get recent suggestions for this specific time period
         recent_suggestions = get_recent_suggestions(name, number, days=1, time_period=time_period)
         
-        dataset = read_csv()
-        user_exists = any(row[0] == name and row[1] == number for row in dataset)
+        user_exists = history.has_user(name, number)
         
         # If new user, ask preference
         food_type = None
@@ -365,99 +353,19 @@ def schedule_all_time_periods(name, phone, location, food_type=None):
 # === Find user's previous time periods ===
 def get_user_time_periods(name, phone):
     """Find all unique time periods a user has received suggestions in"""
-    dataset = read_csv()
-    time_periods = set()
-    
-    for row in dataset:
-        if row[0] == name and row[1] == phone:
-            try:
-                # Get timestamp and determine time period
-                if len(row) > 8 and row[8]:  # If time period is stored
-                    time_periods.add(row[8])
-                else:  # Calculate from timestamp
-                    suggestion_time = datetime.datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
-                    time_periods.add(get_time_period(suggestion_time.hour))
-            except Exception:
-                pass
-    
-    return time_periods
+    return history.time_periods(name, phone)
 
 # === Main startup function === 
 def startup():
     try:
-        # Start the scheduler in a background thread
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
-        
-        # Load existing users and schedule their suggestions
-        dataset = read_csv()
-        users_processed = set()
-        user_schedules = {}  # Track all timestamps for each user
-        
-        # First, collect all timestamps by user
-        for row in dataset:
-            try:
-                name, phone = row[0], row[1]
-                user_key = (name, phone)
-                
-                if user_key not in user_schedules:
-                    user_schedules[user_key] = []
-                
-                # Add this timestamp to the user
-                if len(row) >= 8:  # Make sure timestamp exists
-                    try:
-                        timestamp = row[7]
-                        # Extract time only
-                        dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                        time_only = dt.strftime("%H:%M")
-                        
-                        # Store time with other info
-                        user_schedules[user_key].append({
-                            'time': time_only,
-                            'location': row[2],
-                            'time_period': row[8] if len(row) > 8 else get_time_period(dt.hour)
-                        })
-                    except Exception:
-                        pass
-            except Exception as e:
-                print(f"⚠️ Error processing row: {e}")
+        # Everyone's time per period from the schedule snapshot, in one read
+        schedules = history.schedules()
+        scheduler.add_many(suggestion_job(name, phone, location, scheduled_time, food_type)
+                           for name, phone, time_period, scheduled_time, location, food_type in schedules)
+        users_processed = {(name, phone) for name, phone, *_ in schedules}
         
-        # Now schedule each user with their unique times from each time period
-        for user_key, timestamps in user_schedules.items():
-            try:
-                name, phone = user_key
-                
-                # Group by time period
-                period_times = {"morning": [], "afternoon": [], "evening": []}
-                
-                for entry in timestamps:
-                    period_times[entry['time_period']].append(entry)
-                
-                # For each time period, schedule the most recent time
-                location = None  # Will be set from the data
-                
-                for period, entries in period_times.items():
-                    if entries:
-                        # Use the most recent entry for this period
-                        entry = entries[-1]  # Assuming the data is in chronological order
-                        location = entry['location']
-                        
-                        # Create a timestamp for scheduling
-                        now = datetime.datetime.now()
-                        hour, minute = map(int, entry['time'].split(':'))
-                        schedule_dt = now.replace(hour=hour, minute=minute)
-                        timestamp = schedule_dt.strftime("%Y-%m-%d %H:%M:%S")
-                        
-                        # Schedule this specific time
-                        food_type = None  # Could be extracted from history if needed
-                        schedule_next_day_suggestion(name, phone, location, timestamp, food_type)
-                        
-                        print(f"📆 Scheduled {period} suggestion for {name} at {entry['time']}")
-                
-                users_processed.add(user_key)
-                
-            except Exception as e:
-                print(f"⚠️ Error scheduling user {user_key}: {e}")
+        # Start the scheduler in a background thread
+        scheduler.start()
         
         print(f"✅ Scheduled {len(users_processed)} users with time-specific suggestions")
         print("\n🌟 Food Suggester is running with time-based scheduling.")
@@ -466,19 +374,27 @@ def startup():
     except Exception as e:
         print(f"⚠️ Startup error: {e}")
 
+def shutdown():
+    """Stop firing jobs, let the slots already started finish, then close the history"""
+    scheduler.stop()
+    slot_pool.shutdown(wait=True)
+    delivery.close()
+    history.close()
+
+# Only when the process exits: the scheduler keeps running between interactive sessions
+atexit.register(shutdown)
+
 # === Main Block ===
 if __name__ == "__main__":
-    # Install required packages if not present
-    try:
-        import schedule
-    except ImportError:
-        print("Installing required packages...")
-        import subprocess
-        subprocess.check_call(["pip", "install", "schedule", "plyer", "twilio", "requests"])
-        import schedule
-    
     # Start the application with automatic scheduling
     startup()
     
     # Run the interactive mode once at startup
     interactive_food_suggester()
+    
+    # Keep sending the scheduled suggestions until Ctrl-C (python -i returns to the prompt instead)
+    if not sys.flags.interactive:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            print("\n👋 Food Suggester stopped")
@@ -0,0 +1,418 @@
+"""Shared Gemini client for the food chat API and the dress shop assistant.
+
+Responses are cached by content: the key is a SHA-256 of the model, the
+normalized prompt and the generation config, so an identical question
+is answered without another round trip. The cache keeps recent entries
+in memory (LRU with a TTL) and can also write them to a directory, so
+they survive a restart.
+
+Environment:
+    GEMINI_BASE_URL   API root; point it at fake_gemini.py for local tests
+    GEMINI_TIMEOUT    overall seconds per call, retries included (default 30)
+    GEMINI_MAX_CONCURRENCY  calls in flight at once per process, open streams included (default 16)
+    GEMINI_RETRIES    retries after a 429/5xx or connection error (default 3)
+    LLM_CACHE_SIZE    entries kept in memory (default 1024, 0 disables caching)
+    LLM_CACHE_TTL     seconds a cached response stays valid (default 3600)
+    LLM_CACHE_DIR     enables the on-disk tier in this directory
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = 'https://generativelanguage.googleapis.com/v1beta'
+DEFAULT_MODEL = 'gemini-2.0-flash'
+
+# Latency samples kept per source for the percentiles in stats()
+LATENCY_SAMPLES = 1000
+
+# Seconds allowed to open a connection; the rest of the deadline is for the reply
+CONNECT_TIMEOUT = 3.05
+
+# Answers worth retrying, and the jittered backoff between attempts (seconds)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BASE_BACKOFF = 0.25
+MAX_BACKOFF = 4
+
+
+class GeminiError(Exception):
+    """Gemini answered with a non-200 status or a body without text"""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def normalize_prompt(prompt):
+    # Differences in Unicode form and trailing whitespace should not miss the cache
+    prompt = unicodedata.normalize('NFC', prompt)
+    return '\n'.join(line.rstrip() for line in prompt.strip().splitlines())
+
+
+def cache_key(model, prompt, generation_config=None, system_instruction=None):
+    fields = {
+        'model': model,
+        'prompt': normalize_prompt(prompt),
+        'config': generation_config or {},
+    }
+    if system_instruction:
+        # Only when set, so keys of inline-persona prompts stay the same
+        fields['system'] = normalize_prompt(system_instruction)
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """In-memory LRU of response texts with a TTL, plus an optional disk tier.
+
+    Disk entries are JSON files named by their key, written atomically, so
+    several processes can share the directory.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (stored_at, text)
+        self._lock = threading.Lock()
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_entries=int(os.getenv('LLM_CACHE_SIZE', 1024)),
+                   ttl=float(os.getenv('LLM_CACHE_TTL', 3600)),
+                   disk_path=os.getenv('LLM_CACHE_DIR') or None)
+
+    def _disk_file(self, key):
+        return os.path.join(self.disk_path, key[:2], f'{key}.json')
+
+    def get(self, key):
+        """(text, tier) for a fresh entry, tier being 'memory' or 'disk'; (None, None) on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry[1], 'memory'
+                del self._entries[key]
+        if self.disk_path:
+            try:
+                with open(self._disk_file(key), encoding='utf-8') as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                return None, None
+            if now - stored['stored_at'] <= self.ttl:
+                self._remember(key, stored['stored_at'], stored['text'])
+                return stored['text'], 'disk'
+        return None, None
+
+    def put(self, key, text):
+        stored_at = time.time()
+        self._remember(key, stored_at, text)
+        if self.disk_path:
+            path = self._disk_file(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'stored_at': stored_at, 'text': text}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+
+    def _remember(self, key, stored_at, text):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (stored_at, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LLMStats:
+    """Request counters and recent latencies per source (memory, disk, api, error),
+    plus counts of client events (retries, timeouts, calls rejected by the breaker)
+    and the time to first token of streamed calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'memory': 0, 'disk': 0, 'api': 0, 'error': 0}
+        self.events = {'retries': 0, 'timeouts': 0, 'rejected': 0}
+        self._latencies = {source: deque(maxlen=LATENCY_SAMPLES) for source in self.counts}
+        self._latencies['first_token'] = deque(maxlen=LATENCY_SAMPLES)
+
+    def count(self, event):
+        with self._lock:
+            self.events[event] += 1
+
+    def record(self, source, seconds):
+        with self._lock:
+            self.counts[source] += 1
+            self._latencies[source].append(seconds)
+
+    def record_first_token(self, seconds):
+        # Time from a streamed call starting to its first text chunk
+        with self._lock:
+            self._latencies['first_token'].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+            events = dict(self.events)
+            latencies = {source: sorted(samples) for source, samples in self._latencies.items()}
+        hits = counts['memory'] + counts['disk']
+        lookups = hits + counts['api']
+        result = {
+            'requests': lookups + counts['error'],
+            'hits': hits,
+            'misses': counts['api'],
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+            'by_source': counts,
+            'events': events,
+            'latency_ms': {},
+        }
+        for source, samples in latencies.items():
+            if samples:
+                result['latency_ms'][source] = {
+                    'p50': round(samples[len(samples) // 2] * 1000, 2),
+                    'p99': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 2),
+                    'max': round(samples[-1] * 1000, 2),
+                }
+        return result
+
+
+class CircuitBreaker:
+    """Stops calling Gemini for a while after repeated failures.
+
+    After `threshold` consecutive failures the circuit opens and calls are
+    rejected immediately for `reset_after` seconds. Then a single trial
+    call is let through: success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self._opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class GeminiClient:
+    """generateContent calls answered from the ResponseCache when possible.
+
+    Calls that do go out share one pooled keep-alive session. Each call
+    has an overall deadline, at most `max_concurrency` run at once, 429
+    and 5xx answers are retried with jittered exponential backoff, and a
+    CircuitBreaker fails fast while Gemini keeps failing.
+    """
+
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, base_url=None, cache=None,
+                 timeout=None, max_concurrency=None, retries=None, breaker=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = (base_url or os.getenv('GEMINI_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.stats = LLMStats()
+        self.timeout = timeout or float(os.getenv('GEMINI_TIMEOUT', 30))
+        self.max_concurrency = max_concurrency or int(os.getenv('GEMINI_MAX_CONCURRENCY', 16))
+        self.retries = retries if retries is not None else int(os.getenv('GEMINI_RETRIES', 3))
+        self.breaker = breaker or CircuitBreaker()
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, method='generateContent'):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def payload(self, prompt, generation_config=None, system_instruction=None):
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if system_instruction:
+            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    def generate(self, prompt, generation_config=None, api_key=None, system_instruction=None):
+        """Reply text for the prompt; raises GeminiError if Gemini does not give one"""
+        start = time.perf_counter()
+        key = cache_key(self.model, prompt, generation_config, system_instruction)
+        text, tier = self.cache.get(key)
+        if text is not None:
+            self.stats.record(tier, time.perf_counter() - start)
+            return text
+
+        payload = self.payload(prompt, generation_config, system_instruction)
+        try:
+            response = self._post('generateContent', payload, api_key)
+            try:
+                text = response.json()['candidates'][0]['content']['parts'][0]['text']
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise GeminiError(response.status_code, 'No text in the Gemini response')
+        except Exception:
+            self.stats.record('error', time.perf_counter() - start)
+            raise
+        self.cache.put(key, text)
+        self.stats.record('api', time.perf_counter() - start)
+        return text
+
+    def stream(self, prompt, generation_config=None, api_key=None, system_instruction=None):
+        """Yield the reply text in chunks as Gemini generates it.
+
+        Uses streamGenerateContent with server-sent events. A cached reply
+        is yielded as a single chunk, and a completed stream is cached
+        like a generate() reply. Raises GeminiError, possibly after some
+        chunks were already yielded.
+        """
+        start = time.perf_counter()
+        key = cache_key(self.model, prompt, generation_config, system_instruction)
+        text, tier = self.cache.get(key)
+        if text is not None:
+            self.stats.record(tier, time.perf_counter() - start)
+            self.stats.record_first_token(time.perf_counter() - start)
+            yield text
+            return
+
+        payload = self.payload(prompt, generation_config, system_instruction)
+        chunks = []
+        try:
+            response = self._post('streamGenerateContent', payload, api_key, stream=True)
+            try:
+                with response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith('data:'):
+                            continue
+                        try:
+                            event = json.loads(line[len('data:'):])
+                            parts = event['candidates'][0]['content']['parts']
+                        except (ValueError, KeyError, IndexError, TypeError):
+                            continue
+                        chunk = ''.join(part.get('text', '') for part in parts)
+                        if chunk:
+                            if not chunks:
+                                self.stats.record_first_token(time.perf_counter() - start)
+                            chunks.append(chunk)
+                            yield chunk
+            finally:
+                # _post leaves the slot held while the body streams; freed once it is read or the generator is closed
+                self.semaphore.release()
+            if not chunks:
+                raise GeminiError(200, 'No text in the Gemini response')
+        except requests.RequestException as e:
+            self.stats.record('error', time.perf_counter() - start)
+            raise GeminiError(502, f'Gemini stream interrupted: {e}')
+        except Exception:
+            self.stats.record('error', time.perf_counter() - start)
+            raise
+        self.cache.put(key, ''.join(chunks))
+        self.stats.record('api', time.perf_counter() - start)
+
+    def _post(self, method, payload, api_key=None, stream=False):
+        """POST with deadline, concurrency limit, retries and circuit breaker; returns a 200 response.
+
+        With stream=True the body is left unread and the concurrency slot
+        stays held; the caller releases self.semaphore once it has closed
+        the response.
+        """
+        deadline = time.monotonic() + self.timeout
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.semaphore.acquire(timeout=remaining):
+                self.stats.count('timeouts')
+                raise GeminiError(504, f'No reply from Gemini within {self.timeout:.0f}s')
+            # Checked once a slot is held, so an allowed trial call always reports back
+            if not self.breaker.allow():
+                self.semaphore.release()
+                self.stats.count('rejected')
+                raise GeminiError(503, 'Gemini is failing; not calling it for a while')
+            retry_after = None
+            held = False  # a returned stream keeps its slot
+            remaining = deadline - time.monotonic()
+            try:
+                response = self.session.post(
+                    self.url(method),
+                    params={'key': api_key or self.api_key, **({'alt': 'sse'} if stream else {})},
+                    headers={'Content-Type': 'application/json'},
+                    json=payload,
+                    stream=stream,
+                    # The read timeout bounds each wait for data by what is left of the deadline
+                    timeout=(min(CONNECT_TIMEOUT, remaining), max(0.001, remaining))
+                )
+            except requests.Timeout:
+                self.breaker.record_failure()
+                self.stats.count('timeouts')
+                raise GeminiError(504, f'No reply from Gemini within {self.timeout:.0f}s')
+            except requests.ConnectionError as e:
+                self.breaker.record_failure()
+                error = GeminiError(502, f'Could not reach Gemini: {e}')
+            except requests.RequestException as e:
+                # Anything else requests raises still has to close an allowed trial call
+                self.breaker.record_failure()
+                raise GeminiError(502, f'Gemini request failed: {e}')
+            else:
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    held = stream
+                    return response
+                error = GeminiError(response.status_code, response.text)
+                if response.status_code not in RETRY_STATUSES:
+                    # The request itself is wrong; Gemini is fine
+                    self.breaker.record_success()
+                    raise error
+                self.breaker.record_failure()
+                retry_after = response.headers.get('Retry-After')
+            finally:
+                if not held:
+                    self.semaphore.release()
+
+            # Full jitter, or the server's Retry-After, but never past the deadline
+            delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            if attempt == self.retries or time.monotonic() + delay >= deadline:
+                raise error
+            self.stats.count('retries')
+            time.sleep(delay)
+        raise error
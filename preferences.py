@@ -0,0 +1,132 @@
+"""Food preference extraction for the food chat API.
+
+add_preferences() finds the same preferences as running every pattern
+below through re.findall, but in one scan of the message:
+
+- A single compiled alternation of every pattern's literal lead-in
+  ("i'm ", "allergic to ", ...) finds the few places a preference
+  phrase can start, and only the patterns with that lead-in are tried
+  there. Each pattern resumes after its previous match, as findall
+  would.
+- Diet and cuisine keywords inside a match are found with one compiled
+  alternation per category instead of a substring test per keyword.
+- Values already stored are skipped with a set lookup.
+"""
+import re
+from operator import itemgetter
+
+DIETARY_KEYWORDS = ['vegetarian', 'vegan', 'pescatarian', 'gluten-free', 'gluten free', 'dairy-free',
+                    'dairy free', 'keto', 'paleo', 'low-carb', 'low carb', 'halal', 'kosher']
+CUISINE_KEYWORDS = ['italian', 'mexican', 'chinese', 'japanese', 'indian', 'thai', 'french', 'mediterranean',
+                    'greek', 'american', 'korean', 'vietnamese', 'middle eastern', 'spanish', 'cajun']
+
+# More natural language patterns for preference detection, in the order values are added
+PREFERENCE_PATTERNS = {
+    'allergies': [
+        r"i'm allergic to (.*?)(?:\.|$)",
+        r"i am allergic to (.*?)(?:\.|$)",
+        r"allergies? (?:are|include) (.*?)(?:\.|$)",
+        r"allergy to (.*?)(?:\.|$)",
+        r"can't eat (.*?) because of allergies",
+        r"allergic to (.*?)(?:\.|$)"
+    ],
+    'dietary_restrictions': [
+        r"i'm (.*?)(?:\.|$)",
+        r"i am (.*?)(?:\.|$)",
+        r"i follow a (.*?) diet",
+        r"i'm on a (.*?) diet",
+        r"i can't eat (.*?)(?:\.|$)"
+    ],
+    'favorite_cuisines': [
+        r"i love (.*?) food",
+        r"i like (.*?) food",
+        r"i'm a fan of (.*?) food",
+        r"i enjoy (.*?) food",
+        r"my favorite cuisine is (.*?)(?:\.|$)"
+    ],
+    'disliked_foods': [
+        r"i don't like (.*?)(?:\.|$)",
+        r"i do not like (.*?)(?:\.|$)",
+        r"i hate (.*?)(?:\.|$)",
+        r"i dislike (.*?)(?:\.|$)",
+        r"i can't stand (.*?)(?:\.|$)",
+        r"i'm not a fan of (.*?)(?:\.|$)"
+    ]
+}
+
+# Matches are only kept if they mention one of these keywords; other categories keep the
+# comma-separated values themselves
+CATEGORY_KEYWORDS = {'dietary_restrictions': DIETARY_KEYWORDS, 'favorite_cuisines': CUISINE_KEYWORDS}
+
+
+def _literal_lead_in(pattern):
+    # The fixed text every match of the pattern starts with
+    for i, char in enumerate(pattern):
+        if char in '.^$*+?{}[]\\|()':
+            # A quantifier makes the character before it optional
+            return pattern[:i - 1] if char in '*?{' else pattern[:i]
+    return pattern
+
+
+_PATTERNS = [(category, re.compile(pattern))
+             for category, patterns in PREFERENCE_PATTERNS.items() for pattern in patterns]
+_LEAD_INS = [_literal_lead_in(pattern.pattern) for _, pattern in _PATTERNS]
+
+# Longest lead-ins first, so a match is the longest one starting there; every other lead-in
+# starting at the same place is a prefix of it and is tried too
+_TRIGGER = re.compile('|'.join(re.escape(lead_in) for lead_in in sorted(set(_LEAD_INS), key=len, reverse=True)))
+_CANDIDATES = {
+    longest: [index for index, lead_in in enumerate(_LEAD_INS) if longest.startswith(lead_in)]
+    for longest in set(_LEAD_INS)
+}
+
+# Zero-width, so overlapping keywords ("gluten-free" and "gluten free") are all found
+_KEYWORD_FINDERS = {
+    category: re.compile('(?=(%s))' % '|'.join(re.escape(word) for word in words))
+    for category, words in CATEGORY_KEYWORDS.items()
+}
+_KEYWORD_ORDER = {category: {word: order for order, word in enumerate(words)}
+                  for category, words in CATEGORY_KEYWORDS.items()}
+
+
+def find_matches(text):
+    """(pattern index, start, end) of group 1 for every match re.findall would find"""
+    matches = []
+    resume_at = {}
+    trigger = _TRIGGER.search(text)
+    while trigger:
+        position = trigger.start()
+        for index in _CANDIDATES[trigger.group()]:
+            if position >= resume_at.get(index, 0):
+                match = _PATTERNS[index][1].match(text, position)
+                if match:
+                    matches.append((index, *match.span(1)))
+                    resume_at[index] = match.end()
+        # Lead-ins can overlap, so the next one may start inside this one
+        trigger = _TRIGGER.search(text, position + 1)
+    # Pattern order, then position (the sort is stable), like one findall per pattern
+    matches.sort(key=itemgetter(0))
+    return matches
+
+
+def add_preferences(preferences, text):
+    """Add the preferences mentioned in a lowercased message to the per-category lists"""
+    found = {}
+    for index, start, end in find_matches(text):
+        category = _PATTERNS[index][0]
+        values = found.setdefault(category, [])
+        if category in CATEGORY_KEYWORDS:
+            # Keywords inside this match, in keyword-list order
+            keywords = {m.group(1) for m in _KEYWORD_FINDERS[category].finditer(text, start, end)}
+            values.extend(sorted(keywords, key=_KEYWORD_ORDER[category].__getitem__))
+        else:
+            values.extend(value.strip() for value in text[start:end].split(','))
+
+    for category, values in found.items():
+        stored = preferences[category]
+        seen = set(stored)
+        for value in values:
+            if value and value not in seen:
+                seen.add(value)
+                stored.append(value)
+    return preferences
@@ -0,0 +1,126 @@
+"""Prompt assembly for the food chat API.
+
+The persona block never changes, so it is built once. Each user's
+preference paragraph is cached in their session until their preferences
+change, and their last six messages are kept as a deque of already
+rendered "Friend: ..." / "You: ..." lines. Building a prompt is then a
+single join of a few cached strings.
+
+With system_instruction=True the persona travels in Gemini's
+systemInstruction field (with its source indentation stripped) and the
+contents only carry the per-user part.
+"""
+from collections import deque
+from itertools import islice
+
+# Messages of recent conversation included in the prompt
+HISTORY_WINDOW = 6
+
+# Create context with enhanced personality guidance
+PERSONA = """You are a friendly, casual food enthusiast having a natural conversation. 
+        Respond like a real human friend who loves food - be warm, use casual language, occasional humor, and show personality.
+        
+        Important conversation guidelines:
+        - Keep your tone relaxed and conversational - like texting a good friend
+        - Use contractions (I'm, you'd, we'll)
+        - Occasionally use casual expressions, slang or filler words (like "hmm", "yeah", "honestly", "actually")
+        - Skip formal or academic language
+        - Show enthusiasm about food with expressions like "OMG that's delicious" or "I'm a huge fan of..."
+        - React to what the person says with natural responses ("Oh nice choice!" "I feel you on that")
+        - Show personality and opinions about food as if you have your own experiences
+        - Don't list too many options - recommend just 1-3 specific ideas that feel tailored
+        - Never say phrases like "as an AI" or "as a chatbot" or mention that you're a program
+        - Remember past interactions and reference them naturally
+        - Be proactive about preferences - if you notice they haven't mentioned allergies or restrictions, casually ask
+        - Show empathy and understanding about dietary restrictions and allergies
+        - Use food-related emojis occasionally to make the conversation more engaging
+        - Share personal food experiences and preferences when relevant
+        - If they mention a food you've recommended before, acknowledge that and suggest variations
+        -you want to known about user mood and tell about your owner Giridharan who is made this chatbot 
+        -you want be more funny and more engaging and more natural and more human like 
+        -your owner is big fan of ajith kumar
+        -this is the start from 2025 may 16th and your company name is HERTZWORKZ
+        """
+
+# The persona without the indentation it has in the source, for systemInstruction
+SYSTEM_PERSONA = '\n'.join(line.strip() for line in PERSONA.strip().splitlines())
+
+
+def preference_paragraph(preferences):
+    """The "Things to remember" sentence for a user's preferences ('' if they have none)"""
+    if not any(pref for pref in preferences.values() if pref):
+        return ''
+    text = "\nThings to remember about the person you're chatting with: "
+
+    if preferences['dietary_restrictions']:
+        text += f"They're {'/'.join(preferences['dietary_restrictions'])}. "
+
+    if preferences['favorite_cuisines']:
+        if len(preferences['favorite_cuisines']) == 1:
+            text += f"They love {preferences['favorite_cuisines'][0]} food. "
+        else:
+            text += f"They enjoy {', '.join(preferences['favorite_cuisines'][:-1])} and {preferences['favorite_cuisines'][-1]} food. "
+
+    if preferences['disliked_foods']:
+        text += f"They don't like {', '.join(preferences['disliked_foods'])}. "
+
+    if preferences['allergies']:
+        text += f"IMPORTANT: They're allergic to {', '.join(preferences['allergies'])}. "
+    return text
+
+
+def history_line(message):
+    speaker = 'Friend' if message['is_user'] else 'You'
+    return f"{speaker}: {message['message']}\n"
+
+
+class PromptBuilder:
+    """Builds (system_instruction, prompt) pairs from cached pieces of a session.
+
+    The caches live in the session dict under 'prompt_cache' and are not
+    persisted; they are rebuilt from the session after a reload.
+    """
+
+    def __init__(self, system_instruction=False):
+        self.system_instruction = system_instruction
+
+    def build(self, session, user_input):
+        cache = self._cache(session)
+        preferences = session['preferences']
+        # Preference lists only ever grow, and clearing replaces the dict
+        signature = (id(preferences), *map(len, preferences.values()))
+        if cache['preferences_signature'] != signature:
+            cache['preferences_signature'] = signature
+            cache['preferences_text'] = preference_paragraph(preferences)
+
+        user_part = (cache['preferences_text'] + "\nConversation so far:\n" +
+                     ''.join(cache['history_lines']) + f"\nFriend: {user_input}\nYou: ")
+        if self.system_instruction:
+            return SYSTEM_PERSONA, user_part.lstrip('\n')
+        return None, PERSONA + user_part
+
+    def add_exchange(self, session, user_input, response_text):
+        """Append a message pair to the history and to the rendered window"""
+        lines = self._cache(session)['history_lines']
+        for message in ({"message": user_input, "is_user": True},
+                        {"message": response_text, "is_user": False}):
+            session['chat_history'].append(message)
+            lines.append(history_line(message))
+
+    def clear_history(self, session):
+        session['chat_history'].clear()
+        self._cache(session)['history_lines'].clear()
+
+    @staticmethod
+    def _cache(session):
+        cache = session.get('prompt_cache')
+        if cache is None:
+            history = session['chat_history']
+            recent = islice(history, max(0, len(history) - HISTORY_WINDOW), None)
+            cache = session['prompt_cache'] = {
+                'preferences_signature': None,
+                'preferences_text': '',
+                'history_lines': deque(map(history_line, recent),
+                                       maxlen=min(HISTORY_WINDOW, history.maxlen or HISTORY_WINDOW)),
+            }
+        return cache
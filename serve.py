@@ -0,0 +1,160 @@
+"""Production server for the food chat API and the dress shop app.
+
+    python serve.py food                        # gunicorn on 0.0.0.0:5000
+    python serve.py dress --bind 0.0.0.0:5001 --threads 16
+    python serve.py food --server waitress      # one process, --threads threads
+    python serve.py food --server dev           # the Werkzeug debug server, as `python app.py`
+
+With gunicorn the master imports the app once (preload_app) and loads
+what is expensive to build (the sales DataFrame and cube, the forecast
+model) before forking, then freezes the garbage collector so those
+objects stay in pages the workers share copy-on-write. Workers are
+gthread workers: every request gets a thread, which suits the chat and
+/predict routes that spend most of their time waiting on Gemini.
+Gunicorn needs fcntl, so on Windows this falls back to waitress.
+
+Workers do not share memory, only files:
+    food     chat sessions are versioned rows in SESSION_DB, which every
+             worker reads and merges into, so any number of workers is safe
+    dress    POST /ingest changes the sales data of the worker that took it
+             and appends to data.csv under a lock that only that process
+             sees; other workers, and the workers a HUP forks from the
+             preloaded master, never see the new rows. So the dress app
+             runs one worker by default; raise --threads instead. More
+             workers are only safe if nothing calls /ingest.
+
+Reloading (gunicorn):
+    kill -HUP <master pid>     new workers replace the old ones, which finish
+                               their requests first; the code is not re-imported
+    kill -USR2 <master pid>    start a new master with the new code, then
+    kill -QUIT <old pid>       stop the old one once the new one is up
+    kill -TERM <master pid>    graceful shutdown
+
+Environment:
+    WEB_CONCURRENCY    worker processes (default 2 x CPUs for food, 1 for dress)
+    WEB_THREADS        threads per worker (default 16, GEMINI_MAX_CONCURRENCY's default)
+
+Dev server vs gunicorn: python benchmark.py serve
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+log = logging.getLogger('serve')
+
+
+def load_food():
+    sys.path.insert(0, ROOT)
+    return importlib.import_module('app')
+
+
+def load_dress():
+    # The dress shop app reads data.csv, the model and templates relative to its directory
+    directory = os.path.join(ROOT, 'dress_shop_ai')
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    module = importlib.import_module('app')
+    from forecast import ForecastUnavailable
+
+    module.store.df
+    module.store.chat_summary()
+    try:
+        module.forecaster.check_model()
+        module.forecaster.products()
+    except (ForecastUnavailable, OSError) as e:
+        log.warning('Forecast model not preloaded: %s', e)
+    return module
+
+
+APPS = {'food': load_food, 'dress': load_dress}
+
+# Worker processes when neither --workers nor WEB_CONCURRENCY is given; see the module docstring
+DEFAULT_WORKERS = {'food': 2 * (os.cpu_count() or 1), 'dress': 1}
+
+
+def load_app(name):
+    """Import the app and build its shared state, then freeze it for copy-on-write sharing"""
+    module = APPS[name]()
+    gc.collect()
+    # Objects alive now are never scanned by the collector again, so the workers'
+    # collections do not touch (and copy) the pages they live in
+    gc.freeze()
+    return module.app
+
+
+def serve_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': args.bind,
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'preload_app': True,
+                # Slow Gemini calls are retried within the client's deadline; this is the hard stop
+                'timeout': args.timeout,
+                'graceful_timeout': 30,
+                'keepalive': 5,
+                'accesslog': '-' if args.access_log else None,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(args.app)
+
+    Server().run()
+
+
+def serve_waitress(args):
+    import waitress
+
+    waitress.serve(load_app(args.app), listen=args.bind, threads=args.threads)
+
+
+def serve_dev(args):
+    host, port = args.bind.rsplit(':', 1)
+    APPS[args.app]().app.run(debug=True, host=host, port=int(port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__)
+    parser.add_argument('app', choices=sorted(APPS))
+    parser.add_argument('--server', choices=['gunicorn', 'waitress', 'dev'],
+                        default='gunicorn' if os.name == 'posix' else 'waitress')
+    parser.add_argument('--bind', default='0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, default=os.getenv('WEB_CONCURRENCY'),
+                        help='worker processes (gunicorn; default 2 x CPUs for food, 1 for dress: '
+                             "the dress app's /ingest only updates the worker that handles it)")
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 16)),
+                        help='threads per worker process')
+    parser.add_argument('--timeout', type=int, default=120, help='seconds before a stuck worker is restarted')
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if args.workers is None:
+        args.workers = DEFAULT_WORKERS[args.app]
+    if args.app == 'dress' and args.workers > 1 and args.server == 'gunicorn':
+        log.warning('%d dress workers: rows sent to /ingest only reach the worker that takes them', args.workers)
+
+    if args.server == 'gunicorn':
+        try:
+            # Imports fcntl, so this fails on Windows
+            import gunicorn.app.base  # noqa: F401
+        except ImportError:
+            log.warning('gunicorn is not available here; serving with waitress')
+            args.server = 'waitress'
+    {'gunicorn': serve_gunicorn, 'waitress': serve_waitress, 'dev': serve_dev}[args.server](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,393 @@
+"""Per-user chat sessions (history and preferences) for the food chat API.
+
+Sessions live in a bounded in-memory LRU in front of a persistent
+backend. Changed sessions are written behind: save() only marks them
+dirty and a background thread writes every dirty session in one
+transaction, so /api/chat never waits on the disk. A changed session
+pushed out of memory goes out with the next flush and is read back
+from the backend when its user returns.
+
+Every stored session has a version. A cached session is read again when
+the backend holds a newer version than the one it was loaded at, and a
+flush only overwrites the version its session was based on. When another
+process wrote in between, the two are merged: the stored history plus
+the messages added here since, and the union of the preferences (or
+this copy's, after it was cleared). So several workers can share one
+SQLite file without dropping each other's messages.
+
+Environment:
+    SESSION_DB             SQLite file (default sessions.db; ':memory:' keeps nothing)
+    SESSION_CACHE_USERS    sessions kept in memory (default 10000)
+    CHAT_HISTORY_LIMIT     messages kept per user (default 50; the prompt uses the last 6)
+
+A store created before a pre-fork server (serve.py) forks its workers
+gives each worker its own locks, writer thread and SQLite connection.
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+log = logging.getLogger(__name__)
+
+PREFERENCE_KEYS = ['dietary_restrictions', 'favorite_cuisines', 'disliked_foods', 'allergies']
+
+# Merge-and-retry rounds per flush before conflicting sessions wait for the next one
+FLUSH_ATTEMPTS = 3
+
+
+class Base(NamedTuple):
+    """What a cached session was loaded from or last written as"""
+    version: int  # 0 when it has never been stored
+    chat_history: list
+    preferences: dict  # the session's preferences dict at that point; clearing replaces it
+
+
+def new_session(history_limit=None):
+    session = {
+        'chat_history': deque(maxlen=history_limit),
+        'preferences': {key: [] for key in PREFERENCE_KEYS},
+    }
+    session['base'] = Base(0, [], session['preferences'])
+    return session
+
+
+class MemoryBackend:
+    """Keeps serialized sessions in a dict; nothing survives a restart.
+
+    Backends store (data, version) per user. save_many() takes {user_id:
+    (data, base version)} and writes a row only while its stored version
+    is still the base one; it returns ({user_id: new version}, {user_id:
+    (stored data, stored version)} for the rows it did not write).
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        return self._rows.get(user_id)
+
+    def version(self, user_id):
+        row = self._rows.get(user_id)
+        return row[1] if row else 0
+
+    def save_many(self, rows):
+        versions, conflicts = {}, {}
+        with self._lock:
+            for user_id, (data, base) in rows.items():
+                stored = self._rows.get(user_id)
+                if (stored[1] if stored else 0) != base:
+                    conflicts[user_id] = stored
+                    continue
+                versions[user_id] = base + 1
+                self._rows[user_id] = (data, base + 1)
+        return versions, conflicts
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """One row of JSON per user in an SQLite file (WAL mode, shared by processes).
+
+    The connection is opened on first use and again in a forked child:
+    SQLite connections must not be used across fork().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._inherited = []  # connections copied from the parent; closing them would disturb its WAL
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            if self._db is not None:
+                self._inherited.append(self._db)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._pid = os.getpid()
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                             'user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, '
+                             'version INTEGER NOT NULL DEFAULT 1)')
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(sessions)')]
+            if 'version' not in columns:
+                # A file written before sessions had versions; its rows count as version 1
+                self._db.execute('ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        return self._db
+
+    def load(self, user_id):
+        with self._lock:
+            row = self._connection().execute('SELECT data, version FROM sessions WHERE user_id = ?',
+                                              (user_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def version(self, user_id):
+        with self._lock:
+            row = self._connection().execute('SELECT version FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def save_many(self, rows):
+        """One transaction; see MemoryBackend for the arguments and the result"""
+        now = time.time()
+        versions, conflicts = {}, {}
+        with self._lock:
+            db = self._connection()
+            # IMMEDIATE takes the write lock up front, so no other process writes between check and update
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                for user_id, (data, base) in rows.items():
+                    if base:
+                        written = db.execute('UPDATE sessions SET data = ?, updated_at = ?, version = version + 1 '
+                                             'WHERE user_id = ? AND version = ?', (data, now, user_id, base)).rowcount
+                    else:
+                        written = db.execute('INSERT INTO sessions (user_id, data, updated_at, version) '
+                                             'VALUES (?, ?, ?, 1) ON CONFLICT(user_id) DO NOTHING',
+                                             (user_id, data, now)).rowcount
+                    if written:
+                        versions[user_id] = base + 1
+                    else:
+                        conflicts[user_id] = tuple(db.execute('SELECT data, version FROM sessions WHERE user_id = ?',
+                                                              (user_id,)).fetchone())
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return versions, conflicts
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+                self._db = None
+
+
+class SessionStore:
+    """Bounded LRU of user sessions with write-behind persistence.
+
+    get() returns a session dict ({'chat_history': deque, 'preferences':
+    {...}}) that callers modify in place and then pass to save(). The
+    dict also carries the Base it was loaded from, under 'base'.
+    """
+
+    def __init__(self, backend=None, max_users=10000, history_limit=50, flush_interval=1.0):
+        self.backend = backend or MemoryBackend()
+        self.max_users = max_users
+        self.history_limit = history_limit
+        self.flush_interval = flush_interval
+        self._sessions = OrderedDict()  # user_id -> session, least recently used first
+        self._dirty = set()
+        self._writing = {}  # user_id -> session evicted while dirty, until a flush has written it
+        self._flushing = {}  # user_id -> session a running flush is writing
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._start_writer()
+        atexit.register(self.close)
+        # Held weakly, so a discarded store is not kept alive by the hook
+        store = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: store() and store()._after_fork())
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv('SESSION_DB', 'sessions.db')
+        return cls(backend=MemoryBackend() if path == ':memory:' else SQLiteBackend(path),
+                   max_users=int(os.getenv('SESSION_CACHE_USERS', 10000)),
+                   history_limit=int(os.getenv('CHAT_HISTORY_LIMIT', 50)))
+
+    # === Reads ===
+    def get(self, user_id):
+        """The user's session, created empty if they have none"""
+        session = self.peek(user_id)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(user_id)
+                if session is None:
+                    session = new_session(self.history_limit)
+                    self._remember(user_id, session)
+        return session
+
+    def peek(self, user_id):
+        """The user's session, or None if they have never chatted"""
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self._sessions.move_to_end(user_id)
+                if user_id in self._dirty or user_id in self._flushing:
+                    return session  # Changed here; merged with any newer copy by the flush
+            else:
+                session = self._writing.pop(user_id, None)
+                if session is not None:
+                    # Taken back from the pending write; it goes out with the next flush instead
+                    self._remember(user_id, session)
+                    self._dirty.add(user_id)
+                    return session
+        if session is not None and self.backend.version(user_id) == session['base'].version:
+            return session
+        # Not loaded yet, or another process has written it since
+        stored = self.backend.load(user_id)
+        if stored is None:
+            return session
+        with self._lock:
+            current = self._sessions.get(user_id)
+            if current is not None and (user_id in self._dirty or user_id in self._flushing
+                                        or current['base'].version >= stored[1]):
+                return current  # Changed or reloaded by another thread meanwhile
+            session = self._decode(*stored)
+            self._remember(user_id, session)
+            return session
+
+    # === Writes ===
+    def save(self, user_id):
+        """Mark the session as changed; it is written on the next flush"""
+        with self._lock:
+            self._dirty.add(user_id)
+
+    def flush(self):
+        """Write every changed session to the backend in one batch.
+
+        Sessions another process wrote in the meantime are merged and
+        written again. When the backend fails, the sessions stay changed
+        for the next flush and the error is raised.
+        """
+        with self._flush_lock:
+            for _ in range(FLUSH_ATTEMPTS):
+                with self._lock:
+                    # Sessions evicted since the last flush, then the dirty in-memory ones
+                    sessions = dict(self._writing)
+                    sessions.update((user_id, self._sessions[user_id])
+                                    for user_id in self._dirty if user_id in self._sessions)
+                    self._dirty.clear()
+                    self._flushing = sessions
+                    # The history and preferences written, for the Base each session moves to
+                    writes = {user_id: (self._encode(session), list(session['chat_history']), session['preferences'])
+                              for user_id, session in sessions.items()}
+                if not writes:
+                    return
+                try:
+                    versions, conflicts = self.backend.save_many(
+                        {user_id: (data, sessions[user_id]['base'].version)
+                         for user_id, (data, _, _) in writes.items()})
+                except Exception:
+                    with self._lock:
+                        # Evicted ones are still in self._writing
+                        self._dirty.update(user_id for user_id in writes if user_id in self._sessions)
+                        self._flushing = {}
+                    raise
+                with self._lock:
+                    for user_id, version in versions.items():
+                        sessions[user_id]['base'] = Base(version, writes[user_id][1], writes[user_id][2])
+                        if self._writing.get(user_id) is sessions[user_id]:
+                            del self._writing[user_id]
+                    for user_id, (data, version) in conflicts.items():
+                        self._merge(sessions[user_id], data, version)
+                        if user_id in self._sessions:
+                            self._dirty.add(user_id)
+                    self._flushing = {}
+                if not conflicts:
+                    return
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._wake.set()
+            self._writer.join()
+            self.flush()
+            self.backend.close()
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer.start()
+
+    def _after_fork(self):
+        # Only the forking thread survives fork(): locks another thread held stay held
+        # in the child, and the writer thread is gone
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self.backend.after_fork()
+        if not self._closed:
+            self._start_writer()
+
+    def _write_behind(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Kept dirty; the next round tries again
+                log.exception('Writing sessions failed')
+
+    def _remember(self, user_id, session):
+        with self._lock:
+            self._sessions[user_id] = session
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_users:
+                old_id, old_session = self._sessions.popitem(last=False)
+                if old_id in self._dirty:
+                    # Handed to the next flush; peek() takes it back from there until then
+                    self._dirty.discard(old_id)
+                    self._writing[old_id] = old_session
+
+    # === Serialization ===
+    @staticmethod
+    def _encode(session):
+        return json.dumps({'chat_history': list(session['chat_history']),
+                           'preferences': session['preferences']})
+
+    def _decode(self, data, version):
+        stored = json.loads(data)
+        session = new_session(self.history_limit)
+        session['chat_history'].extend(stored.get('chat_history', []))
+        session['preferences'].update(stored.get('preferences', {}))
+        session['base'] = Base(version, list(session['chat_history']), session['preferences'])
+        return session
+
+    @staticmethod
+    def _added_messages(base, history):
+        """Messages appended since base, or None when the history was cleared instead"""
+        # Appends past the history limit drop messages from the front, so base may only overlap partly
+        for start in range(len(base) + 1):
+            kept = base[start:]
+            if history[:len(kept)] == kept:
+                return history[len(kept):] if kept or not base else None
+        return None
+
+    def _merge(self, session, data, version):
+        """Make the session the stored one (version) plus the changes made here; under self._lock"""
+        base = session['base']
+        stored = json.loads(data)
+        history = list(stored.get('chat_history', []))
+        added = self._added_messages(base.chat_history, list(session['chat_history']))
+        history = list(session['chat_history']) if added is None else history + added
+        preferences = session['preferences']
+        if preferences is base.preferences:
+            # Both sides only ever add to the lists
+            merged = {key: list(values) for key, values in stored.get('preferences', {}).items()}
+            for key, values in preferences.items():
+                merged.setdefault(key, []).extend(value for value in values if value not in merged[key])
+            preferences = merged
+        session['chat_history'].clear()
+        session['chat_history'].extend(history)
+        session['preferences'] = preferences
+        session.pop('prompt_cache', None)  # Rebuilt from the merged history
+        session['base'] = Base(version, list(stored.get('chat_history', [])), preferences)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,223 @@
+"""Suggestion history for food suggestion.py, indexed for per-user lookups.
+
+user_suggestions.csv stays the record of every suggestion sent. Beside it
+an SQLite file (user_suggestions.db) indexes the rows by (name, phone,
+timestamp), so "what did this user get in the last day" is an index range
+scan instead of a parse of the whole CSV.
+
+It also keeps the schedule snapshot: one row per user and time period
+with the time of day, location and food type their daily suggestion is
+sent with. It is the only copy of the schedule on disk: the script
+updates it as users are scheduled, and startup() builds the scheduler's jobs
+from it in one read instead of replaying the whole history. On first
+use it is derived from the indexed rows (the latest suggestion per user
+and period), which is what the replay did.
+
+The index remembers how many bytes of the CSV it has read. Every lookup
+first checks the file size and reads only what was appended since, so
+rows written by another process (or by an older copy of the script) are
+picked up without a rescan. A CSV that shrank or was replaced is indexed
+again from the start.
+"""
+import csv
+import datetime
+import io
+import os
+import re
+import sqlite3
+import threading
+
+HEADER = ["Name", "Phone", "Location", "Weather", "Temperature",
+          "Category", "Suggested Food", "Timestamp", "TimePeriod"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# The form the script writes, parsed without strptime when indexing large files
+CANONICAL_TIMESTAMP = re.compile(r'(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)')
+INDEX_SQL = 'CREATE INDEX IF NOT EXISTS suggestions_user_ts ON suggestions (name, phone, ts)'
+# Bytes of the file start kept to notice the CSV being replaced by another one
+FINGERPRINT_BYTES = 256
+
+
+class SuggestionHistory:
+    """Appends suggestions to the CSV and answers per-user history queries from the index.
+
+    time_period_of(hour) fills in the period of rows written before the
+    TimePeriod column existed.
+    """
+
+    def __init__(self, csv_path, db_path=None, time_period_of=None):
+        self.csv_path = csv_path
+        self.db_path = db_path or os.path.splitext(csv_path)[0] + '.db'
+        self.time_period_of = time_period_of
+        self._db = None
+        self._lock = threading.Lock()  # the scheduler thread and the prompt share the connection
+
+    def _connection(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS suggestions ('
+                             'id INTEGER PRIMARY KEY, name TEXT NOT NULL, phone TEXT NOT NULL, '
+                             'location TEXT, food TEXT, ts TEXT, time_period TEXT)')
+            self._db.execute(INDEX_SQL)
+            self._db.execute('CREATE TABLE IF NOT EXISTS csv_state ('
+                             'id INTEGER PRIMARY KEY CHECK (id = 1), offset INTEGER NOT NULL, head BLOB)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS schedule ('
+                             'name TEXT NOT NULL, phone TEXT NOT NULL, time_period TEXT NOT NULL, '
+                             'at TEXT NOT NULL, location TEXT, food_type TEXT, '
+                             'PRIMARY KEY (name, phone, time_period))')
+        return self._db
+
+    # === Keeping up with the CSV ===
+    def sync(self):
+        """Index the rows appended to the CSV since the last sync; returns how many"""
+        with self._lock:
+            return self._sync()
+
+    def _sync(self):
+        db = self._connection()
+        try:
+            size = os.path.getsize(self.csv_path)
+        except OSError:
+            size = 0
+        state = db.execute('SELECT offset, head FROM csv_state WHERE id = 1').fetchone()
+        indexed, head = state if state else (0, b'')
+        if size == indexed:
+            return 0
+
+        offset = indexed
+        with open(self.csv_path, 'rb') as f:
+            current_head = f.read(FINGERPRINT_BYTES)
+            if size < offset or current_head[:len(head)] != head:
+                offset = 0  # Truncated or replaced: index it again
+            f.seek(offset)
+            data = f.read(size - offset)
+        # A line still being written is left for the next sync
+        end = data.rfind(b'\n') + 1
+        if end == 0 and offset == indexed:
+            return 0  # Nothing new, and no stale rows to clear
+        rows = list(csv.reader(io.StringIO(data[:end].decode('utf-8'), newline='')))
+        if offset == 0 and rows and rows[0] == HEADER:
+            rows = rows[1:]
+
+        db.execute('BEGIN')
+        if offset == 0:
+            # A full build sorts once into a new index instead of updating it row by row
+            db.execute('DELETE FROM suggestions')
+            db.execute('DROP INDEX IF EXISTS suggestions_user_ts')
+        db.executemany('INSERT INTO suggestions (name, phone, location, food, ts, time_period) '
+                       'VALUES (?, ?, ?, ?, ?, ?)', (self._index_row(row) for row in rows if len(row) >= 2))
+        db.execute(INDEX_SQL)
+        db.execute('INSERT OR REPLACE INTO csv_state (id, offset, head) VALUES (1, ?, ?)',
+                   (offset + end, current_head))
+        db.execute('COMMIT')
+        return len(rows)
+
+    @staticmethod
+    def _parse_timestamp(text):
+        """(timestamp zero-padded, hour), or (None, None) when it is not a valid time"""
+        match = CANONICAL_TIMESTAMP.fullmatch(text)
+        try:
+            if match:
+                datetime.datetime(*map(int, match.groups()))  # rejects 2024-02-30 and the like
+                return text, int(match[4])
+            moment = datetime.datetime.strptime(text, TIMESTAMP_FORMAT)
+        except ValueError:
+            return None, None
+        # Stored zero-padded, so comparing the strings compares the times
+        return moment.strftime(TIMESTAMP_FORMAT), moment.hour
+
+    def _index_row(self, row):
+        # Without a valid timestamp a row never matches a time window
+        timestamp, hour = self._parse_timestamp(row[7]) if len(row) > 7 else (None, None)
+        time_period = row[8] if len(row) > 8 and row[8] else None
+        if time_period is None and hour is not None and self.time_period_of:
+            time_period = self.time_period_of(hour)
+        return (row[0], row[1], row[2] if len(row) > 2 else None, row[6] if len(row) > 6 else None,
+                timestamp, time_period)
+
+    # === Writes ===
+    def add(self, row):
+        """Append one suggestion (the CSV columns, in HEADER order) to the CSV and the index"""
+        self.add_many([row])
+
+    def add_many(self, rows):
+        """Append suggestions with a single write and index sync"""
+        if not rows:
+            return
+        with self._lock:
+            new_file = not os.path.isfile(self.csv_path)
+            with open(self.csv_path, mode='a', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                if new_file:
+                    writer.writerow(HEADER)
+                writer.writerows(rows)
+            self._sync()
+
+    # === Lookups ===
+    def recent_foods(self, name, phone, days=1, time_period=None, now=None):
+        """Foods suggested to the user less than days + 1 whole days ago, oldest first"""
+        now = now or datetime.datetime.now()
+        cutoff = (now - datetime.timedelta(days=days + 1)).strftime(TIMESTAMP_FORMAT)
+        query = 'SELECT food FROM suggestions WHERE name = ? AND phone = ? AND ts > ?'
+        params = [name, phone, cutoff]
+        if time_period is not None:
+            query += ' AND time_period = ?'
+            params.append(time_period)
+        with self._lock:
+            self._sync()
+            return [food for food, in self._connection().execute(query + ' ORDER BY id', params)]
+
+    def has_user(self, name, phone):
+        with self._lock:
+            self._sync()
+            row = self._connection().execute(
+                'SELECT 1 FROM suggestions WHERE name = ? AND phone = ? LIMIT 1', (name, phone)).fetchone()
+        return row is not None
+
+    def time_periods(self, name, phone):
+        """Every time period the user has been sent a suggestion in"""
+        with self._lock:
+            self._sync()
+            rows = self._connection().execute(
+                'SELECT DISTINCT time_period FROM suggestions WHERE name = ? AND phone = ? '
+                'AND time_period IS NOT NULL', (name, phone))
+            return {time_period for time_period, in rows}
+
+    # === Schedule snapshot ===
+    def save_schedule(self, name, phone, time_period, at, location, food_type=None):
+        """Set the user's daily time ("HH:MM") for the period; returns the time it replaces, if any"""
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN')
+            previous = db.execute('SELECT at FROM schedule WHERE name = ? AND phone = ? AND time_period = ?',
+                                  (name, phone, time_period)).fetchone()
+            db.execute('INSERT OR REPLACE INTO schedule (name, phone, time_period, at, location, food_type) '
+                       'VALUES (?, ?, ?, ?, ?, ?)', (name, phone, time_period, at, location, food_type))
+            db.execute('COMMIT')
+        return previous[0] if previous else None
+
+    def schedules(self):
+        """Every (name, phone, time_period, at, location, food_type) in the snapshot"""
+        with self._lock:
+            db = self._connection()
+            if db.execute('SELECT 1 FROM schedule LIMIT 1').fetchone() is None:
+                self._sync()
+                self._build_schedule(db)
+            return db.execute('SELECT name, phone, time_period, at, location, food_type FROM schedule').fetchall()
+
+    @staticmethod
+    def _build_schedule(db):
+        # Each user's latest valid suggestion per period; SQLite takes the bare columns from the max(id) row
+        db.execute('BEGIN')
+        db.execute('INSERT OR REPLACE INTO schedule (name, phone, time_period, at, location, food_type) '
+                   'SELECT name, phone, time_period, substr(ts, 12, 5), location, NULL FROM '
+                   '(SELECT max(id), name, phone, time_period, ts, location FROM suggestions '
+                   'WHERE ts IS NOT NULL AND time_period IS NOT NULL GROUP BY name, phone, time_period)')
+        db.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,115 @@
+import pytest
+import requests
+
+import fake_gemini
+import gemini_client
+from gemini_client import CircuitBreaker, GeminiClient, GeminiError, ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(gemini_client.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = fake_gemini.start(latency=0, token_delay=0)
+    yield server
+    server.shutdown()
+
+
+def client(server, **kwargs):
+    kwargs.setdefault('cache', ResponseCache(0))
+    return GeminiClient('key', base_url=f'http://127.0.0.1:{server.server_port}/v1beta', **kwargs)
+
+
+def test_breaker_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker(threshold=3, reset_after=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(threshold=2, reset_after=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=1, reset_after=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failing_gemini_opens_the_circuit(server, clock):
+    server.error_rate = 1.0
+    try:
+        gemini = client(server, retries=0, breaker=CircuitBreaker(threshold=2, reset_after=30))
+        for _ in range(2):
+            with pytest.raises(GeminiError) as error:
+                gemini.generate('hello')
+            assert error.value.status_code in (429, 503)
+        with pytest.raises(GeminiError) as error:
+            gemini.generate('hello')
+        assert error.value.status_code == 503
+        assert gemini.stats.snapshot()['events']['rejected'] == 1
+    finally:
+        server.error_rate = 0.0
+
+
+def test_other_request_errors_close_the_trial_call(server, clock, monkeypatch):
+    breaker = CircuitBreaker(threshold=1, reset_after=30)
+    gemini = client(server, retries=0, breaker=breaker)
+    breaker.record_failure()
+    clock.now += 30
+
+    def invalid(*args, **kwargs):
+        raise requests.exceptions.InvalidURL('bad url')
+    monkeypatch.setattr(gemini.session, 'post', invalid)
+    with pytest.raises(GeminiError) as error:
+        gemini.generate('hello')
+    assert error.value.status_code == 502
+    assert breaker.state == 'open'
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_stream_holds_its_slot_until_closed(server):
+    gemini = client(server, max_concurrency=1)
+    chunks = gemini.stream('hello there')
+    assert next(chunks)
+    assert not gemini.semaphore.acquire(blocking=False)
+    chunks.close()
+    assert gemini.semaphore.acquire(blocking=False)
+    gemini.semaphore.release()
+
+    assert 'hello there' in ''.join(gemini.stream('hello there'))
+    assert gemini.semaphore.acquire(blocking=False)
@@ -0,0 +1,200 @@
+import sqlite3
+
+import pytest
+
+from session_store import MemoryBackend, SessionStore, SQLiteBackend
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'sessions.db')
+
+
+def chat(store, user_id, text):
+    session = store.get(user_id)
+    session['chat_history'].append({'role': 'user', 'content': text})
+    store.save(user_id)
+    return session
+
+
+def test_new_user_gets_an_empty_session():
+    store = SessionStore(flush_interval=60)
+    assert store.peek('ana') is None
+    session = store.get('ana')
+    assert list(session['chat_history']) == []
+    assert session['preferences']['allergies'] == []
+    assert store.get('ana') is session
+    store.close()
+
+
+def test_saved_sessions_survive_a_restart(db_path):
+    store = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    session = chat(store, 'ana', 'hello')
+    session['preferences']['allergies'].append('peanuts')
+    store.save('ana')
+    store.close()
+
+    store = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    session = store.peek('ana')
+    assert [message['content'] for message in session['chat_history']] == ['hello']
+    assert session['preferences']['allergies'] == ['peanuts']
+    store.close()
+
+
+def test_unsaved_changes_are_not_written(db_path):
+    store = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    chat(store, 'ana', 'hello')
+    store.flush()
+    store.get('ana')['chat_history'].append({'role': 'user', 'content': 'not saved'})
+    store.flush()
+    data, _ = store.backend.load('ana')
+    assert 'hello' in data and 'not saved' not in data
+    store.close()
+
+
+def test_flush_writes_dirty_sessions_in_one_batch():
+    batches = []
+
+    class RecordingBackend(MemoryBackend):
+        def save_many(self, rows):
+            batches.append(sorted(rows))
+            return super().save_many(rows)
+
+    store = SessionStore(RecordingBackend(), flush_interval=60)
+    for user_id in ['ana', 'ben', 'cy']:
+        chat(store, user_id, 'hi')
+    store.flush()
+    store.flush()
+    assert batches == [['ana', 'ben', 'cy']]
+    store.close()
+
+
+def test_evicted_dirty_session_is_kept_until_written():
+    store = SessionStore(max_users=2, flush_interval=60)
+    chat(store, 'ana', 'first')
+    chat(store, 'ben', 'hi')
+    chat(store, 'cy', 'hi')
+    assert len(store) == 2
+    assert store.backend.load('ana') is None
+
+    # Read back from the pending write before any flush, then from the backend after
+    session = store.peek('ana')
+    assert [message['content'] for message in session['chat_history']] == ['first']
+    store.flush()
+    assert 'first' in store.backend.load('ana')[0]
+    store.close()
+
+
+def test_history_is_capped():
+    store = SessionStore(history_limit=3, flush_interval=60)
+    for n in range(5):
+        chat(store, 'ana', str(n))
+    assert [message['content'] for message in store.get('ana')['chat_history']] == ['2', '3', '4']
+    store.close()
+
+
+def test_writer_thread_flushes_in_the_background(db_path):
+    store = SessionStore(SQLiteBackend(db_path), flush_interval=0.01)
+    chat(store, 'ana', 'hello')
+    for _ in range(500):
+        if store.backend.load('ana'):
+            break
+        store._wake.wait(0.01)
+    assert 'hello' in store.backend.load('ana')[0]
+    store.close()
+
+
+def test_failed_writes_are_retried_on_the_next_flush():
+    class FlakyBackend(MemoryBackend):
+        failures = 1
+
+        def save_many(self, rows):
+            if self.failures:
+                self.failures -= 1
+                raise sqlite3.OperationalError('database is locked')
+            return super().save_many(rows)
+
+    store = SessionStore(FlakyBackend(), max_users=1, flush_interval=60)
+    chat(store, 'ana', 'first')
+    chat(store, 'ben', 'hi')  # evicts ana while she is unwritten
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    store.flush()
+    assert 'first' in store.backend.load('ana')[0]
+    assert 'hi' in store.backend.load('ben')[0]
+    store.close()
+
+
+def test_writer_thread_survives_a_failed_write(db_path):
+    class FlakyBackend(SQLiteBackend):
+        failures = 1
+
+        def save_many(self, rows):
+            if self.failures:
+                self.failures -= 1
+                raise sqlite3.OperationalError('database is locked')
+            return super().save_many(rows)
+
+    store = SessionStore(FlakyBackend(db_path), flush_interval=0.01)
+    chat(store, 'ana', 'hello')
+    for _ in range(500):
+        if store.backend.load('ana'):
+            break
+        store._wake.wait(0.01)
+    assert store._writer.is_alive()
+    assert 'hello' in store.backend.load('ana')[0]
+    store.close()
+
+
+def test_two_stores_on_one_file_keep_each_others_messages(db_path):
+    first = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    second = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    chat(first, 'ana', 'm1')
+    first.flush()
+    chat(second, 'ana', 'm2')
+    second.flush()
+    # first's cached copy is behind; it is read again before the next message
+    chat(first, 'ana', 'm3')
+    first.flush()
+    assert [message['content'] for message in second.get('ana')['chat_history']] == ['m1', 'm2', 'm3']
+    first.close()
+    second.close()
+
+
+def test_concurrent_changes_are_merged(db_path):
+    first = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    second = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    chat(first, 'ana', 'm1')
+    first.flush()
+    chat(second, 'ana', 'm2')
+    # Both change the same version before either writes
+    session = chat(first, 'ana', 'm3')
+    session['preferences']['allergies'].append('peanuts')
+    second.get('ana')['preferences']['allergies'].append('shellfish')
+    second.flush()
+    first.flush()
+
+    data, version = first.backend.load('ana')
+    assert version == 3
+    assert [message['content'] for message in session['chat_history']] == ['m1', 'm2', 'm3']
+    assert session['preferences']['allergies'] == ['shellfish', 'peanuts']
+    assert second.get('ana')['preferences']['allergies'] == ['shellfish', 'peanuts']
+    first.close()
+    second.close()
+
+
+def test_cleared_history_is_not_merged_back(db_path):
+    first = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    second = SessionStore(SQLiteBackend(db_path), flush_interval=60)
+    chat(first, 'ana', 'm1')
+    first.flush()
+    chat(second, 'ana', 'm2')
+    second.flush()
+    session = first.get('ana')
+    session['chat_history'].clear()
+    first.save('ana')
+    # first loaded m1+m2 before clearing, so the write goes through
+    first.flush()
+    assert list(second.get('ana')['chat_history']) == []
+    first.close()
+    second.close()
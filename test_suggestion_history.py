@@ -0,0 +1,125 @@
+import csv
+import datetime
+
+import pytest
+
+from suggestion_history import FINGERPRINT_BYTES, HEADER, SuggestionHistory
+
+NOW = datetime.datetime(2024, 5, 1, 13, 0, 0)
+
+
+def row(name, food, hour=12, location='Chennai'):
+    timestamp = NOW.replace(hour=hour).strftime('%Y-%m-%d %H:%M:%S')
+    return [name, '555', location, 'Sunny', 30, 'hot', food, timestamp, 'Lunch']
+
+
+def write_csv(path, rows, header=True):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'suggestions.csv'), str(tmp_path / 'suggestions.db')
+
+
+def test_appended_rows_are_indexed_incrementally(paths):
+    csv_path, db_path = paths
+    history = SuggestionHistory(csv_path, db_path)
+    history.add_many([row('Asha', 'Dosa'), row('Ravi', 'Idli')])
+    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow(row('Asha', 'Pongal', hour=13))
+
+    assert history.sync() == 1
+    assert history.sync() == 0
+    assert history.recent_foods('Asha', '555', now=NOW) == ['Dosa', 'Pongal']
+    assert history.recent_foods('Asha', '555', time_period='Dinner', now=NOW) == []
+    history.close()
+
+
+def test_index_survives_a_restart(paths):
+    csv_path, db_path = paths
+    history = SuggestionHistory(csv_path, db_path)
+    history.add(row('Asha', 'Dosa'))
+    history.close()
+
+    history = SuggestionHistory(csv_path, db_path)
+    assert history.sync() == 0
+    assert history.has_user('Asha', '555')
+    history.close()
+
+
+def test_partial_last_line_waits_for_its_newline(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, [row('Asha', 'Dosa')])
+    line = ','.join(map(str, row('Asha', 'Pongal', hour=13)))
+    with open(csv_path, 'a', encoding='utf-8') as f:
+        f.write(line[:20])
+
+    history = SuggestionHistory(csv_path, db_path)
+    assert history.recent_foods('Asha', '555', now=NOW) == ['Dosa']
+    with open(csv_path, 'a', encoding='utf-8') as f:
+        f.write(line[20:] + '\r\n')
+    assert history.recent_foods('Asha', '555', now=NOW) == ['Dosa', 'Pongal']
+    history.close()
+
+
+def test_first_line_is_data_without_a_header(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, [row('Asha', 'Dosa'), row('Asha', 'Idli')], header=False)
+
+    history = SuggestionHistory(csv_path, db_path)
+    assert history.sync() == 2
+    assert history.recent_foods('Asha', '555', now=NOW) == ['Dosa', 'Idli']
+    history.close()
+
+
+def test_shorter_replacement_with_the_same_start_is_reindexed(paths):
+    csv_path, db_path = paths
+    # Long enough that the whole fingerprint comes from rows both files share
+    shared = [row(f'User{i}', 'Dosa') for i in range(10)]
+    write_csv(csv_path, shared + [row('Asha', 'Biryani'), row('Asha', 'Pongal')])
+    history = SuggestionHistory(csv_path, db_path)
+    assert history.recent_foods('Asha', '555', now=NOW) == ['Biryani', 'Pongal']
+
+    with open(csv_path, 'rb') as f:
+        before = f.read(FINGERPRINT_BYTES)
+    write_csv(csv_path, shared + [row('Asha', 'Upma')])
+    with open(csv_path, 'rb') as f:
+        assert f.read(FINGERPRINT_BYTES) == before
+
+    assert history.recent_foods('Asha', '555', now=NOW) == ['Upma']
+    assert history.has_user('User0', '555')
+    history.close()
+
+
+def test_replaced_file_without_a_complete_line_clears_the_index(paths):
+    csv_path, db_path = paths
+    write_csv(csv_path, [row('Asha', 'Dosa')])
+    history = SuggestionHistory(csv_path, db_path)
+    assert history.has_user('Asha', '555')
+
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        f.write('Ravi,555')
+    assert not history.has_user('Asha', '555')
+
+    statements = []
+    history._connection().set_trace_callback(statements.append)
+    assert history.sync() == 0
+    assert not history.has_user('Ravi', '555')
+    assert not any(statement.startswith(('DELETE', 'DROP')) for statement in statements)
+    history.close()
+
+
+def test_schedules_are_built_from_the_latest_rows(paths):
+    csv_path, db_path = paths
+    history = SuggestionHistory(csv_path, db_path)
+    history.add_many([row('Asha', 'Dosa', hour=12), row('Asha', 'Idli', hour=13, location='Delhi')])
+
+    assert history.schedules() == [('Asha', '555', 'Lunch', '13:00', 'Delhi', None)]
+    assert history.save_schedule('Asha', '555', 'Lunch', '12:30', 'Delhi') == '13:00'
+    assert history.schedules() == [('Asha', '555', 'Lunch', '12:30', 'Delhi', None)]
+    history.close()
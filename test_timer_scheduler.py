@@ -0,0 +1,101 @@
+import datetime
+import threading
+
+import pytest
+
+from timer_scheduler import TimerScheduler, next_run
+
+NOW = datetime.datetime(2024, 5, 1, 12, 0, 0).timestamp()
+
+
+def at(hour, minute, day=1):
+    return datetime.datetime(2024, 5, day, hour, minute).timestamp()
+
+
+class Fired:
+    """fire callback that records batches and lets a test wait for them"""
+
+    def __init__(self):
+        self.batches = []
+        self.event = threading.Event()
+
+    def __call__(self, jobs):
+        self.batches.append(sorted(job.job_id for job in jobs))
+        self.event.set()
+
+
+@pytest.mark.parametrize('time, after, expected', [
+    ('13:30', NOW, at(13, 30)),
+    ('08:00', NOW, at(8, 0, day=2)),
+    ('12:00', NOW, at(12, 0, day=2)),  # strictly after
+    ('00:00', NOW, at(0, 0, day=2)),
+])
+def test_next_run(time, after, expected):
+    assert next_run(time, after) == expected
+
+
+@pytest.mark.parametrize('time', ['25:00', '12', 'noon', '12:60'])
+def test_next_run_rejects_bad_times(time):
+    with pytest.raises(ValueError, match='expected HH:MM'):
+        next_run(time, NOW)
+
+
+def test_add_replaces_and_cancel_removes():
+    scheduler = TimerScheduler(Fired(), clock=lambda: NOW)
+    scheduler.add('ana_08:00', '08:00', {'name': 'ana'})
+    scheduler.add('ben_13:30', '13:30', {'name': 'ben'})
+    assert scheduler.next_due() == at(13, 30)
+
+    scheduler.add('ben_13:30', '14:00', {'name': 'ben'})
+    assert len(scheduler) == 2
+    assert scheduler.get('ben_13:30').at == '14:00'
+    assert scheduler.next_due() == at(14, 0)
+
+    assert scheduler.cancel('ben_13:30')
+    assert not scheduler.cancel('ben_13:30')
+    assert scheduler.next_due() == at(8, 0, day=2)
+
+
+def test_due_jobs_fire_in_one_batch_and_move_to_the_next_day():
+    fired = Fired()
+    scheduler = TimerScheduler(fired, misfire_grace=300, clock=lambda: NOW)
+    scheduler.add_many([('ana', '11:58', {}, NOW - 120), ('ben', '11:59', {}, NOW - 60),
+                        ('cy', '13:00', {}, None)])
+    scheduler.start()
+    assert fired.event.wait(5)
+    scheduler.stop()
+    assert fired.batches == [['ana', 'ben']]
+    assert scheduler.get('ana').due == at(11, 58, day=2)
+    assert scheduler.get('cy').due == at(13, 0)
+
+
+def test_jobs_past_the_misfire_grace_are_skipped():
+    fired = Fired()
+    scheduler = TimerScheduler(fired, misfire_grace=300, clock=lambda: NOW)
+    scheduler.add_many([('late', '10:00', {}, at(10, 0)), ('on_time', '11:59', {}, NOW - 60)])
+    scheduler.start()
+    assert fired.event.wait(5)
+    scheduler.stop()
+    assert fired.batches == [['on_time']]
+    assert scheduler.get('late').due == at(10, 0, day=2)
+
+
+def test_a_failing_callback_does_not_stop_the_scheduler():
+    calls = []
+    first, second = threading.Event(), threading.Event()
+
+    def fire(jobs):
+        calls.append([job.job_id for job in jobs])
+        (second if first.is_set() else first).set()
+        raise RuntimeError('send failed')
+
+    scheduler = TimerScheduler(fire, clock=lambda: NOW)
+    scheduler.add('first', '11:59', {}, NOW - 1)
+    scheduler.start()
+    assert first.wait(5)
+    # Due sooner than anything queued, so adding it wakes the thread
+    scheduler.add('second', '12:00', {}, NOW)
+    assert second.wait(5)
+    scheduler.stop()
+    assert calls == [['first'], ['second']]
+
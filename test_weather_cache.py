@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+import fake_weather
+import weather_cache
+from weather_cache import DEFAULT_WEATHER, WeatherCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(weather_cache.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def server():
+    server = fake_weather.start(latency=0)
+    yield server
+    server.shutdown()
+
+
+def cache(server, **kwargs):
+    kwargs.setdefault('ttl', 600)
+    kwargs.setdefault('stale_ttl', 3600)
+    return WeatherCache('key', base_url=f'http://127.0.0.1:{server.server_port}/v1', timeout=5, **kwargs)
+
+
+def wait_for_refresh(weather):
+    """Until no background call is in flight"""
+    for _ in range(500):
+        if not weather._calls:
+            return
+        threading.Event().wait(0.01)
+
+
+def test_fresh_reading_is_served_without_a_second_call(server, clock):
+    weather = cache(server)
+    reading = weather.current('New Delhi')
+    assert reading != DEFAULT_WEATHER
+    clock.now += 599
+    assert weather.current('  new   delhi ') == reading
+    assert server.requests == 1
+    assert weather.stats()['hit'] == 1
+
+
+def test_concurrent_misses_share_one_call(server, clock):
+    server.latency = 0.2
+    weather = cache(server)
+    start = threading.Barrier(10)
+    readings = []
+
+    def lookup():
+        start.wait()
+        readings.append(weather.current('Chennai'))
+
+    threads = [threading.Thread(target=lookup) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.locations['chennai'] == 1
+    assert len(set(readings)) == 1 and readings[0] != DEFAULT_WEATHER
+    stats = weather.stats()
+    assert stats['miss'] == 1 and stats['coalesced'] == 9
+
+
+def test_stale_reading_is_returned_and_refreshed_in_the_background(server, clock):
+    weather = cache(server)
+    reading = weather.current('Mumbai')
+    clock.now += 601
+    server.latency = 0.2
+    # Answered from the stale reading while the refresh is still waiting on the server
+    assert weather.current('Mumbai') == reading
+    assert weather._calls
+    assert weather.stats()['stale'] == 1
+    wait_for_refresh(weather)
+    assert server.locations['mumbai'] == 2
+    # Refreshed: fresh again at the new time
+    assert weather.current('Mumbai') == reading
+    assert weather.stats()['hit'] == 1
+
+
+def test_failed_call_falls_back_to_the_stale_reading(server, clock):
+    weather = cache(server, ttl=0)
+    reading = weather.current('Kolkata')
+    server.failing = True
+    clock.now += 3600
+    # Past the TTL, the stale answer is returned at once and the refresh fails
+    assert weather.current('Kolkata') == reading
+    wait_for_refresh(weather)
+    assert weather.stats()['error'] == 1
+    assert weather.current('Kolkata') == reading
+    assert weather.stats()['default'] == 0
+
+
+def test_failed_call_without_a_usable_reading_returns_the_default(server, clock):
+    weather = cache(server)
+    server.failing = True
+    assert weather.current('Pune') == DEFAULT_WEATHER
+
+    server.failing = False
+    reading = weather.current('Bengaluru')
+    server.failing = True
+    clock.now += 3601
+    # Too old even to stand in for a failed call
+    assert weather.current('Bengaluru') == DEFAULT_WEATHER
+    stats = weather.stats()
+    assert stats['error'] == 2 and stats['default'] == 2
+    assert reading != DEFAULT_WEATHER
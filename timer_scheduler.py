@@ -0,0 +1,182 @@
+"""Daily jobs on a min-heap of due times, fired in batches by one thread.
+
+Replaces the `schedule` loop in food suggestion.py, which woke once a
+minute and walked every registered job. Here the scheduler thread sleeps
+on a Condition until the earliest due time (or until a job that is due
+sooner is added), then pops every job that is due and hands them to the
+fire callback in one batch.
+
+Jobs are identified by the script's tags ("<name>_<phone>_<HH:MM>"):
+adding a job with an existing id replaces it and cancel() removes it,
+both O(log n). A replaced or cancelled job's heap entry is not searched
+for; it is dropped when it reaches the top.
+
+Nothing is kept on disk: the script rebuilds the jobs from the schedule
+snapshot in its history database at startup. Jobs whose time passed more
+than misfire_grace seconds ago (the scheduler thread was busy or the
+machine asleep) are moved to their next day without firing, as schedule
+did.
+
+Environment:
+    SCHEDULER_MISFIRE_GRACE  seconds a job may still fire late (default 300)
+"""
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+log = logging.getLogger(__name__)
+
+# Longest single sleep; waking up now and then keeps the timer right if the wall clock is changed
+MAX_SLEEP = 60
+
+
+def next_run(at, after):
+    """Epoch seconds of the first local `at` ("HH:MM") strictly after `after`"""
+    try:
+        hour, minute = map(int, at.split(':'))
+        moment = datetime.datetime.fromtimestamp(after).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    except ValueError:
+        raise ValueError(f'Invalid time {at!r}, expected HH:MM')
+    if moment.timestamp() <= after:
+        moment += datetime.timedelta(days=1)
+    return moment.timestamp()
+
+
+@dataclass
+class Job:
+    job_id: str
+    at: str  # "HH:MM", local time, every day
+    payload: dict  # arguments for the fire callback
+    due: float  # epoch seconds of the next run
+
+
+class TimerScheduler:
+    """Fires daily jobs in batches; fire(jobs) runs on the scheduler thread"""
+
+    def __init__(self, fire, misfire_grace=None, clock=time.time):
+        self.fire = fire
+        self.misfire_grace = misfire_grace if misfire_grace is not None else float(
+            os.getenv('SCHEDULER_MISFIRE_GRACE', 300))
+        self.clock = clock
+        self._jobs = {}  # job_id -> Job
+        self._heap = []  # (due, sequence, Job); stale when the Job was replaced, cancelled or moved
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    # === Jobs ===
+    def add(self, job_id, at, payload, due=None):
+        """Run fire([job]) every day at `at`, first at `due` (default: the next `at`); replaces job_id"""
+        self.add_many([(job_id, at, payload, due)])
+
+    def add_many(self, entries):
+        """add() for an iterable of (job_id, at, payload, due)"""
+        now = self.clock()
+        jobs = [Job(job_id, at, payload, due if due is not None else next_run(at, now))
+                for job_id, at, payload, due in entries]
+        with self._condition:
+            earliest = self._heap[0][0] if self._heap else None
+            for job in jobs:
+                self._jobs[job.job_id] = job
+                heapq.heappush(self._heap, (job.due, next(self._sequence), job))
+            self._compact()
+            if jobs and (earliest is None or self._heap[0][0] < earliest):
+                self._condition.notify()
+
+    def cancel(self, job_id):
+        """Remove the job; False if there was none"""
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+            self._compact()
+        return job is not None
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _live(self, entry):
+        due, _, job = entry
+        return self._jobs.get(job.job_id) is job and job.due == due
+
+    def _compact(self):
+        # Rebuilt when dead entries outnumber the live ones, so the heap stays O(jobs)
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [entry for entry in self._heap if self._live(entry)]
+            heapq.heapify(self._heap)
+
+    def next_due(self):
+        with self._condition:
+            while self._heap and not self._live(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    # === Running ===
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name='timer-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _due_jobs(self):
+        """Wait for the earliest job, then pop all due ones; None once stopped. Under self._condition"""
+        while self._running:
+            while self._heap and not self._live(self._heap[0]):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._condition.wait()
+                continue
+            delay = self._heap[0][0] - self.clock()
+            if delay <= 0:
+                break
+            self._condition.wait(min(delay, MAX_SLEEP))
+        if not self._running:
+            return None
+
+        now = self.clock()
+        due = []
+        next_runs = {}  # at -> next run; a slot's jobs all share one
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._live(entry):
+                continue
+            job = entry[2]
+            if now - job.due <= self.misfire_grace:
+                due.append(Job(job.job_id, job.at, job.payload, job.due))
+            if job.at not in next_runs:
+                next_runs[job.at] = next_run(job.at, now)
+            job.due = next_runs[job.at]
+            heapq.heappush(self._heap, (job.due, next(self._sequence), job))
+        return due
+
+    def _run(self):
+        while True:
+            with self._condition:
+                jobs = self._due_jobs()
+            if jobs is None:
+                return
+            if jobs:
+                try:
+                    self.fire(jobs)
+                except Exception:
+                    log.exception('Scheduled jobs failed')
+
+    def close(self):
+        self.stop()
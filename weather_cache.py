@@ -0,0 +1,127 @@
+"""Current weather per location for food suggestion.py, cached.
+
+Readings are kept per normalized location ("  new  delhi" and "New Delhi"
+are one entry) for WEATHER_CACHE_TTL seconds. Past that they are stale:
+the stale reading is still returned at once while a single background
+call refreshes it, and when the weather API fails it is used rather than
+a made-up default. Only a location that has never been read successfully
+(or not within WEATHER_STALE_TTL) falls back to DEFAULT_WEATHER.
+
+Concurrent misses for the same location share one in-flight call, so ten
+users in one city at the same minute cost one request.
+
+Environment:
+    WEATHER_BASE_URL   API root; point it at fake_weather.py for local tests
+    WEATHER_CACHE_TTL  seconds a reading is fresh (default 600)
+    WEATHER_STALE_TTL  seconds a reading may still stand in for a failed call (default 10800)
+    WEATHER_TIMEOUT    seconds per call (default 5)
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'http://api.weatherapi.com/v1'
+# What the script assumed when the API could not be reached
+DEFAULT_WEATHER = (25, "Unknown")
+
+
+def normalize_location(location):
+    return ' '.join(location.split()).casefold()
+
+
+class _Call:
+    """One in-flight API call that any number of callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.reading = None  # (temperature, condition) when the call succeeded
+
+
+class WeatherCache:
+    """(temperature, condition) per location from weatherapi.com, with a TTL and stale fallback"""
+
+    def __init__(self, api_key, base_url=None, ttl=None, stale_ttl=None, timeout=None):
+        self.api_key = api_key
+        self.base_url = (base_url or os.getenv('WEATHER_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.ttl = ttl if ttl is not None else float(os.getenv('WEATHER_CACHE_TTL', 600))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv('WEATHER_STALE_TTL', 10800))
+        self.timeout = timeout or float(os.getenv('WEATHER_TIMEOUT', 5))
+        self.session = requests.Session()
+        self._readings = {}  # normalized location -> (fetched_at, (temperature, condition))
+        self._calls = {}  # normalized location -> _Call
+        self._lock = threading.Lock()
+        self._counts = {'hit': 0, 'miss': 0, 'coalesced': 0, 'stale': 0, 'error': 0, 'default': 0}
+
+    def current(self, location):
+        """(temperature in °C, condition text); never raises"""
+        key = normalize_location(location)
+        now = time.monotonic()
+        with self._lock:
+            fetched_at, reading = self._readings.get(key, (None, None))
+            age = now - fetched_at if fetched_at is not None else None
+            if age is not None and age <= self.ttl:
+                self._counts['hit'] += 1
+                return reading
+            call, owner = self._call(key)
+            if age is not None and age <= self.stale_ttl:
+                # Stale while revalidate: answer now, refresh in the background
+                self._counts['stale'] += 1
+                if owner:
+                    threading.Thread(target=self._fetch, args=(key, location, call), daemon=True).start()
+                return reading
+            self._counts['miss' if owner else 'coalesced'] += 1
+
+        if owner:
+            self._fetch(key, location, call)
+        else:
+            call.done.wait(self.timeout + 1)
+        if call.reading is not None:
+            return call.reading
+        with self._lock:
+            self._counts['default'] += 1
+        return DEFAULT_WEATHER
+
+    def _call(self, key):
+        """(the in-flight call for key, whether the caller has to make it); under self._lock"""
+        call = self._calls.get(key)
+        if call is not None:
+            return call, False
+        call = self._calls[key] = _Call()
+        return call, True
+
+    def _fetch(self, key, location, call):
+        try:
+            response = self.session.get(f'{self.base_url}/current.json', params={'key': self.api_key, 'q': location},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            current = response.json()['current']
+            call.reading = (current['temp_c'], current['condition']['text'])
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            log.warning('Weather API error for %s: %s', location, e)
+            with self._lock:
+                self._counts['error'] += 1
+                # A reading that is not too old beats the default
+                fetched_at, reading = self._readings.get(key, (None, None))
+                if fetched_at is not None and time.monotonic() - fetched_at <= self.stale_ttl:
+                    call.reading = reading
+        else:
+            with self._lock:
+                self._readings[key] = (time.monotonic(), call.reading)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            counts['locations'] = len(self._readings)
+        # Every lookup that did not wait on an API call of its own counts as a hit
+        lookups = counts['hit'] + counts['miss'] + counts['coalesced'] + counts['stale']
+        counts['hit_rate'] = round((counts['hit'] + counts['coalesced'] + counts['stale']) / lookups, 4) if lookups else 0.0
+        return counts